@@ -0,0 +1 @@
+"""End-to-end benchmarks against local HTTP stand-ins."""
@@ -0,0 +1,72 @@
+"""Check the cold-start import cost of the pipeline.
+
+Usage::
+
+    python -m benchmarks.import_time --budget-ms 400
+
+Imports ``simap_agent.main`` in a fresh interpreter with ``-X importtime``,
+prints the slowest modules and exits with status 1 if the cumulative
+import time exceeds the budget or a module that should only be loaded on
+first use (``openai``, ``httpx``, ``dotenv``, ``tiktoken``) was imported.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded lazily by config, enricher and payload
+DEFERRED_MODULES = ("openai", "httpx", "dotenv", "tiktoken")
+DEFAULT_MODULE = "simap_agent.main"
+DEFAULT_BUDGET_MS = 400.0
+
+
+def measure(module: str = DEFAULT_MODULE) -> Dict[str, Tuple[int, int]]:
+    """Return ``{module: (self_us, cumulative_us)}`` for importing ``module``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings: Dict[str, Tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            timings[name] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def check(module: str = DEFAULT_MODULE) -> Tuple[float, List[str], Dict[str, Tuple[int, int]]]:
+    """Return the import time in ms, deferred modules imported anyway and all timings."""
+    timings = measure(module)
+    total_ms = timings[module][1] / 1000
+    eager = sorted(name for name in timings if name in DEFERRED_MODULES)
+    return total_ms, eager, timings
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    total_ms, eager, timings = check(args.module)
+    slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[: args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}")
+    print(f"import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if eager:
+        print(f"imported at load time but should be deferred: {', '.join(eager)}")
+    return int(total_ms > args.budget_ms or bool(eager))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
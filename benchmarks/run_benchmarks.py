@@ -0,0 +1,196 @@
+"""Run the SIMAP pipeline end to end against local stand-ins.
+
+Usage::
+
+    python -m benchmarks.run_benchmarks --tenders 10 100 1000 --profile realistic \
+        --output bench.json
+
+Every scenario starts fresh stand-ins, runs :func:`simap_agent.main.main`
+once and reports throughput, time to the first Slack post, latency
+percentiles per stage and external call, and the peak resident memory of
+the process so far. ``--trace-memory`` additionally reports the peak of
+Python allocations during the scenario (``tracemalloc``, includes the
+in-process stand-ins) but slows the run down several times, so its
+timings are not comparable to untraced runs.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+# Required by simap_agent.config; the real values are replaced per scenario
+os.environ.setdefault("SLACK_WEBHOOK_URL", "http://127.0.0.1/slack")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("COMPANY_PROFILE_FILE", os.path.join(_ROOT, "company_profile.json"))
+
+from benchmarks.standins import DETAIL_PATH, SEARCH_PATH, SLACK_PATH, Fault, StandIns  # noqa: E402
+from simap_agent import config, enricher, http_session, main, metrics, simap_client, slack_client  # noqa: E402
+from simap_agent.throttle import AdaptiveRateLimiter  # noqa: E402
+
+PROFILES: Dict[str, Dict[str, Fault]] = {
+    "clean": {},
+    "realistic": {
+        "search": Fault(latency=0.05, jitter=0.05),
+        "detail": Fault(latency=0.03, jitter=0.04),
+        "openai": Fault(latency=0.3, jitter=0.4),
+        "slack": Fault(latency=0.02, jitter=0.02),
+    },
+    "faulty": {
+        "search": Fault(latency=0.05, jitter=0.05, error_rate=0.02),
+        "detail": Fault(latency=0.03, jitter=0.04, error_rate=0.02, rate_limit_rate=0.05),
+        "openai": Fault(latency=0.3, jitter=0.4, rate_limit_rate=0.05, retry_after=0.2),
+        "slack": Fault(latency=0.02, jitter=0.02, rate_limit_rate=0.05, retry_after=0.1),
+    },
+}
+
+# Settings for the benchmark; the production defaults pace the real APIs
+# far below what the stand-ins can take
+SETTINGS: Dict[str, Any] = {
+    "SIMAP_DETAIL_CONCURRENCY": 8,
+    "SIMAP_REQUESTS_PER_SECOND": 200.0,
+    "OPENAI_MAX_CONCURRENCY": 8,
+    "OPENAI_RPM_LIMIT": 100000,
+    "OPENAI_TPM_LIMIT": 100000000,
+    "SLACK_LINGER_SECONDS": 0.2,
+    "STATE_DB_PATH": "",
+    "LLM_CACHE_PATH": "",
+    "RUN_REPORT_PATH": "",
+    "INDEX_PATH": "",
+    "SIMAP_CACHE_PATH": "",
+    "DEDUP_PATH": "",
+    "DOCUMENTS_CACHE_PATH": "",
+    "METRICS_OTEL": False,
+    "ENRICH_MODE": "sync",
+}
+SLACK_MESSAGES_PER_SECOND = 20.0
+
+
+def configure(url: str, overrides: Optional[Dict[str, Any]] = None) -> None:
+    """Point the pipeline at the stand-ins at ``url``."""
+    config.override(
+        SIMAP_BASE_URL=url,
+        SIMAP_SEARCH_ENDPOINT=SEARCH_PATH,
+        SIMAP_DETAIL_ENDPOINT_TEMPLATE=DETAIL_PATH,
+        SLACK_WEBHOOK_URL=url + SLACK_PATH,
+        AZURE_OPENAI_ENDPOINT=url,
+        OPENAI_API_KEY="benchmark",
+        **{**SETTINGS, **(overrides or {})},
+    )
+
+    http_session.close_all()
+    enricher.reset()
+    simap_client.reset()
+    slack_client.limiter = AdaptiveRateLimiter(SLACK_MESSAGES_PER_SECOND, min_rate=0.1)
+
+
+def _timings(report: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {key: t[key] for key in ("count", "p50_ms", "p95_ms", "max_ms")}
+        for name, t in report["timings"].items()
+    }
+
+
+def _peak_rss_mib() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def run_scenario(
+    tenders: int,
+    profile: str = "clean",
+    overrides: Optional[Dict[str, Any]] = None,
+    seed: int = 0,
+    trace_memory: bool = False,
+) -> Dict[str, Any]:
+    """Run ``tenders`` tenders through ``main()`` and return the measurements."""
+    with StandIns(tenders=tenders, faults=PROFILES[profile], seed=seed) as standins:
+        configure(standins.url, overrides)
+        if trace_memory:
+            tracemalloc.start()
+        start = time.monotonic()
+        try:
+            main.main()
+        finally:
+            elapsed = time.monotonic() - start
+            traced = None
+            if trace_memory:
+                traced = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+                tracemalloc.stop()
+        report = metrics.registry.report()
+        first_post = standins.first_post_at - start if standins.first_post_at else None
+        return {
+            "scenario": f"{profile}-{tenders}",
+            "tenders": tenders,
+            "seconds": round(elapsed, 3),
+            "tenders_per_second": round(tenders / elapsed, 2) if elapsed else None,
+            "first_post_seconds": round(first_post, 3) if first_post is not None else None,
+            "peak_rss_mib": _peak_rss_mib(),
+            "peak_traced_mib": traced,
+            "slack_posts": len(standins.posts),
+            "requests": dict(standins.requests),
+            "statuses": dict(sorted(standins.statuses.items())),
+            "timings": _timings(report),
+            "counters": report["counters"],
+        }
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scenario':<18}{'s':>9}{'tenders/s':>11}{'1st post':>10}{'RSS MiB':>10}"
+          f"{'detail p95':>12}{'enrich p95':>12}")
+    for r in results:
+        t = r["timings"]
+        detail = t.get("stage.fetch_detail", {}).get("p95_ms", 0.0)
+        enrich = t.get("stage.enrich", {}).get("p95_ms", 0.0)
+        first = r["first_post_seconds"]
+        print(f"{r['scenario']:<18}{r['seconds']:>9.2f}{r['tenders_per_second'] or 0:>11.1f}"
+              f"{first if first is not None else float('nan'):>10.2f}{r['peak_rss_mib'] or 0:>10.1f}"
+              f"{detail:>10.1f}ms{enrich:>10.1f}ms")
+
+
+def _parse_override(text: str) -> Tuple[str, Any]:
+    name, _, value = text.partition("=")
+    current = getattr(config, name)
+    if isinstance(current, bool):
+        return name, value.lower() in ("1", "true", "yes")
+    return name, type(current)(value) if current is not None else value
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenders", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a config setting, e.g. SIMAP_DETAIL_CONCURRENCY=16")
+    parser.add_argument("--output", help="write all results as JSON to this file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also measure peak Python allocations (slow)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+    overrides = dict(_parse_override(item) for item in args.set)
+    results = [run_scenario(n, args.profile, overrides, trace_memory=args.trace_memory) for n in args.tenders]
+    _print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
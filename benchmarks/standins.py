@@ -0,0 +1,267 @@
+"""Local HTTP stand-ins for SIMAP, Azure OpenAI and the Slack webhook."""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = "/api/publications/v2/project/project-search"
+DETAIL_PATH = "/api/publications/v1/project/{projectId}/publication-details/{publicationId}"
+SLACK_PATH = "/slack/webhook"
+
+_DETAIL_RE = re.compile(r"/project/([^/]+)/publication-details/([^/?]+)")
+
+# Route names used for faults and request counts
+ROUTES = ("search", "detail", "openai", "slack")
+
+_TITLES = (
+    "Weiterentwicklung Fachapplikation Steuerverwaltung",
+    "Datenplattform und Machine Learning für Verkehrsdaten",
+    "Reinigung Verwaltungsgebäude",
+    "Beschaffung Mobiltelefone",
+    "Cloud-Migration Geschäftsverwaltung",
+    "Unterhalt Strassenbeleuchtung",
+)
+
+
+@dataclass
+class Fault:
+    """Latency and failure injection for one route.
+
+    ``latency`` is the fixed delay in seconds, ``jitter`` an additional
+    random delay up to that value. ``error_rate`` and ``rate_limit_rate``
+    are the probabilities of answering HTTP 500 and HTTP 429.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 0.0
+
+
+@dataclass
+class StandIns:
+    """One threaded HTTP server answering all external endpoints of a run.
+
+    The search serves ``tenders`` summaries in pages of ``page_size`` using
+    ``lastItem`` pagination, every summary has a matching publication
+    detail, the chat-completions endpoint answers ``enrich_project`` calls
+    with a random apply score and criteria summaries with plain text, and
+    the Slack webhook accepts every post.
+    """
+
+    tenders: int = 100
+    page_size: int = 20
+    faults: Dict[str, Fault] = field(default_factory=dict)
+    seed: int = 0
+    requests: Counter = field(default_factory=Counter, init=False)
+    statuses: Counter = field(default_factory=Counter, init=False)
+    posts: List[Dict[str, Any]] = field(default_factory=list, init=False)
+    first_post_at: Optional[float] = field(default=None, init=False)
+
+    def __post_init__(self) -> None:
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, "stand-ins are not running"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandIns":
+        standins = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                standins._handle(self, "GET")
+
+            def do_POST(self) -> None:
+                standins._handle(self, "POST")
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StandIns":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    # -- data ---------------------------------------------------------------
+
+    def summary(self, i: int) -> Dict[str, Any]:
+        return {
+            "id": f"proj-{i}",
+            "publicationId": f"pub-{i}",
+            "projectNumber": str(10000 + i),
+            "pubType": "tender",
+            "title": {"de": f"{_TITLES[i % len(_TITLES)]} {i}"},
+        }
+
+    def detail(self, i: int) -> Dict[str, Any]:
+        title = _TITLES[i % len(_TITLES)]
+        return {
+            "id": f"pub-{i}",
+            "projectId": f"proj-{i}",
+            "projectNumber": str(10000 + i),
+            "publicationDate": "2025-01-01",
+            "base": {"projectTitle": {"de": f"{title} {i}", "fr": f"{title} {i} (fr)"}},
+            "project-info": {"procOfficeAddress": {"name": {"de": "Bundesamt für Tests"}}},
+            "procurement": {
+                "orderDescription": {"de": f"Ausschreibung {i}: {title}. " * 20},
+                "cpvCode": {"code": "72000000", "label": {"de": "IT-Dienste"}},
+            },
+            "dates": {"offerDeadline": "2025-02-01", "qnas": [{"date": "2025-01-15"}]},
+            "criteria": {
+                "qualificationCriteria": [
+                    {"title": {"de": "Referenzen"}, "description": {"de": "Drei vergleichbare Projekte"}}
+                ],
+                "awardCriteria": [
+                    {"title": {"de": "Preis"}, "weighting": 40},
+                    {"title": {"de": "Qualität"}, "weighting": 60},
+                ],
+            },
+        }
+
+    def enrichment(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            score = self._random.randint(1, 10)
+        data: Dict[str, Any] = {
+            "summary": "Kurze Zusammenfassung der Ausschreibung.",
+            "team": "Engineering",
+            "apply_score": score,
+        }
+        functions = request.get("functions") or []
+        properties = functions[0]["parameters"]["properties"] if functions else {}
+        for key in properties:
+            if key.endswith("CriteriaSummary"):
+                data[key] = "• Zusammengefasste Kriterien"
+        return data
+
+    # -- request handling ---------------------------------------------------
+
+    def _route(self, method: str, path: str) -> Optional[str]:
+        if method == "GET" and path == SEARCH_PATH:
+            return "search"
+        if method == "GET" and _DETAIL_RE.search(path):
+            return "detail"
+        if method == "POST" and path.endswith("/chat/completions"):
+            return "openai"
+        if method == "POST" and path == SLACK_PATH:
+            return "slack"
+        return None
+
+    def _fault(self, route: str) -> Optional[int]:
+        fault = self.faults.get(route) or Fault()
+        with self._lock:
+            delay = fault.latency + self._random.uniform(0, fault.jitter)
+            roll = self._random.random()
+        if delay:
+            time.sleep(delay)
+        if roll < fault.rate_limit_rate:
+            return 429
+        if roll < fault.rate_limit_rate + fault.error_rate:
+            return 500
+        return None
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        parsed = urlparse(handler.path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        route = self._route(method, parsed.path)
+        with self._lock:
+            self.requests[route or "unknown"] += 1
+
+        status = 404 if route is None else self._fault(route)
+        headers: Dict[str, str] = {}
+        if status == 429:
+            retry_after = (self.faults.get(route) or Fault()).retry_after
+            headers["Retry-After"] = f"{retry_after:g}"
+            headers["retry-after-ms"] = str(int(retry_after * 1000))
+        payload: Any = {"error": status} if status else None
+
+        if status is None:
+            status = 200
+            if route == "search":
+                payload = self._search(parse_qs(parsed.query))
+            elif route == "detail":
+                match = _DETAIL_RE.search(parsed.path)
+                payload = self.detail(int(match.group(1).rsplit("-", 1)[1]))
+            elif route == "openai":
+                payload = self._completion(json.loads(body or b"{}"))
+            else:
+                with self._lock:
+                    self.posts.append(json.loads(body or b"{}"))
+                    if self.first_post_at is None:
+                        self.first_post_at = time.monotonic()
+                payload = "ok"
+
+        with self._lock:
+            self.statuses[f"{route}.{status}"] += 1
+        data = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "text/plain" if isinstance(payload, str) else "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _search(self, query: Dict[str, List[str]]) -> Dict[str, Any]:
+        cursor = (query.get("lastItem") or [None])[0]
+        start = int(cursor) if cursor else 0
+        end = min(self.tenders, start + self.page_size)
+        return {
+            "projects": [self.summary(i) for i in range(start, end)],
+            "pagination": {"lastItem": str(end) if end < self.tenders else None, "itemsPerPage": self.page_size},
+        }
+
+    def _completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if request.get("functions"):
+            arguments = json.dumps(self.enrichment(request), ensure_ascii=False)
+            message = {
+                "role": "assistant",
+                "content": None,
+                "function_call": {"name": request["functions"][0]["name"], "arguments": arguments},
+            }
+            finish_reason = "function_call"
+        else:
+            message = {"role": "assistant", "content": "• Zusammengefasste Kriterien"}
+            finish_reason = "stop"
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in request.get("messages", []))
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model") or "gpt-4o",
+            "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_chars // 4 + completion_tokens,
+            },
+        }
@@ -1,4 +1,15 @@
+import sys
+
 from simap_agent.main import main
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["backfill"]:
+        from simap_agent.backfill import main_cli
+
+        main_cli(sys.argv[2:])
+    elif sys.argv[1:2] == ["search"]:
+        from simap_agent.search_index import main_cli
+
+        main_cli(sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,196 @@
+"""Re-fetch and re-score past tenders over an arbitrary date range.
+
+Usage::
+
+    python -m simap_agent backfill --from 2025-01-01 --to 2025-03-31
+
+The range is cut into one search per day. Days are fetched concurrently,
+search results and details are stored in the state database and every
+finished day is recorded, so an interrupted backfill continues where it
+stopped. Details are then enriched at a throttled rate; nothing is posted
+to Slack.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from simap_agent import config, metrics
+from simap_agent.enricher import enrich
+from simap_agent.pipeline import run_stage
+from simap_agent.records import ProjectSummary, PublicationDetail
+from simap_agent.search_index import TenderIndex, open_index
+from simap_agent.simap_client import fetch_project_detail, iter_project_summaries
+from simap_agent.store import PublicationStore, detail_key, open_store
+from simap_agent.throttle import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def day_range(start: date, end: date) -> List[str]:
+    """Return every day from ``start`` to ``end`` (inclusive) as ISO dates."""
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def job_id(start: date, end: date, cpv: List[str], profile: Dict[str, Any]) -> str:
+    """Return a stable ID for a backfill; a changed profile starts a new job."""
+    raw = json.dumps(
+        {"from": start.isoformat(), "to": end.isoformat(), "cpv": sorted(cpv), "profile": profile},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class Backfill:
+    """Fetch, store and enrich all tenders published between two days."""
+
+    def __init__(
+        self,
+        store: PublicationStore,
+        start: date,
+        end: date,
+        profile: Optional[Dict[str, Any]] = None,
+        concurrency: Optional[int] = None,
+        per_minute: Optional[float] = None,
+        index: Optional[TenderIndex] = None,
+    ) -> None:
+        self.store = store
+        self.index = index
+        self.start = start
+        self.end = end
+        self.profile = config.COMPANY_PROFILE if profile is None else profile
+        self.cpv = config.CPV_CODES
+        self.concurrency = concurrency or config.BACKFILL_CONCURRENCY
+        per_minute = per_minute or config.BACKFILL_ENRICH_PER_MINUTE
+        rate = per_minute / 60
+        self.limiter = AdaptiveRateLimiter(rate, min_rate=min(0.2, rate), max_rate=rate)
+        self.job = job_id(start, end, self.cpv, self.profile)
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += n
+
+    def fetch_day(self, day: str) -> List[PublicationDetail]:
+        """Store all details published on ``day`` and return them."""
+        details = []
+        with metrics.timer("backfill.day"):
+            for summary in iter_project_summaries(self.cpv, published_from=day, published_until=day):
+                self.count("summaries")
+                summary = ProjectSummary.from_dict(summary)
+                self.store.record_summary(None, summary)
+                detail = self.store.stored_detail(summary)
+                if detail is None:
+                    detail = fetch_project_detail(summary)
+                    if not detail:
+                        continue
+                    detail = PublicationDetail.from_dict(detail)
+                    self.store.record_detail(detail)
+                    self.count("fetched")
+                else:
+                    detail = PublicationDetail.from_dict(detail)
+                    self.count("stored")
+                details.append(detail)
+        self.store.finish_backfill_day(self.job, day, details)
+        self.count("days")
+        logger.info("Backfill day %s: %d details", day, len(details))
+        return details
+
+    def details(self) -> Iterator[PublicationDetail]:
+        """Yield details left over from an interrupted job, then new days."""
+        done = set(self.store.backfill_days(self.job))
+        days = [day for day in day_range(self.start, self.end) if day not in done]
+        pending = self.store.pending_backfill_details(self.job)
+        if done:
+            logger.info(
+                "Resuming backfill %s: %d days done, %d details to enrich", self.job, len(done), len(pending)
+            )
+        yield from map(PublicationDetail.from_dict, pending)
+        for details in run_stage(
+            days, self.fetch_day, workers=self.concurrency, queue_size=config.PIPELINE_QUEUE_SIZE, name="backfill"
+        ):
+            yield from details
+
+    def enrich(self, detail: Dict[str, Any]) -> Dict[str, Any]:
+        self.limiter.acquire()
+        with metrics.timer("backfill.enrich"):
+            data = enrich(detail, self.profile)
+        self.store.record_enrichment(detail, data)
+        key = detail_key(detail)
+        if self.index and key:
+            self.index.add(key, data)
+        score = data.get("apply_score", 0)
+        self.store.finish_backfill_item(self.job, detail, score)
+        self.count("enriched")
+        if score >= config.APPLY_SCORE_THRESHOLD:
+            self.count("above_threshold")
+        return data
+
+    def run(self) -> Dict[str, Any]:
+        """Run the backfill and return counts and throughput."""
+        started = time.monotonic()
+        for _ in run_stage(
+            self.details(),
+            self.enrich,
+            workers=config.OPENAI_MAX_CONCURRENCY,
+            queue_size=config.PIPELINE_QUEUE_SIZE,
+            name="backfill-enrich",
+        ):
+            pass
+        minutes = max(time.monotonic() - started, 1e-9) / 60
+        report = {
+            "job": self.job,
+            "from": self.start.isoformat(),
+            "to": self.end.isoformat(),
+            "minutes": round(minutes, 2),
+            "fetched_per_minute": round((self.counts["fetched"] + self.counts["stored"]) / minutes, 1),
+            "enriched_per_minute": round(self.counts["enriched"] / minutes, 1),
+            "counts": dict(self.counts),
+        }
+        logger.info(
+            "Backfill %s finished: %d details enriched, %d above threshold, %.1f tenders/minute",
+            self.job,
+            self.counts["enriched"],
+            self.counts["above_threshold"],
+            report["enriched_per_minute"],
+        )
+        return report
+
+
+def _date(text: str) -> date:
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def main_cli(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(prog="python -m simap_agent backfill", description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="start", type=_date, required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", type=_date, required=True, help="last day, YYYY-MM-DD")
+    parser.add_argument("--concurrency", type=int, help="days fetched at once (BACKFILL_CONCURRENCY)")
+    parser.add_argument("--per-minute", type=float, help="enrichments per minute (BACKFILL_ENRICH_PER_MINUTE)")
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--to must not be before --from")
+    config.require("OPENAI_API_KEY")
+
+    store = open_store()
+    if store is None:
+        parser.error("backfill needs a writable STATE_DB_PATH (or DATA_DIR) to store its progress")
+    index = open_index()
+    try:
+        report = Backfill(
+            store, args.start, args.end, concurrency=args.concurrency, per_minute=args.per_minute, index=index
+        ).run()
+    finally:
+        store.close()
+        if index:
+            index.close()
+    print(json.dumps(report, indent=2))
+    return report
@@ -0,0 +1,199 @@
+"""Offline enrichment through the Azure OpenAI Batch API."""
+
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from simap_agent import config, enricher
+from simap_agent.llm_cache import request_key
+from simap_agent.records import PublicationDetail
+
+logger = logging.getLogger(__name__)
+
+# Batch states after which polling stops
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchTransport:
+    """Submits a JSONL batch file and fetches its results.
+
+    Implementations only move data; building requests and mapping results
+    back to projects is done by :func:`enrich_batch_offline`.
+    """
+
+    def submit(self, path: str) -> str:
+        """Upload the batch file at ``path`` and return the batch ID."""
+        raise NotImplementedError
+
+    def status(self, batch_id: str) -> str:
+        """Return the batch state, e.g. ``in_progress`` or ``completed``."""
+        raise NotImplementedError
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Return the parsed output lines of a completed batch."""
+        raise NotImplementedError
+
+    def cancel(self, batch_id: str) -> None:
+        """Cancel a batch that is no longer waited for (no-op by default)."""
+
+
+class OpenAIBatchTransport(BatchTransport):
+    """Batch transport using the files and batches API of the OpenAI client."""
+
+    def __init__(self, client: Any = None) -> None:
+        self.client = client or enricher.get_openai_client()
+
+    def submit(self, path: str) -> str:
+        with open(path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def cancel(self, batch_id: str) -> None:
+        self.client.batches.cancel(batch_id)
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines: List[Dict[str, Any]] = []
+        for file_id in (batch.output_file_id, getattr(batch, "error_file_id", None)):
+            if file_id:
+                text = self.client.files.content(file_id).text
+                lines.extend(json.loads(line) for line in text.splitlines() if line.strip())
+        return lines
+
+
+def _line_text(line: Dict[str, Any]) -> Optional[str]:
+    """Return function arguments or content of a batch output line."""
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return None
+    try:
+        message = response["body"]["choices"][0]["message"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    if message.get("function_call"):
+        return message["function_call"].get("arguments")
+    return message.get("content")
+
+
+def _wait(transport: BatchTransport, batch_id: str, poll_interval: float, timeout: float) -> str:
+    deadline = time.monotonic() + timeout
+    while True:
+        state = transport.status(batch_id)
+        logger.debug("Batch %s is %s", batch_id, state)
+        if state in TERMINAL_STATES:
+            return state
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Batch {batch_id} not finished after {timeout:.0f}s (state {state})")
+        time.sleep(poll_interval)
+
+
+def enrich_batch_offline(
+    details: List[Dict[str, Any]],
+    profile: Dict[str, Any],
+    transport: Optional[BatchTransport] = None,
+    poll_interval: Optional[float] = None,
+    timeout: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Enrich ``details`` with one Batch API job and return results in order.
+
+    Enrichment and criteria-summary requests are written to a JSONL file,
+    submitted via ``transport`` and polled until the batch finishes. Requests
+    already in the response cache are not submitted. The usual
+    :func:`enricher.finalize` post-processing runs on every result; projects
+    whose enrichment failed in the batch, or did not finish within
+    ``timeout`` (the batch is then cancelled), are enriched synchronously
+    instead.
+    """
+    transport = transport or OpenAIBatchTransport()
+    poll_interval = config.OPENAI_BATCH_POLL_SECONDS if poll_interval is None else poll_interval
+    timeout = config.OPENAI_BATCH_TIMEOUT_SECONDS if timeout is None else timeout
+    single_call = config.ENRICH_SINGLE_CALL
+    cache = enricher.get_cache()
+
+    details = [PublicationDetail.from_dict(d) for d in details]
+    criteria = [enricher.collect_criteria(d) for d in details]
+    requests: Dict[str, Dict[str, Any]] = {}
+    for i, (detail, crit) in enumerate(zip(details, criteria)):
+        requests[f"enrich-{i}"] = enricher.build_enrich_request(
+            detail, profile, crit if single_call else None
+        )
+        if not single_call:
+            for key, name in enricher.CRITERIA_KINDS:
+                if crit[key]:
+                    requests[f"{key}-{i}"] = enricher.build_criteria_request(crit[key], name)
+
+    texts: Dict[str, Optional[str]] = {}
+    if cache:
+        for custom_id, request in requests.items():
+            cached = cache.get(request_key(request))
+            if cached is not None:
+                texts[custom_id] = cached
+    pending = {cid: req for cid, req in requests.items() if cid not in texts}
+
+    if pending:
+        fd, path = tempfile.mkstemp(prefix="simap_batch_", suffix=".jsonl", dir=config.OPENAI_BATCH_DIR or None)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for custom_id, request in pending.items():
+                body = dict(request)
+                if config.OPENAI_BATCH_DEPLOYMENT:
+                    body["model"] = config.OPENAI_BATCH_DEPLOYMENT
+                line = {"custom_id": custom_id, "method": "POST", "url": "/chat/completions", "body": body}
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        logger.info("Submitting batch with %d requests (%d cached)", len(pending), len(texts))
+        try:
+            batch_id = transport.submit(path)
+            try:
+                state = _wait(transport, batch_id, poll_interval, timeout)
+            except TimeoutError as exc:
+                logger.warning("%s, cancelling it", exc)
+                state = "timeout"
+                try:
+                    transport.cancel(batch_id)
+                except Exception:
+                    logger.exception("Cancelling batch %s failed", batch_id)
+            logger.info("Batch %s finished with state %s", batch_id, state)
+            for line in transport.results(batch_id) if state == "completed" else []:
+                custom_id = line.get("custom_id")
+                if custom_id in pending:
+                    texts[custom_id] = _line_text(line)
+        finally:
+            os.remove(path)
+        if cache:
+            for custom_id in pending:
+                if texts.get(custom_id) is not None:
+                    cache.set(request_key(pending[custom_id]), texts[custom_id])
+
+    results: List[Dict[str, Any]] = []
+    for i, (detail, crit) in enumerate(zip(details, criteria)):
+        args = texts.get(f"enrich-{i}")
+        if args is None:
+            logger.warning("Batch result missing for project %s, enriching synchronously", detail.get("id"))
+            results.append(enricher.enrich(detail, profile))
+            continue
+        try:
+            data = json.loads(args)
+        except ValueError:
+            logger.warning("Malformed batch result for project %s, enriching synchronously", detail.get("id"))
+            results.append(enricher.enrich(detail, profile))
+            continue
+        summaries: Dict[str, str] = {}
+        for key, name in enricher.CRITERIA_KINDS:
+            if not crit[key]:
+                continue
+            text = texts.get(f"{key}-{i}") if not single_call else data.get(f"{key}Summary")
+            if not (text or "").strip():
+                text = enricher.summarize_criteria(crit[key], name)
+            summaries[key] = text.strip()
+        results.append(enricher.finalize(detail, data, crit, summaries))
+    return results
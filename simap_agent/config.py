@@ -1,58 +1,249 @@
-"""Load configuration from the environment."""
+"""Load configuration from the environment.
+
+Settings are read lazily on first access (``config.SIMAP_BASE_URL``), so
+importing the package does not load ``.env`` or read the company profile.
+Secrets are checked with :func:`require` where they are used, so e.g. the
+search CLI runs without them. :func:`override` changes values for the
+running process (e.g. in benchmarks); :func:`reset` forgets the cached
+settings and overrides, e.g. after changing environment variables in tests.
+"""
 
-import os
 import json
 import logging
-from dotenv import load_dotenv
+import os
+import threading
+from functools import cached_property
+from typing import Any, Dict, Iterable, Optional
 
 logger = logging.getLogger(__name__)
 
-# Lade .env-Datei nur für die lokale Entwicklung
-# Die Variable 'FUNCTIONS_WORKER_RUNTIME' ist in Azure Functions standardmässig gesetzt.
-if not os.getenv("FUNCTIONS_WORKER_RUNTIME"):
-    from dotenv import load_dotenv
-    load_dotenv(override=True)
-    logging.debug("Environment variables loaded from .env file for local development.")
-    
-logger.debug("Environment variables loaded")
-
-# Base URL and endpoints for SIMAP
-SIMAP_BASE_URL = os.getenv("SIMAP_BASE_URL", "https://simap.ch")
-SIMAP_SEARCH_ENDPOINT = os.getenv(
-    "SIMAP_SEARCH_ENDPOINT", "/api/publications/v2/project/project-search"
-)
-SIMAP_DETAIL_ENDPOINT_TEMPLATE = os.getenv(
-    "SIMAP_DETAIL_ENDPOINT_TEMPLATE",
-    "/api/publications/v1/project/{projectId}/publication-details/{publicationId}",
-)
-SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv(
-    "AZURE_OPENAI_ENDPOINT",
-    "https://dataai-opai-openai-weu-001.cognitiveservices.azure.com/",
-)
-
-
-OPENAI_API_VERSION = os.getenv("OPENAI_API_VERSION", "2025-01-01-preview")
-COMPANY_PROFILE_FILE = os.getenv("COMPANY_PROFILE_FILE", "company_profile.json")
-CPV_CODES = os.getenv("CPV_CODES", "48000000,72000000").split(",")
-# Minimum apply score required for posting a project to Slack
-APPLY_SCORE_THRESHOLD = int(os.getenv("APPLY_SCORE_THRESHOLD", "7"))
-logger.debug("Slack webhook configured: %s", bool(SLACK_WEBHOOK_URL))
-
-try:
-    with open(COMPANY_PROFILE_FILE, "r", encoding="utf-8") as f:
-        COMPANY_PROFILE = json.load(f)
-    logger.debug("Company profile loaded from %s", COMPANY_PROFILE_FILE)
-except FileNotFoundError:
-    logger.warning("Company profile file %s not found", COMPANY_PROFILE_FILE)
-    COMPANY_PROFILE = {}
-
-# Validate required variables
-_required = {
-    'SLACK_WEBHOOK_URL': SLACK_WEBHOOK_URL,
-    'OPENAI_API_KEY': OPENAI_API_KEY,
-}
-_missing = [k for k, v in _required.items() if not v]
-if _missing:
-    raise EnvironmentError(f"Missing environment variables: {', '.join(_missing)}")
+# Environment variables without which the daily pipeline cannot run
+REQUIRED = ("SLACK_WEBHOOK_URL", "OPENAI_API_KEY")
+
+
+def _load_dotenv() -> None:
+    # Lade .env-Datei nur für die lokale Entwicklung
+    # Die Variable 'FUNCTIONS_WORKER_RUNTIME' ist in Azure Functions standardmässig gesetzt.
+    if not os.getenv("FUNCTIONS_WORKER_RUNTIME"):
+        from dotenv import load_dotenv
+
+        load_dotenv(override=True)
+        logger.debug("Environment variables loaded from .env file for local development.")
+
+
+def _data_path(name: str, filename: str, data_dir: str) -> str:
+    # Files are off unless their variable or DATA_DIR is set, since the
+    # working directory may be read-only (e.g. wwwroot in Azure Functions)
+    return os.getenv(name, os.path.join(data_dir, filename) if data_dir else "")
+
+
+class Settings:
+    """All configuration values, read once from the environment."""
+
+    def __init__(self) -> None:
+        # Writable directory for the state, cache, index and report files below; each file
+        # can also be set with its own variable (empty disables the feature)
+        self.DATA_DIR = os.getenv("DATA_DIR", "")
+        # Base URL and endpoints for SIMAP
+        self.SIMAP_BASE_URL = os.getenv("SIMAP_BASE_URL", "https://simap.ch")
+        self.SIMAP_SEARCH_ENDPOINT = os.getenv(
+            "SIMAP_SEARCH_ENDPOINT", "/api/publications/v2/project/project-search"
+        )
+        self.SIMAP_DETAIL_ENDPOINT_TEMPLATE = os.getenv(
+            "SIMAP_DETAIL_ENDPOINT_TEMPLATE",
+            "/api/publications/v1/project/{projectId}/publication-details/{publicationId}",
+        )
+        self.SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
+        self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+        self.AZURE_OPENAI_ENDPOINT = os.getenv(
+            "AZURE_OPENAI_ENDPOINT",
+            "https://dataai-opai-openai-weu-001.cognitiveservices.azure.com/",
+        )
+        self.OPENAI_API_VERSION = os.getenv("OPENAI_API_VERSION", "2025-01-01-preview")
+        self.COMPANY_PROFILE_FILE = os.getenv("COMPANY_PROFILE_FILE", "company_profile.json")
+        self.CPV_CODES = os.getenv("CPV_CODES", "48000000,72000000").split(",")
+        # Minimum apply score required for posting a project to Slack
+        self.APPLY_SCORE_THRESHOLD = int(os.getenv("APPLY_SCORE_THRESHOLD", "7"))
+        # Parallel detail requests and pacing towards the SIMAP API
+        self.SIMAP_DETAIL_CONCURRENCY = int(os.getenv("SIMAP_DETAIL_CONCURRENCY", "1"))
+        self.SIMAP_REQUESTS_PER_SECOND = float(os.getenv("SIMAP_REQUESTS_PER_SECOND", "4"))
+        self.SIMAP_MAX_ATTEMPTS = int(os.getenv("SIMAP_MAX_ATTEMPTS", "4"))
+        self.SIMAP_SEARCH_TIMEOUT = float(os.getenv("SIMAP_SEARCH_TIMEOUT", "20"))
+        self.SIMAP_DETAIL_TIMEOUT = float(os.getenv("SIMAP_DETAIL_TIMEOUT", "10"))
+        # Disk cache for SIMAP responses (empty path disables it): details are reused for
+        # SIMAP_CACHE_DETAIL_TTL_HOURS, search pages for SIMAP_CACHE_SEARCH_TTL_SECONDS,
+        # then revalidated with ETag/Last-Modified
+        self.SIMAP_CACHE_PATH = _data_path("SIMAP_CACHE_PATH", "simap_http_cache.db", self.DATA_DIR)
+        self.SIMAP_CACHE_DETAIL_TTL_HOURS = float(os.getenv("SIMAP_CACHE_DETAIL_TTL_HOURS", "720"))
+        self.SIMAP_CACHE_SEARCH_TTL_SECONDS = float(os.getenv("SIMAP_CACHE_SEARCH_TTL_SECONDS", "300"))
+        self.SIMAP_CACHE_MAX_MB = float(os.getenv("SIMAP_CACHE_MAX_MB", "200"))
+        # Split the search into one shard per CPV code and date slice, walked concurrently
+        self.SIMAP_SEARCH_SHARDED = os.getenv("SIMAP_SEARCH_SHARDED", "false").lower() in ("1", "true", "yes")
+        self.SIMAP_SEARCH_CONCURRENCY = int(os.getenv("SIMAP_SEARCH_CONCURRENCY", "4"))
+        self.SIMAP_SEARCH_SHARD_DAYS = int(os.getenv("SIMAP_SEARCH_SHARD_DAYS", "1"))
+        # Maximum number of items buffered between two pipeline stages
+        self.PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+        # Slack delivery: wait this long for more projects before posting, then retry failed posts
+        self.SLACK_LINGER_SECONDS = float(os.getenv("SLACK_LINGER_SECONDS", "1"))
+        self.SLACK_MAX_ROUNDS = int(os.getenv("SLACK_MAX_ROUNDS", "3"))
+        self.SLACK_MAX_ATTEMPTS = int(os.getenv("SLACK_MAX_ATTEMPTS", "4"))
+        # JSON run report written at the end of main() (empty disables it)
+        self.RUN_REPORT_PATH = _data_path("RUN_REPORT_PATH", "run_report.json", self.DATA_DIR)
+        # Also export the run metrics via OpenTelemetry (needs opentelemetry-api)
+        self.METRICS_OTEL = os.getenv("METRICS_OTEL", "false").lower() in ("1", "true", "yes")
+        # SQLite file remembering processed publications between runs (empty disables it);
+        # it also checkpoints unfinished runs so they can be resumed
+        self.STATE_DB_PATH = _data_path("STATE_DB_PATH", "simap_state.db", self.DATA_DIR)
+        # SQLite full-text index of all enrichments (empty disables it)
+        self.INDEX_PATH = _data_path("INDEX_PATH", "simap_index.db", self.DATA_DIR)
+        # SQLite file with MinHash signatures of enriched details (empty disables it); a detail
+        # at least DEDUP_THRESHOLD similar to a stored one reuses its enrichment
+        self.DEDUP_PATH = _data_path("DEDUP_PATH", "simap_dedup.db", self.DATA_DIR)
+        self.DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+        # Read the criteria of tenders that only have them in attached documents
+        self.DOCUMENTS_INGEST = os.getenv("DOCUMENTS_INGEST", "false").lower() in ("1", "true", "yes")
+        self.SIMAP_DOCUMENTS_ENDPOINT_TEMPLATE = os.getenv(
+            "SIMAP_DOCUMENTS_ENDPOINT_TEMPLATE",
+            "/api/publications/v1/project/{projectId}/publication-details/{publicationId}/documents",
+        )
+        # Read documents from <DOCUMENTS_DIR>/<projectId>/ instead of SIMAP
+        self.DOCUMENTS_DIR = os.getenv("DOCUMENTS_DIR", "")
+        # Larger documents are not downloaded; text beyond DOCUMENTS_MAX_CHARS is not extracted
+        self.DOCUMENTS_MAX_MB = float(os.getenv("DOCUMENTS_MAX_MB", "20"))
+        self.DOCUMENTS_MAX_CHARS = int(os.getenv("DOCUMENTS_MAX_CHARS", "200000"))
+        # Characters of one criteria section passed to the model
+        self.DOCUMENTS_SECTION_CHARS = int(os.getenv("DOCUMENTS_SECTION_CHARS", "4000"))
+        # SQLite file with extracted texts by content hash (empty disables it)
+        self.DOCUMENTS_CACHE_PATH = _data_path("DOCUMENTS_CACHE_PATH", "simap_documents.db", self.DATA_DIR)
+        # Backfill: days fetched at once and enrichments per minute
+        self.BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+        self.BACKFILL_ENRICH_PER_MINUTE = float(os.getenv("BACKFILL_ENRICH_PER_MINUTE", "60"))
+        # Stop taking new search results after this many seconds (0 = no limit) so a run
+        # ends cleanly before the Azure Functions timeout and the next one resumes it
+        self.RUN_TIME_BUDGET_SECONDS = float(os.getenv("RUN_TIME_BUDGET_SECONDS", "0"))
+        # Disk cache for OpenAI responses (empty path disables it)
+        self.LLM_CACHE_PATH = _data_path("LLM_CACHE_PATH", "llm_cache.db", self.DATA_DIR)
+        self.LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+        self.LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        # Parallel enrichment within the quota of the Azure OpenAI deployment
+        self.OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+        self.OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "480"))
+        self.OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "80000"))
+        self.OPENAI_MAX_ATTEMPTS = int(os.getenv("OPENAI_MAX_ATTEMPTS", "5"))
+        # Local relevance pre-filter before enrichment: off, on or shadow
+        self.PREFILTER_MODE = os.getenv("PREFILTER_MODE", "shadow").lower()
+        self.PREFILTER_CUTOFF = float(os.getenv("PREFILTER_CUTOFF", "0.05"))
+        # Details from STATE_DB_PATH weighting the first tenders of a run; the cutoff only
+        # applies once PREFILTER_WARMUP details are known
+        self.PREFILTER_CORPUS_SIZE = int(os.getenv("PREFILTER_CORPUS_SIZE", "500"))
+        self.PREFILTER_WARMUP = int(os.getenv("PREFILTER_WARMUP", "20"))
+        # Return the criteria summaries in the enrich_project call instead of separate requests
+        self.ENRICH_SINGLE_CALL = os.getenv("ENRICH_SINGLE_CALL", "true").lower() in ("1", "true", "yes")
+        # Azure OpenAI deployment used for the analysis and the criteria summaries
+        self.OPENAI_DEPLOYMENT = os.getenv("OPENAI_DEPLOYMENT", "gpt-4o")
+        # Cascade: a cheap deployment scores every tender first; only tenders scoring at least
+        # APPLY_SCORE_THRESHOLD - ENRICH_CASCADE_BAND get the full analysis
+        self.ENRICH_CASCADE = os.getenv("ENRICH_CASCADE", "false").lower() in ("1", "true", "yes")
+        self.OPENAI_TRIAGE_DEPLOYMENT = os.getenv("OPENAI_TRIAGE_DEPLOYMENT", "gpt-4o-mini")
+        self.ENRICH_CASCADE_BAND = int(os.getenv("ENRICH_CASCADE_BAND", "2"))
+        # JSON file with one profile, threshold, CPV list and Slack webhook per business unit;
+        # if set, one run scores every tender for all of them (see simap_agent.tenants)
+        self.TENANTS_FILE = os.getenv("TENANTS_FILE", "")
+        # Profiles scored in one request in the multi-tenant mode
+        self.TENANT_PROFILES_PER_CALL = int(os.getenv("TENANT_PROFILES_PER_CALL", "4"))
+        # "sync" calls OpenAI directly, "batch" submits one Batch API job per run
+        self.ENRICH_MODE = os.getenv("ENRICH_MODE", "sync").lower()
+        self.OPENAI_BATCH_DEPLOYMENT = os.getenv("OPENAI_BATCH_DEPLOYMENT", "")
+        self.OPENAI_BATCH_DIR = os.getenv("OPENAI_BATCH_DIR", "")
+        self.OPENAI_BATCH_POLL_SECONDS = float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "30"))
+        self.OPENAI_BATCH_TIMEOUT_SECONDS = float(os.getenv("OPENAI_BATCH_TIMEOUT_SECONDS", "3600"))
+        # Send only German texts without dead fields and whitespace to OpenAI
+        self.PAYLOAD_COMPACT = os.getenv("PAYLOAD_COMPACT", "true").lower() in ("1", "true", "yes")
+        self.PAYLOAD_DROP_KEYS = [
+            k.strip()
+            for k in os.getenv(
+                "PAYLOAD_DROP_KEYS",
+                "_links,links,createdAt,updatedAt,lastModified,modifiedAt,version",
+            ).split(",")
+            if k.strip()
+        ]
+
+    @cached_property
+    def COMPANY_PROFILE(self) -> Dict[str, Any]:
+        try:
+            with open(self.COMPANY_PROFILE_FILE, "r", encoding="utf-8") as f:
+                profile = json.load(f)
+            logger.debug("Company profile loaded from %s", self.COMPANY_PROFILE_FILE)
+            return profile
+        except FileNotFoundError:
+            logger.warning("Company profile file %s not found", self.COMPANY_PROFILE_FILE)
+            return {}
+
+    def validate(self, names: Iterable[str] = REQUIRED) -> None:
+        """Raise ``EnvironmentError`` if one of the variables ``names`` is missing."""
+        missing = [name for name in names if not getattr(self, name)]
+        if missing:
+            raise EnvironmentError(f"Missing environment variables: {', '.join(missing)}")
+
+
+_settings: Optional[Settings] = None
+_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """Return the cached settings, loading them on first use."""
+    global _settings
+    # Every config read of every worker thread ends up here, so only the
+    # first load (or the first after a reset) takes the lock
+    settings = _settings
+    if settings is not None:
+        return settings
+    with _lock:
+        if _settings is None:
+            _load_dotenv()
+            settings = Settings()
+            logger.debug("Slack webhook configured: %s", bool(settings.SLACK_WEBHOOK_URL))
+            _settings = settings
+        return _settings
+
+
+def override(**values: Any) -> None:
+    """Replace setting values until the next :func:`reset`."""
+    settings = get_settings()
+    for name, value in values.items():
+        if not hasattr(settings, name):
+            raise AttributeError(f"Unknown setting {name}")
+        setattr(settings, name, value)
+        # A module attribute of the same name (``config.X = ...``) would hide it
+        globals().pop(name, None)
+
+
+def require(*names: str) -> None:
+    """Raise ``EnvironmentError`` unless the variables ``names`` are set."""
+    get_settings().validate(names)
+
+
+def reset() -> None:
+    """Forget the cached settings so the next access reads the environment again.
+
+    Module attributes set with ``config.X = ...`` (e.g. by ``monkeypatch``)
+    shadow the settings and are removed as well.
+    """
+    global _settings
+    with _lock:
+        _settings = None
+        for name in [n for n in globals() if n.isupper() and not n.startswith("_") and n not in _CONSTANTS]:
+            del globals()[name]
+
+
+def __getattr__(name: str) -> Any:
+    if name.isupper():
+        try:
+            return getattr(get_settings(), name)
+        except AttributeError:
+            pass
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Upper-case names that belong to this module rather than to the settings
+_CONSTANTS = frozenset(name for name in globals() if name.isupper())
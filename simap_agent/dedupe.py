@@ -0,0 +1,226 @@
+"""Detect near-duplicate publications before they are enriched.
+
+SIMAP publishes corrections, re-tenders and lot variants of the same
+procurement under new publication IDs. Every enriched detail is stored with
+a MinHash signature of its German text; a later detail whose estimated
+Jaccard similarity to a stored one reaches ``DEDUP_THRESHOLD`` reuses that
+enrichment, patched with its own IDs and criteria, instead of a new LLM call.
+Candidates are found through locality-sensitive hashing (LSH) buckets kept
+in SQLite, so a lookup does not compare against every stored tender.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import struct
+import threading
+from array import array
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from simap_agent import config
+from simap_agent.enricher import CRITERIA_KINDS, collect_criteria, finalize
+from simap_agent.payload import compact
+from simap_agent.prefilter import tokenize
+from simap_agent.records import plain
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard similarity share a bucket
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Texts with fewer shingles are too short to compare reliably
+MIN_SHINGLES = 5
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    project_id TEXT NOT NULL,
+    publication_id TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    enrichment TEXT NOT NULL,
+    PRIMARY KEY (project_id, publication_id)
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    project_id TEXT NOT NULL,
+    publication_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_band ON buckets (band, bucket);
+"""
+
+Key = Tuple[str, str]
+Signature = Tuple[int, ...]
+
+
+class Match(NamedTuple):
+    """A stored publication similar to the one looked up."""
+
+    key: Key
+    similarity: float
+    enrichment: Dict[str, Any]
+
+
+def _texts(value: Any) -> Iterator[str]:
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _texts(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _texts(item)
+    elif isinstance(value, str) and " " in value.strip():
+        yield value
+
+
+def detail_text(detail: Dict[str, Any]) -> str:
+    """Return the texts of the compacted detail (German or its fallback).
+
+    Single-word values such as IDs, dates and enum values are left out, they
+    differ between corrections of the same procurement.
+    """
+    return "\n".join(_texts(compact(plain(detail), config.PAYLOAD_DROP_KEYS)))
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[int]:
+    """Return 64-bit hashes of the word ``size``-grams of ``text``."""
+    tokens = tokenize(text)
+    grams = {" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))} if tokens else set()
+    return [
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+        for gram in grams
+    ]
+
+
+def minhash(hashes: Sequence[int]) -> Optional[Signature]:
+    """Return the MinHash signature of shingle hashes, ``None`` if too few."""
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def signature(detail: Dict[str, Any]) -> Optional[Signature]:
+    """Return the MinHash signature of the German text of a detail."""
+    return minhash(shingles(detail_text(detail)))
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Return the Jaccard similarity estimated from two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def _bands(sig: Signature) -> List[Tuple[int, int]]:
+    out = []
+    for band in range(BANDS):
+        raw = struct.pack(f"<{ROWS}Q", *sig[band * ROWS:(band + 1) * ROWS])
+        digest = int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+        # SQLite integers are signed
+        out.append((band, digest - (1 << 64) if digest >> 63 else digest))
+    return out
+
+
+def patch_enrichment(enrichment: Dict[str, Any], detail: Dict[str, Any], match: Key, score: float) -> Dict[str, Any]:
+    """Return a copy of a near-duplicate's enrichment adapted to ``detail``.
+
+    The project fields found in ``detail`` (IDs, dates, ...), the criteria
+    and their flags are taken from it; summary, team and apply score are
+    kept. A criteria summary is only kept if the criteria did not change.
+    """
+    data = copy.deepcopy(enrichment)
+    data.pop("missing_info", None)
+    criteria = collect_criteria(detail)
+    summaries = {}
+    for key, _ in CRITERIA_KINDS:
+        old = data.pop(key, None)
+        summary = data.pop(f"{key}Summary", None)
+        data.pop(f"{key}InDocuments", None)
+        data.pop(f"{key}AsPDF", None)
+        if summary and criteria.get(key) and criteria[key] == old:
+            summaries[key] = summary
+    data["near_duplicate_of"] = {"projectId": match[0], "publicationId": match[1], "similarity": round(score, 3)}
+    return finalize(detail, data, criteria, summaries)
+
+
+class DuplicateIndex:
+    """MinHash signatures and enrichments keyed by ``(projectId, publicationId)``.
+
+    The connection is shared between threads and guarded by a lock.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.9) -> None:
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        logger.debug("Duplicate index opened at %s", path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def add(self, key: Key, sig: Signature, enrichment: Dict[str, Any]) -> None:
+        """Store the signature and enrichment of ``key``, replacing older ones."""
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets WHERE project_id = ? AND publication_id = ?", key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures (project_id, publication_id, signature, enrichment) "
+                "VALUES (?, ?, ?, ?)",
+                (*key, array("Q", sig).tobytes(), json.dumps(enrichment, ensure_ascii=False)),
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets (band, bucket, project_id, publication_id) VALUES (?, ?, ?, ?)",
+                [(band, bucket, *key) for band, bucket in _bands(sig)],
+            )
+            self._conn.commit()
+
+    def match(self, sig: Signature, exclude: Optional[Key] = None) -> Optional[Match]:
+        """Return the most similar stored publication above the threshold."""
+        bands = _bands(sig)
+        where = " OR ".join("(band = ? AND bucket = ?)" for _ in bands)
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT DISTINCT s.project_id, s.publication_id, s.signature FROM buckets b "
+                "JOIN signatures s ON s.project_id = b.project_id AND s.publication_id = b.publication_id "
+                f"WHERE {where}",
+                [value for pair in bands for value in pair],
+            ).fetchall()
+        best: Optional[Tuple[float, Key]] = None
+        for pid, pub, blob in candidates:
+            if (pid, pub) == exclude:
+                continue
+            score = similarity(sig, tuple(array("Q", blob)))
+            if score >= self.threshold and (best is None or score > best[0]):
+                best = (score, (pid, pub))
+        if best is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT enrichment FROM signatures WHERE project_id = ? AND publication_id = ?", best[1]
+            ).fetchone()
+        return Match(best[1], best[0], json.loads(row[0])) if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+
+def open_index(path: Optional[str] = None) -> Optional[DuplicateIndex]:
+    """Open the index at ``path`` (default ``DEDUP_PATH``); ``None`` if disabled."""
+    path = config.DEDUP_PATH if path is None else path
+    if not path:
+        logger.debug("Near-duplicate detection disabled")
+        return None
+    try:
+        return DuplicateIndex(path, threshold=config.DEDUP_THRESHOLD)
+    except (OSError, sqlite3.Error) as exc:
+        logger.warning("Cannot open near-duplicate index %s, continuing without it: %s", path, exc)
+        return None
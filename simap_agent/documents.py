@@ -0,0 +1,441 @@
+"""Read criteria from the documents attached to a publication.
+
+Many tenders only state that their qualification or award criteria are in
+the tender documents (``...InDocuments``) or a PDF (``...AsPDF``). For
+those, the documents are downloaded in chunks into a spooled temporary file
+(in memory up to ``SPOOL_BYTES``, on disk beyond) and abandoned once they
+exceed ``DOCUMENTS_MAX_MB``. Their text is extracted incrementally, at most
+``DOCUMENTS_MAX_CHARS`` per document, and cached by the SHA-256 of the
+content. Only the sections headed like criteria are attached to the detail
+as :attr:`PublicationDetail.documents` and reach the model.
+
+Plain text, HTML and DOCX are read with the standard library; PDFs need the
+optional ``pypdf`` package and are skipped without it.
+"""
+
+import codecs
+import contextlib
+import dataclasses
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from html.parser import HTMLParser
+from typing import IO, Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from xml.etree import ElementTree
+
+import requests
+
+from simap_agent import config, metrics
+from simap_agent.records import CRITERIA_KEYS, PublicationDetail
+from simap_agent.simap_client import fetch_document_list, iter_document
+
+logger = logging.getLogger(__name__)
+
+# Downloads are kept in memory up to this size, then spooled to disk
+SPOOL_BYTES = 2 ** 20
+CHUNK_SIZE = 64 * 1024
+
+# Lower-case word stems of the headings of each kind of criteria
+SECTION_KEYWORDS = {
+    "qualificationCriteria": ("eignungskriteri", "eignungsnachweis"),
+    "awardCriteria": ("zuschlagskriteri", "bewertungskriteri"),
+}
+# Longer lines are body text, not headings
+HEADING_MAX_CHARS = 120
+_NUMBERED = re.compile(r"^(\d+(?:\.\d+)*)\.?\s+\S")
+
+_TEXT_EXTENSIONS = (".txt", ".csv", ".md")
+_HTML_EXTENSIONS = (".html", ".htm", ".xhtml")
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    sha256 TEXT PRIMARY KEY,
+    text BLOB NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class Document(NamedTuple):
+    """An attachment of a publication; ``size`` in bytes if announced."""
+
+    name: str
+    url: str
+    size: Optional[int] = None
+
+
+class DocumentSource:
+    """Lists the documents of a publication and streams their content."""
+
+    def list(self, detail: PublicationDetail) -> List[Document]:
+        raise NotImplementedError
+
+    def chunks(self, doc: Document, max_bytes: int) -> Iterator[bytes]:
+        """Yield the content of ``doc``; may raise ``ValueError`` if it exceeds ``max_bytes``."""
+        raise NotImplementedError
+
+
+class SimapDocumentSource(DocumentSource):
+    """Documents listed by ``SIMAP_DOCUMENTS_ENDPOINT_TEMPLATE``."""
+
+    def list(self, detail: PublicationDetail) -> List[Document]:
+        docs = []
+        for entry in fetch_document_list(detail):
+            url = entry.get("url") or entry.get("downloadUrl") or entry.get("href")
+            if not url:
+                continue
+            name = entry.get("fileName") or entry.get("name") or entry.get("title") or url
+            if isinstance(name, dict):
+                name = name.get("de") or next(iter(name.values()), url)
+            size = entry.get("size") or entry.get("fileSize")
+            docs.append(Document(str(name), url, size if isinstance(size, int) else None))
+        return docs
+
+    def chunks(self, doc: Document, max_bytes: int) -> Iterator[bytes]:
+        yield from iter_document(doc.url, max_bytes, CHUNK_SIZE)
+
+
+class LocalDocumentSource(DocumentSource):
+    """Files in ``<root>/<projectId>/``, e.g. as a stand-in for tests."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def list(self, detail: PublicationDetail) -> List[Document]:
+        folder = os.path.join(self.root, str(detail.get("projectId") or ""))
+        if not detail.get("projectId") or not os.path.isdir(folder):
+            return []
+        return [
+            Document(name, os.path.join(folder, name), os.path.getsize(os.path.join(folder, name)))
+            for name in sorted(os.listdir(folder))
+            if os.path.isfile(os.path.join(folder, name))
+        ]
+
+    def chunks(self, doc: Document, max_bytes: int) -> Iterator[bytes]:
+        with open(doc.url, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+
+class _HTMLText(HTMLParser):
+    _BLOCKS = {"p", "br", "div", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table", "section"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag in self._BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("script", "style"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in self._BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip:
+            self.parts.append(data)
+
+
+def _decoded(f: IO[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        yield decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            return
+
+
+def _html_text(f: IO[bytes]) -> Iterator[str]:
+    parser = _HTMLText()
+    for text in _decoded(f):
+        parser.feed(text)
+        yield "".join(parser.parts)
+        parser.parts.clear()
+    parser.close()
+    yield "".join(parser.parts)
+
+
+def _docx_text(f: IO[bytes]) -> Iterator[str]:
+    try:
+        with zipfile.ZipFile(f) as archive, archive.open("word/document.xml") as xml:
+            paragraph: List[str] = []
+            for _, elem in ElementTree.iterparse(xml):
+                if elem.tag == f"{_WORD_NS}t" and elem.text:
+                    paragraph.append(elem.text)
+                elif elem.tag == f"{_WORD_NS}p":
+                    yield "".join(paragraph) + "\n"
+                    paragraph.clear()
+                    elem.clear()
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as exc:
+        logger.warning("Could not read DOCX: %s", exc)
+
+
+def _pdf_text(f: IO[bytes]) -> Iterator[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("pypdf is not installed, skipping PDF")
+        metrics.incr("documents.unsupported")
+        return
+    try:
+        for page in PdfReader(f).pages:
+            yield (page.extract_text() or "") + "\n"
+    except Exception as exc:  # pypdf raises many error types on damaged files
+        logger.warning("Could not read PDF: %s", exc)
+
+
+def extract_text(f: IO[bytes], name: str, max_chars: int) -> str:
+    """Return at most ``max_chars`` of the text of a document.
+
+    The format is taken from the content (PDF, DOCX) or the file name
+    (HTML, plain text); other formats give an empty text.
+    """
+    head = f.read(4)
+    f.seek(0)
+    lower = name.lower()
+    if head.startswith(b"%PDF"):
+        pieces: Iterable[str] = _pdf_text(f)
+    elif head.startswith(b"PK") and lower.endswith(".docx"):
+        pieces = _docx_text(f)
+    elif lower.endswith(_HTML_EXTENSIONS):
+        pieces = _html_text(f)
+    elif lower.endswith(_TEXT_EXTENSIONS):
+        pieces = _decoded(f)
+    else:
+        logger.debug("Unsupported document format: %s", name)
+        metrics.incr("documents.unsupported")
+        return ""
+    out: List[str] = []
+    size = 0
+    for piece in pieces:
+        out.append(piece[: max_chars - size])
+        size += len(out[-1])
+        if size >= max_chars:
+            break
+    return "".join(out)
+
+
+def _heading_kind(line: str) -> Optional[str]:
+    if len(line) > HEADING_MAX_CHARS:
+        return None
+    lower = line.lower()
+    return next((key for key, words in SECTION_KEYWORDS.items() if any(w in lower for w in words)), None)
+
+
+def criteria_sections(text: str, max_chars: int) -> Dict[str, str]:
+    """Return the longest section of each kind of criteria in ``text``.
+
+    A section starts at a short line naming the criteria and ends at a
+    heading of the other kind or a numbered heading at the same or a
+    higher level (so entries of a table of contents stay short).
+    """
+    found: Dict[str, List[str]] = {}
+    current: Optional[List[Any]] = None  # [kind, depth, lines]
+
+    def close() -> None:
+        if current and len(current[2]) > 1:
+            found.setdefault(current[0], []).append("\n".join(current[2])[:max_chars])
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        kind = _heading_kind(line)
+        number = _NUMBERED.match(line)
+        depth = number.group(1).count(".") + 1 if number else None
+        ends = current is not None and (
+            (kind is not None and kind != current[0])
+            or (depth is not None and current[1] is not None and depth <= current[1])
+        )
+        if ends:
+            close()
+            current = None
+        if current is None and kind:
+            current = [kind, depth, [line]]
+        elif current is not None:
+            current[2].append(line)
+    close()
+    return {kind: max(sections, key=len) for kind, sections in found.items()}
+
+
+class DocumentCache:
+    """SQLite cache of extracted document texts keyed by content hash.
+
+    The connection is shared between threads and guarded by a lock.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM texts WHERE sha256 = ?", (digest,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def set(self, digest: str, text: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO texts (sha256, text, created_at) VALUES (?, ?, ?)",
+                (digest, zlib.compress(text.encode("utf-8"), 6), time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _flagged(value: Any) -> bool:
+    return value is True or str(value).lower() in ("true", "yes")
+
+
+class DocumentIngestor:
+    """Attach the criteria sections of its documents to a publication detail."""
+
+    def __init__(
+        self,
+        source: DocumentSource,
+        cache: Optional[DocumentCache] = None,
+        max_bytes: int = 20 * 2 ** 20,
+        max_chars: int = 200000,
+        section_chars: int = 4000,
+    ) -> None:
+        self.source = source
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.section_chars = section_chars
+
+    def text(self, doc: Document) -> str:
+        """Download ``doc`` and return its text, from the cache if the content is known.
+
+        Raises ``ValueError`` if the document exceeds ``max_bytes``.
+        """
+        if doc.size is not None and doc.size > self.max_bytes:
+            raise ValueError(f"{doc.name} has {doc.size} bytes, more than {self.max_bytes}")
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+            with metrics.timer("documents.download"), contextlib.closing(
+                self.source.chunks(doc, self.max_bytes)
+            ) as chunks:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"{doc.name} is larger than {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    spool.write(chunk)
+            metrics.incr("documents.downloaded")
+            metrics.incr("documents.bytes", size)
+            key = digest.hexdigest()
+            text = self.cache.get(key) if self.cache else None
+            if text is not None:
+                return text
+            spool.seek(0)
+            with metrics.timer("documents.extract"):
+                text = extract_text(spool, doc.name, self.max_chars)
+        if self.cache and text:
+            self.cache.set(key, text)
+        return text
+
+    def criteria(self, detail: PublicationDetail) -> Dict[str, List[Dict[str, Any]]]:
+        """Return criteria sections by kind for the kinds only found in documents.
+
+        Every section becomes one criteria item titled with its document
+        name. Documents that fail or are too large are skipped.
+        """
+        wanted = [
+            key
+            for key in CRITERIA_KEYS
+            if not detail.criteria.get(key) and any(_flagged(v) for v in detail.flags.get(key, ())[:2])
+        ]
+        if not wanted:
+            return {}
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in self.source.list(detail):
+            try:
+                text = self.text(doc)
+            except ValueError as exc:
+                logger.warning("Skipping document of project %s: %s", detail.get("projectId"), exc)
+                metrics.incr("documents.too_large")
+                continue
+            except (requests.RequestException, OSError) as exc:
+                logger.warning("Could not download %s: %s", doc.name, exc)
+                metrics.incr("documents.failed")
+                continue
+            sections = criteria_sections(text, self.section_chars)
+            for key in wanted:
+                if sections.get(key):
+                    out.setdefault(key, []).append({"title": {"de": doc.name}, "description": {"de": sections[key]}})
+                    metrics.incr("documents.sections")
+        return out
+
+    def ingest(self, detail: Dict[str, Any]) -> PublicationDetail:
+        """Return the detail record with :meth:`criteria` as its ``documents``."""
+        record = PublicationDetail.from_dict(detail)
+        found = self.criteria(record)
+        if not found:
+            return record
+        logger.info("Found %s in the documents of project %s", ", ".join(found), record.get("projectId"))
+        return dataclasses.replace(record, documents=found)
+
+    def stats(self) -> Optional[Dict[str, int]]:
+        return self.cache.stats() if self.cache else None
+
+    def close(self) -> None:
+        if self.cache:
+            self.cache.close()
+
+
+def open_ingestor() -> Optional[DocumentIngestor]:
+    """Return the ingestor configured by ``DOCUMENTS_*``; ``None`` if disabled."""
+    if not config.DOCUMENTS_INGEST:
+        return None
+    source = LocalDocumentSource(config.DOCUMENTS_DIR) if config.DOCUMENTS_DIR else SimapDocumentSource()
+    cache = None
+    if config.DOCUMENTS_CACHE_PATH:
+        try:
+            cache = DocumentCache(config.DOCUMENTS_CACHE_PATH)
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning(
+                "Cannot open document cache %s, continuing without it: %s", config.DOCUMENTS_CACHE_PATH, exc
+            )
+    return DocumentIngestor(
+        source,
+        cache=cache,
+        max_bytes=int(config.DOCUMENTS_MAX_MB * 2 ** 20),
+        max_chars=config.DOCUMENTS_MAX_CHARS,
+        section_chars=config.DOCUMENTS_SECTION_CHARS,
+    )
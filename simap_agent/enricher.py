@@ -1,101 +1,242 @@
 """Functions that call OpenAI to enrich SIMAP project data."""
 
+import copy
 import json
 import logging
-from typing import Any, Dict, List
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
-from openai import AzureOpenAI
-
-from simap_agent import config
+from simap_agent import config, metrics
+from simap_agent.extract import KEY_FIELDS, extract_project
+from simap_agent.llm_cache import ResponseCache, request_key
+from simap_agent.payload import compact_json, count_tokens
+from simap_agent.records import PublicationDetail
+from simap_agent.throttle import RequestBudget, parse_retry_after
 
 logger = logging.getLogger(__name__)
 
-openai_client = AzureOpenAI(
-    api_key=config.OPENAI_API_KEY,
-    azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
-    api_version=config.OPENAI_API_VERSION,
-)
+_client: Any = None
+_cache: Optional[ResponseCache] = None
+_cache_unavailable = False
+_cache_lock = threading.Lock()
+_budget: Optional[RequestBudget] = None
 
+# Rough completion size reserved in the token budget for every request
+COMPLETION_TOKEN_ESTIMATE = 500
 
-def summarize_criteria(criteria: List[Dict[str, Any]], name: str) -> str:
-    """Return short German bullet summary for criteria via OpenAI."""
-    if not criteria:
-        return ""
-    logger.debug("Summarizing %s via OpenAI", name)
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {
-                "role": "system",
-                "content": f"""Fasse die folgenden {name} in kurzen Stichpunkten auf deutsch zusammen. 
+
+def get_openai_client() -> Any:
+    """Return the shared Azure OpenAI client, importing ``openai`` on first use."""
+    global _client
+    with _cache_lock:
+        if _client is None:
+            config.require("OPENAI_API_KEY")
+            from openai import AzureOpenAI
+
+            _client = AzureOpenAI(
+                api_key=config.OPENAI_API_KEY,
+                azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+                api_version=config.OPENAI_API_VERSION,
+            )
+        return _client
+
+
+def reset() -> None:
+    """Drop the shared client, cache and budget so they are rebuilt from config."""
+    global _client, _cache, _budget, _cache_unavailable
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _client = _cache = _budget = None
+        _cache_unavailable = False
+
+
+def __getattr__(name: str) -> Any:
+    # ``openai_client`` and ``RateLimitError`` stay importable without
+    # paying for the openai import when the module is loaded
+    if name == "openai_client":
+        return get_openai_client()
+    if name == "RateLimitError":
+        from openai import RateLimitError
+
+        return RateLimitError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Return the shared response cache or ``None`` if it is disabled."""
+    global _cache, _cache_unavailable
+    if not config.LLM_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None and not _cache_unavailable:
+            try:
+                _cache = ResponseCache(
+                    config.LLM_CACHE_PATH,
+                    ttl=config.LLM_CACHE_TTL_HOURS * 3600,
+                    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                )
+            except (OSError, sqlite3.Error) as exc:
+                logger.warning("Cannot open LLM cache %s, continuing without it: %s", config.LLM_CACHE_PATH, exc)
+                _cache_unavailable = True
+        return _cache
+
+
+def get_budget() -> RequestBudget:
+    """Return the request/token budget shared by all enrichment threads."""
+    global _budget
+    with _cache_lock:
+        if _budget is None:
+            _budget = RequestBudget(config.OPENAI_RPM_LIMIT, config.OPENAI_TPM_LIMIT)
+        return _budget
+
+
+def _request_tokens(request: Dict[str, Any]) -> int:
+    prompt = json.dumps(request.get("messages"), ensure_ascii=False)
+    if request.get("functions"):
+        prompt += json.dumps(request["functions"], ensure_ascii=False)
+    return count_tokens(prompt) + COMPLETION_TOKEN_ESTIMATE
+
+
+def _retry_after(exc: Exception) -> float:
+    headers = getattr(exc.response, "headers", None) or {}
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000
+        except ValueError:
+            pass
+    delay = parse_retry_after(headers.get("retry-after"))
+    return delay if delay is not None else 10.0
+
+
+def _create(request: Dict[str, Any]) -> Any:
+    """Send a request within the RPM/TPM budget, waiting out 429 responses."""
+    from openai import RateLimitError
+
+    client = get_openai_client()
+    budget = get_budget()
+    tokens = _request_tokens(request)
+    for attempt in range(1, config.OPENAI_MAX_ATTEMPTS + 1):
+        budget.acquire(tokens)
+        try:
+            with metrics.timer("openai.chat"):
+                resp = client.chat.completions.create(**request)
+            metrics.incr("openai.requests")
+            metrics.incr(f"openai.requests.{request.get('model')}")
+            metrics.record_usage(getattr(resp, "usage", None))
+            return resp
+        except RateLimitError as exc:
+            metrics.incr("openai.rate_limited")
+            if attempt == config.OPENAI_MAX_ATTEMPTS:
+                raise
+            delay = _retry_after(exc)
+            logger.warning("OpenAI rate limit hit, pausing %.1fs (attempt %d)", delay, attempt)
+            budget.pause(delay)
+    raise AssertionError("unreachable")  # pragma: no cover
+
+
+def _complete(**request: Any) -> str:
+    """Run a chat completion and return the function arguments or content.
+
+    Identical requests are answered from the response cache without calling
+    OpenAI.
+    """
+    cache = get_cache()
+    key = request_key(request) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            logger.debug("OpenAI response served from cache")
+            metrics.incr("openai.cache_hits")
+            return cached
+    resp = _create(request)
+    message = resp.choices[0].message
+    text = message.function_call.arguments if request.get("functions") else message.content
+    if cache:
+        cache.set(key, text)
+    return text
+
+
+def _to_prompt_json(value: Any, label: Optional[str] = None, original: Any = None) -> str:
+    """Serialize ``value`` for a prompt, compacted unless disabled.
+
+    ``original`` is the unreduced data ``value`` was taken from; the logged
+    token saving is measured against it.
+    """
+    if not config.PAYLOAD_COMPACT:
+        return json.dumps(value, ensure_ascii=False, indent=2)
+    return compact_json(value, config.PAYLOAD_DROP_KEYS, label=label, original=original)
+
+
+CRITERIA_PROMPT = """Fasse die folgenden {name} in kurzen Stichpunkten auf deutsch zusammen. 
                 Eignungskriterien und Zuschlagskriterien sollten in jeweils weniger als 300 Zeichen zusammengefasst werden.
                 Mache es so kurz wie möglich, sodass ein erste Überblick gewährt wird fasse es gerne sinnhaft zusammen.
                 Verwende KEIN Markdown oder HTML, sondern nur reinen Text es kann ansonten leider nicht angezeigt werden.
                 Sollten mehr Infos nötig sein Schreibe in deiner Nachricht das weitere Kriterien auf SIMAP zu finden sind"""
-            },
-            {"role": "user", "content": json.dumps(criteria, ensure_ascii=False, indent=2)},
+
+
+def build_criteria_request(criteria: List[Dict[str, Any]], name: str) -> Dict[str, Any]:
+    """Return the chat completion request summarizing ``criteria``."""
+    return {
+        "model": config.OPENAI_DEPLOYMENT,
+        "messages": [
+            {"role": "system", "content": CRITERIA_PROMPT.format(name=name)},
+            {"role": "user", "content": _to_prompt_json(criteria)},
         ],
-        temperature=0.2,
-    )
-    return resp.choices[0].message.content.strip()
+        "temperature": 0.2,
+    }
+
+
+def summarize_criteria(criteria: List[Dict[str, Any]], name: str) -> str:
+    """Return short German bullet summary for criteria via OpenAI."""
+    if not criteria:
+        return ""
+    logger.debug("Summarizing %s via OpenAI", name)
+    return _complete(**build_criteria_request(criteria, name)).strip()
+
+
+# Teams a project can be assigned to, shared by every function schema
+TEAMS = ("Products", "Engineering", "Data&AI")
+TEAM_SCHEMA = {"type": "string", "enum": list(TEAMS)}
 
+# Only judgement goes to the model; the project fields are read from the
+# detail by :func:`simap_agent.extract.extract_project`
 ENRICH_FUNC = [
     {
         "name": "enrich_project",
         "description": (
-            "Analysiere ein SIMAP-Projekt, fasse es kurz zusammen, "
-            "extrahiere nur deutsche Werte, ordne es einem Team zu "
-            "(Products, Engineering, Data&AI), gib einen Apply-Score 1–10 wie sehr das Projekt aus basis unserer Skills zu uns passen würde (1 garnicht - 10 wir sind ein fit) "
-            "und liste fehlende Felder als MissingInfo auf."
+            "Analysiere ein SIMAP-Projekt, fasse es kurz zusammen, ordne es einem Team zu "
+            "(Products, Engineering, Data&AI) und gib einen Apply-Score 1–10 wie sehr das Projekt aus basis unserer Skills zu uns passen würde (1 garnicht - 10 wir sind ein fit)."
         ),
         "parameters": {
             "type": "object",
             "properties": {
                 "summary": {"type": "string"},
-                "project": {
-                    "type": "object",
-                    "properties": {
-                        "title_de": {"type": "string"},
-                        "customer": {"type": "string"},
-                        "location": {"type": "string"},
-                        "projectNumber": {"type": "string"},
-                        "projectId": {"type": "string"},
-                        "publicationDate": {"type": "string"},
-                        "offerDeadline": {"type": "string"},
-                        "contract_start": {"type": "string"},
-                        "qna_deadline": {"type": "string"},
-                        "cpvCode": {
-                            "type": "object",
-                            "properties": {
-                                "code": {"type": "string"},
-                                "label_de": {"type": "string"},
-                            },
-                            "required": ["code", "label_de"],
-                        },
-                    },
-                    "required": [
-                        "qna_deadline",
-                        "title_de",
-                        "customer",
-                        "location",
-                        "projectId",
-                        "publicationDate",
-                        "offerDeadline",
-                        "contract_start",
-                        "cpvCode",
-                        "projectNumber",
-                    ],
-                },
-                "team": {"type": "string", "enum": ["Products", "Engineering", "Data&AI"]},
+                "team": TEAM_SCHEMA,
                 "apply_score": {"type": "integer"},
-                "missing_info": {"type": "array", "items": {"type": "string"}},
             },
-            "required": ["summary", "project", "team", "apply_score", "missing_info"],
+            "required": ["summary", "team", "apply_score"],
         },
     }
 ]
 
 
+# Criteria keys in the detail and their German names
+CRITERIA_KINDS = (
+    ("qualificationCriteria", "Eignungskriterien"),
+    ("awardCriteria", "Zuschlagskriterien"),
+)
+
+# enrich_project variant that also returns both criteria summaries
+ENRICH_FUNC_WITH_CRITERIA = copy.deepcopy(ENRICH_FUNC)
+ENRICH_FUNC_WITH_CRITERIA[0]["parameters"]["properties"].update(
+    {f"{key}Summary": {"type": "string"} for key, _ in CRITERIA_KINDS}
+)
+
+
 TARGET_KEYS = [
     "title_de",
     "customer",
@@ -120,111 +261,171 @@ MISSING_INFO_FIELDS = {
 }
 
 
-def enrich(detail: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
-    """Enrich a single project using OpenAI."""
-    system_content = (
-        "Du bist RFP-Analyst fuer Mesoneer ag. Nutze nur deutsche Felder und analysiere wie folgt:\n"
-        "1. Zusammenfassung (2-3 Saetze)\n"
-        "2. Extrahiere relevante Felder\n"
-        "3. Teamzuordnung\n"
-        "4. Apply-Score 1-10 - (Wie interessant wäre die Bewerbung vin Aus 1 nicht relevant, 10 Sehr sehr guter Fit für uns)\n"
-        "5. Liste fehlende Felder"
+def collect_criteria(detail: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Return qualification and award criteria of a detail by key.
+
+    Criteria are taken from the top level, the criteria block or the lots,
+    otherwise from the sections found in attached documents.
+    """
+    record = PublicationDetail.from_dict(detail)
+    return {key: list(record.criteria.get(key) or record.documents.get(key) or []) for key, _ in CRITERIA_KINDS}
+
+
+ENRICH_PROMPT = (
+    "Du bist RFP-Analyst fuer Mesoneer ag. Nutze nur deutsche Felder und analysiere wie folgt:\n"
+    "1. Zusammenfassung (2-3 Saetze)\n"
+    "2. Teamzuordnung\n"
+    "3. Apply-Score 1-10 - (Wie interessant wäre die Bewerbung vin Aus 1 nicht relevant, 10 Sehr sehr guter Fit für uns)"
+)
+CRITERIA_INSTRUCTION = (
+    "Fasse QUALIFICATION_CRITERIA (Eignungskriterien) und AWARD_CRITERIA (Zuschlagskriterien) "
+    "jeweils in kurzen Stichpunkten auf deutsch in weniger als 300 Zeichen zusammen. "
+    "Verwende KEIN Markdown oder HTML. Sollten mehr Infos nötig sein, schreibe dass weitere Kriterien auf SIMAP zu finden sind."
+)
+CRITERIA_STEP = "\n4. " + CRITERIA_INSTRUCTION
+CRITERIA_PROMPT_LABELS = {
+    "qualificationCriteria": "QUALIFICATION_CRITERIA",
+    "awardCriteria": "AWARD_CRITERIA",
+}
+
+
+def _criteria_sections(criteria: Dict[str, List[Dict[str, Any]]]) -> str:
+    return "".join(
+        f"\n\n{CRITERIA_PROMPT_LABELS[key]} =\n" + _to_prompt_json(items) for key, items in criteria.items() if items
     )
-    logger.debug("Calling OpenAI for project %s", detail.get("id"))
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
+
+
+def build_enrich_request(
+    detail: Dict[str, Any],
+    profile: Dict[str, Any],
+    criteria: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+) -> Dict[str, Any]:
+    """Return the ``enrich_project`` chat completion request for a detail.
+
+    If ``criteria`` contains any items they are sent as separate sections
+    and the model also returns the criteria summaries.
+    """
+    record = PublicationDetail.from_dict(detail)
+    system_content = ENRICH_PROMPT
+    project = record.to_dict()
+    project.update((key, items) for key, items in record.documents.items() if items and key not in project)
+    functions = ENRICH_FUNC
+    sections = ""
+    if criteria and any(criteria.values()):
+        system_content += CRITERIA_STEP
+        project = record.fields
+        functions = ENRICH_FUNC_WITH_CRITERIA
+        sections = _criteria_sections(criteria)
+    return {
+        "model": config.OPENAI_DEPLOYMENT,
+        "messages": [
             {"role": "system", "content": system_content},
             {
                 "role": "user",
                 "content": "PROJECT_JSON =\n"
-                + json.dumps(detail, ensure_ascii=False, indent=2)
+                + _to_prompt_json(project, label=f"project {detail.get('id')}", original=detail)
                 + "\n\nCOMPANY_PROFILE =\n"
-                + json.dumps(profile, ensure_ascii=False, indent=2),
+                + _to_prompt_json(profile)
+                + sections,
             },
         ],
-        functions=ENRICH_FUNC,
-        function_call={"name": "enrich_project"},
-        temperature=0.2,
-    )
-    args = resp.choices[0].message.function_call.arguments
-    logger.debug("OpenAI response received for project %s", detail.get("id"))
-    data = json.loads(args)
-    proj = data.get("project", {})
-    for k in TARGET_KEYS:
-        proj.setdefault(k, None)
-
-    # Collect qualification and award criteria from top level, lots or criteria block
-    criteria_block = detail.get("criteria") or {}
-
-    qual = detail.get("qualificationCriteria") or criteria_block.get("qualificationCriteria") or []
-    if not qual:
-        for lot in detail.get("lots", []):
-            lot_criteria = lot.get("criteria") or {}
-            qual.extend(lot.get("qualificationCriteria") or lot_criteria.get("qualificationCriteria") or [])
-
-    qual_in_docs = detail.get("qualificationCriteriaInDocuments")
-    if qual_in_docs is None:
-        qual_in_docs = criteria_block.get("qualificationCriteriaInDocuments")
-
-    qual_as_pdf = detail.get("qualificationCriteriaAsPDF")
-    if qual_as_pdf is None:
-        qual_as_pdf = criteria_block.get("qualificationCriteriaAsPDF")
-
-    qual_sel = criteria_block.get("qualificationCriteriaSelection")
-    if qual_sel == "criteria_in_documents":
-        qual_in_docs = True
-    elif qual_sel == "criteria_as_pdf":
-        qual_as_pdf = True
-
-    qual_note = criteria_block.get("qualificationCriteriaNote") or detail.get("qualificationCriteriaNote")
-    if qual_in_docs is not None:
-        data["qualificationCriteriaInDocuments"] = qual_in_docs
-    if qual_as_pdf is not None:
-        data["qualificationCriteriaAsPDF"] = qual_as_pdf
-    if qual:
-        data["qualificationCriteria"] = qual
-        data["qualificationCriteriaSummary"] = summarize_criteria(qual, "Eignungskriterien")
-    elif qual_note:
-        # use German note as summary if present
-        summary = (qual_note.get("de") or "").strip()
-        if summary:
-            data["qualificationCriteriaSummary"] = summary
-
-    award = detail.get("awardCriteria") or criteria_block.get("awardCriteria") or []
-    if not award:
-        for lot in detail.get("lots", []):
-            lot_criteria = lot.get("criteria") or {}
-            award.extend(lot.get("awardCriteria") or lot_criteria.get("awardCriteria") or [])
-
-    award_in_docs = detail.get("awardCriteriaInDocuments")
-    if award_in_docs is None:
-        award_in_docs = criteria_block.get("awardCriteriaInDocuments")
-
-    award_as_pdf = detail.get("awardCriteriaAsPDF")
-    if award_as_pdf is None:
-        award_as_pdf = criteria_block.get("awardCriteriaAsPDF")
-
-    award_sel = criteria_block.get("awardCriteriaSelection")
-    if award_sel == "criteria_in_documents":
-        award_in_docs = True
-    elif award_sel == "criteria_as_pdf":
-        award_as_pdf = True
-
-    award_note = criteria_block.get("awardCriteriaNote") or detail.get("awardCriteriaNote")
-    if award_in_docs is not None:
-        data["awardCriteriaInDocuments"] = award_in_docs
-    if award_as_pdf is not None:
-        data["awardCriteriaAsPDF"] = award_as_pdf
-    if award:
-        data["awardCriteria"] = award
-        data["awardCriteriaSummary"] = summarize_criteria(award, "Zuschlagskriterien")
-    elif award_note:
-        summary = (award_note.get("de") or "").strip()
-        if summary:
-            data["awardCriteriaSummary"] = summary
+        "functions": functions,
+        "function_call": {"name": "enrich_project"},
+        "temperature": 0.2,
+    }
 
 
+TRIAGE_PROMPT = (
+    "Du bist RFP-Analyst fuer Mesoneer ag. Nutze nur deutsche Felder, ordne das Projekt einem Team zu "
+    "und gib einen Apply-Score 1-10 (1 nicht relevant, 10 sehr guter Fit für uns)."
+)
+TRIAGE_FUNC = [
+    {
+        "name": "triage_project",
+        "description": "Ordne ein SIMAP-Projekt einem Team zu und schätze den Apply-Score 1–10.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "team": TEAM_SCHEMA,
+                "apply_score": {"type": "integer"},
+            },
+            "required": ["team", "apply_score"],
+        },
+    }
+]
+
+
+def build_triage_request(detail: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the first-pass ``triage_project`` request for the cheap deployment.
+
+    Only the project without its criteria is sent.
+    """
+    record = PublicationDetail.from_dict(detail)
+    return {
+        "model": config.OPENAI_TRIAGE_DEPLOYMENT,
+        "messages": [
+            {"role": "system", "content": TRIAGE_PROMPT},
+            {
+                "role": "user",
+                "content": "PROJECT_JSON =\n"
+                + _to_prompt_json(record.fields)
+                + "\n\nCOMPANY_PROFILE =\n"
+                + _to_prompt_json(profile),
+            },
+        ],
+        "functions": TRIAGE_FUNC,
+        "function_call": {"name": "triage_project"},
+        "temperature": 0.0,
+    }
+
+
+def escalates(apply_score: Any) -> bool:
+    """Return True if a first-pass score is close enough to the threshold for the full analysis."""
+    score = apply_score if isinstance(apply_score, (int, float)) else 0
+    return score >= config.APPLY_SCORE_THRESHOLD - config.ENRICH_CASCADE_BAND
+
+
+def finalize(
+    detail: Dict[str, Any],
+    data: Dict[str, Any],
+    criteria: Dict[str, List[Dict[str, Any]]],
+    summaries: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Add project fields, criteria, criteria flags and missing_info to an ``enrich_project`` result.
+
+    The project fields extracted from the detail take precedence over a
+    ``project`` in ``data`` (older cached responses or a reused enrichment),
+    which only fills fields the detail does not have. ``summaries`` holds
+    criteria summaries from separate requests; they take precedence over
+    summaries returned inside ``data``.
+    """
+    summaries = summaries or {}
+    record = PublicationDetail.from_dict(detail)
+    proj = dict.fromkeys(TARGET_KEYS)
+    proj.update(data.get("project") or {})
+    proj.update((k, v) for k, v in extract_project(record).items() if v is not None)
+    data["project"] = proj
+    not_found = [key for key in KEY_FIELDS if not proj.get(key)]
+    if not_found:
+        logger.warning("Project %s: %s not found in the detail", record.get("id"), ", ".join(not_found))
+
+    for key, _ in CRITERIA_KINDS:
+        in_docs, as_pdf, note = record.flags[key]
+        summary_key = f"{key}Summary"
+        model_summary = (data.pop(summary_key, None) or "").strip()
+        if in_docs is not None:
+            data[f"{key}InDocuments"] = in_docs
+        if as_pdf is not None:
+            data[f"{key}AsPDF"] = as_pdf
+        if criteria.get(key):
+            data[key] = criteria[key]
+            data[summary_key] = summaries.get(key) or model_summary
+        elif note:
+            # use German note as summary if present
+            summary = (note.get("de") or "").strip()
+            if summary:
+                data[summary_key] = summary
+
     # Build missing_info list only from fields we expect in Slack.
     missing: List[str] = []
     # project-level checks
@@ -232,32 +433,236 @@ def enrich(detail: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
         missing.append(MISSING_INFO_FIELDS["projectId"])
     if not proj.get("qna_deadline"):
         missing.append(MISSING_INFO_FIELDS["qna_deadline"])
-    # qualification criteria
-    if not (
-        data.get("qualificationCriteria")
-        or data.get("qualificationCriteriaInDocuments")
-        or data.get("qualificationCriteriaAsPDF")
-        or data.get("qualificationCriteriaSummary")
-    ):
-        missing.append(MISSING_INFO_FIELDS["qualificationCriteria"])
-    # award criteria
-    if not (
-        data.get("awardCriteria")
-        or data.get("awardCriteriaInDocuments")
-        or data.get("awardCriteriaAsPDF")
-        or data.get("awardCriteriaSummary")
-    ):
-        missing.append(MISSING_INFO_FIELDS["awardCriteria"])
+    for key, _ in CRITERIA_KINDS:
+        if not (
+            data.get(key)
+            or data.get(f"{key}InDocuments")
+            or data.get(f"{key}AsPDF")
+            or data.get(f"{key}Summary")
+        ):
+            missing.append(MISSING_INFO_FIELDS[key])
 
     data["missing_info"] = missing
+    return data
+
 
+def enrich(detail: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Enrich a single project using OpenAI.
+
+    With ``ENRICH_CASCADE`` the triage deployment scores the project first;
+    unless :func:`escalates` is true its team and score are the result
+    (``tier`` ``"triage"``, without summaries). Otherwise the project gets
+    the full analysis (``tier`` ``"full"``).
+    """
+    detail = PublicationDetail.from_dict(detail)
+    if config.ENRICH_CASCADE:
+        with metrics.timer("enrich.tier.triage"):
+            first = json.loads(_complete(**build_triage_request(detail, profile)))
+        if not escalates(first.get("apply_score")):
+            logger.debug("Project %s settled by triage with score %s", detail.get("id"), first.get("apply_score"))
+            metrics.incr("enrich.settled")
+            first["tier"] = "triage"
+            return finalize(detail, first, collect_criteria(detail))
+        metrics.incr("enrich.escalated")
+        logger.debug("Escalating project %s with triage score %s", detail.get("id"), first.get("apply_score"))
+    with metrics.timer("enrich.tier.full"):
+        data = _enrich_full(detail, profile)
+    if config.ENRICH_CASCADE:
+        data["tier"] = "full"
     return data
 
 
-def enrich_batch(details: List[Dict[str, Any]], profile: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Run :func:`enrich` for a list of project details."""
-    results = []
-    for d in details:
+def _enrich_full(detail: PublicationDetail, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the full analysis of a project.
+
+    With ``ENRICH_SINGLE_CALL`` the criteria summaries come back in the same
+    function call; criteria the model did not summarize fall back to
+    :func:`summarize_criteria`. Otherwise both summaries are requested
+    separately, in parallel to the main analysis.
+    """
+    criteria = collect_criteria(detail)
+    single_call = config.ENRICH_SINGLE_CALL
+    with ThreadPoolExecutor(max_workers=len(CRITERIA_KINDS)) as pool:
+        pending = {}
+        if not single_call:
+            pending = {
+                key: pool.submit(summarize_criteria, criteria[key], name)
+                for key, name in CRITERIA_KINDS
+                if criteria[key]
+            }
+        logger.debug("Calling OpenAI for project %s", detail.get("id"))
+        args = _complete(**build_enrich_request(detail, profile, criteria if single_call else None))
+    logger.debug("OpenAI response received for project %s", detail.get("id"))
+    data = json.loads(args)
+    summaries = {key: future.result() for key, future in pending.items()}
+
+    if single_call:
+        summaries.update(_fallback_summaries(detail, criteria, data))
+    return finalize(detail, data, criteria, summaries)
+
+
+def _fallback_summaries(
+    detail: PublicationDetail, criteria: Dict[str, List[Dict[str, Any]]], data: Dict[str, Any]
+) -> Dict[str, str]:
+    """Request the summaries of the criteria the model left out of ``data``."""
+    missing = [
+        (key, name)
+        for key, name in CRITERIA_KINDS
+        if criteria[key] and not (data.get(f"{key}Summary") or "").strip()
+    ]
+    if not missing:
+        return {}
+    logger.debug("Falling back to separate criteria summaries for project %s", detail.get("id"))
+    with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+        futures = {key: pool.submit(summarize_criteria, criteria[key], name) for key, name in missing}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def enrich_batch(
+    details: List[Dict[str, Any]],
+    profile: Dict[str, Any],
+    concurrency: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Run :func:`enrich` for a list of project details.
+
+    Up to ``concurrency`` projects (default ``OPENAI_MAX_CONCURRENCY``) are
+    enriched at once within the shared RPM/TPM budget. The results keep the
+    order of ``details``. With ``ENRICH_MODE=batch`` all requests go through
+    one Batch API job instead.
+    """
+    if config.ENRICH_MODE == "batch" and details:
+        from simap_agent.batch import enrich_batch_offline
+
+        return enrich_batch_offline(details, profile)
+    if concurrency is None:
+        concurrency = config.OPENAI_MAX_CONCURRENCY
+
+    def run(d: Dict[str, Any]) -> Dict[str, Any]:
         logger.info("Enriching project %s", d.get("id"))
-        results.append(enrich(d, profile))
+        return enrich(d, profile)
+
+    if concurrency <= 1 or len(details) <= 1:
+        return [run(d) for d in details]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(run, details))
+
+
+PROFILES_PROMPT = (
+    "Du bist RFP-Analyst. Nutze nur deutsche Felder und analysiere wie folgt:\n"
+    "1. Zusammenfassung (2-3 Saetze)\n"
+    "2. Für jedes Profil in COMPANY_PROFILES: Teamzuordnung und Apply-Score 1-10 "
+    "(1 nicht relevant, 10 sehr guter Fit für dieses Profil)"
+)
+SCORES_PROMPT = (
+    "Du bist RFP-Analyst. Nutze nur deutsche Felder. Gib für jedes Profil in COMPANY_PROFILES "
+    "eine Teamzuordnung und einen Apply-Score 1-10 (1 nicht relevant, 10 sehr guter Fit für dieses Profil)."
+)
+
+
+def _scores_schema(names: List[str]) -> Dict[str, Any]:
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "profile": {"type": "string", "enum": names},
+                "team": TEAM_SCHEMA,
+                "apply_score": {"type": "integer"},
+            },
+            "required": ["profile", "team", "apply_score"],
+        },
+    }
+
+
+def build_profiles_request(
+    detail: Dict[str, Any],
+    profiles: Dict[str, Dict[str, Any]],
+    criteria: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    with_summary: bool = True,
+) -> Dict[str, Any]:
+    """Return one request scoring a detail against several named profiles.
+
+    With ``with_summary`` the model also writes the summary and, if
+    ``criteria`` contains any items, the criteria summaries
+    (``enrich_project_for_profiles``); otherwise it only returns the
+    scores (``score_profiles``).
+    """
+    record = PublicationDetail.from_dict(detail)
+    properties: Dict[str, Any] = {"scores": _scores_schema(list(profiles))}
+    system_content, name, project, sections = SCORES_PROMPT, "score_profiles", record.fields, ""
+    if with_summary:
+        system_content, name = PROFILES_PROMPT, "enrich_project_for_profiles"
+        properties = {"summary": {"type": "string"}, **properties}
+        if criteria and any(criteria.values()):
+            system_content += "\n3. " + CRITERIA_INSTRUCTION
+            properties.update({f"{key}Summary": {"type": "string"} for key, _ in CRITERIA_KINDS})
+            sections = _criteria_sections(criteria)
+        else:
+            project = record.to_dict()
+            project.update((key, items) for key, items in record.documents.items() if items and key not in project)
+    return {
+        "model": config.OPENAI_DEPLOYMENT,
+        "messages": [
+            {"role": "system", "content": system_content},
+            {
+                "role": "user",
+                "content": "PROJECT_JSON =\n"
+                + _to_prompt_json(project, label=f"project {detail.get('id')}", original=detail)
+                + "\n\nCOMPANY_PROFILES =\n"
+                + _to_prompt_json(profiles)
+                + sections,
+            },
+        ],
+        "functions": [
+            {
+                "name": name,
+                "description": "Bewerte ein SIMAP-Projekt für mehrere Firmenprofile.",
+                "parameters": {"type": "object", "properties": properties, "required": list(properties)},
+            }
+        ],
+        "function_call": {"name": name},
+        "temperature": 0.2,
+    }
+
+
+def enrich_for_profiles(detail: Dict[str, Any], profiles: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Enrich a project once and score it for every profile in ``profiles``.
+
+    Up to ``TENANT_PROFILES_PER_CALL`` profiles are scored in one request;
+    only the first request also returns the summary and criteria summaries,
+    which every profile shares. Returns the enrichment of every profile by
+    name, post-processed by :func:`finalize`.
+    """
+    if not profiles:
+        return {}
+    detail = PublicationDetail.from_dict(detail)
+    criteria = collect_criteria(detail)
+    names = list(profiles)
+    size = max(1, config.TENANT_PROFILES_PER_CALL)
+    chunks = [names[i:i + size] for i in range(0, len(names), size)]
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [
+            pool.submit(
+                _complete,
+                **build_profiles_request(detail, {n: profiles[n] for n in chunk}, criteria, with_summary=i == 0),
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+        answers = [json.loads(future.result()) for future in futures]
+    metrics.incr("enrich.profile_requests", len(chunks))
+    shared = answers[0]
+    summaries = _fallback_summaries(detail, criteria, shared)
+    scores = {
+        s.get("profile"): s for answer in answers for s in answer.get("scores") or [] if isinstance(s, dict)
+    }
+
+    results = {}
+    for name in names:
+        score = scores.get(name)
+        if score is None:
+            logger.warning("No score for profile %s on project %s", name, detail.get("id"))
+            score = {}
+        data = {k: v for k, v in shared.items() if k.endswith("Summary")}
+        data.update(summary=shared.get("summary"), team=score.get("team"), apply_score=score.get("apply_score", 0))
+        results[name] = finalize(detail, data, criteria, summaries)
     return results
@@ -0,0 +1,107 @@
+"""Rule-based extraction of project fields from SIMAP publication details.
+
+IDs, dates, the CPV code and the procurement office are machine-readable in
+the detail response, so they are read from it directly instead of being
+copied out by the model. Every field has a list of candidate paths in the
+detail; the first non-empty value wins and a field without any is ``None``.
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from simap_agent.records import PublicationDetail
+
+Path = Tuple[Union[str, int], ...]
+
+# Candidate locations of every field, most specific first
+PATHS: Dict[str, Sequence[Path]] = {
+    "projectId": (("projectId",),),
+    "projectNumber": (("projectNumber",), ("base", "projectNumber"), ("project-info", "projectNumber")),
+    "title_de": (("base", "projectTitle"), ("project-info", "title"), ("title",)),
+    "customer": (
+        ("project-info", "procOfficeAddress", "name"),
+        ("base", "procOfficeAddress", "name"),
+        ("procOfficeAddress", "name"),
+        ("project-info", "orderAddress", "name"),
+    ),
+    "location": (
+        ("procurement", "executionPlace"),
+        ("procurement", "placeOfPerformance"),
+        ("lots", 0, "executionPlace"),
+        ("lots", 0, "placeOfPerformance"),
+    ),
+    "publicationDate": (("publicationDate",), ("base", "publicationDate"), ("dates", "publicationDate")),
+    "offerDeadline": (("dates", "offerDeadline"), ("offerDeadline",), ("base", "offerDeadline")),
+    "contract_start": (
+        ("procurement", "contractPeriod", "from"),
+        ("terms", "contractPeriod", "from"),
+        ("lots", 0, "contractPeriod", "from"),
+        ("contractPeriod", "from"),
+    ),
+    "qna_deadline": (("dates", "qnaDeadline"), ("qnaDeadline",)),
+    "cpvCode": (("procurement", "cpvCode"), ("cpvCode",), ("base", "cpvCode")),
+}
+
+# Fields returned by :func:`extract_project`
+FIELDS = tuple(PATHS)
+
+# Fields every Slack post shows; a miss usually means a path changed in the SIMAP API
+KEY_FIELDS = ("projectNumber", "title_de", "customer")
+
+
+def _at(value: Any, path: Path) -> Any:
+    for step in path:
+        if isinstance(step, int):
+            if not isinstance(value, list) or len(value) <= step:
+                return None
+            value = value[step]
+        elif isinstance(value, dict):
+            value = value.get(step)
+        else:
+            return None
+    return value
+
+
+def _text(value: Any) -> Optional[str]:
+    """Return the German text of a (reduced) multilingual value or a plain string."""
+    if isinstance(value, dict):
+        value = value.get("de")
+    if isinstance(value, (str, int)) and not isinstance(value, bool):
+        text = str(value).strip()
+        return text or None
+    return None
+
+
+def _place(value: Any) -> Optional[str]:
+    if isinstance(value, dict) and "de" not in value:
+        parts = [_text(value.get(key)) for key in ("city", "canton", "country")]
+        return ", ".join(p for p in parts if p) or None
+    return _text(value)
+
+
+def _cpv(value: Any) -> Optional[Dict[str, Optional[str]]]:
+    if not isinstance(value, dict) or not _text(value.get("code")):
+        return None
+    return {"code": _text(value["code"]), "label_de": _text(value.get("label"))}
+
+
+def _qna_deadline(fields: Dict[str, Any]) -> Optional[str]:
+    """Return the last question deadline of ``dates.qnas``."""
+    qnas = _at(fields, ("dates", "qnas"))
+    dates = [_text(q.get("date")) for q in qnas if isinstance(q, dict)] if isinstance(qnas, list) else []
+    dates = [d for d in dates if d]
+    return max(dates) if dates else None
+
+
+_CONVERTERS = {"location": _place, "cpvCode": _cpv}
+
+
+def extract_project(detail: Union[Dict[str, Any], PublicationDetail]) -> Dict[str, Any]:
+    """Return the project fields of a detail; fields not found are ``None``."""
+    fields = PublicationDetail.from_dict(detail).fields
+    out: Dict[str, Any] = {}
+    for name, paths in PATHS.items():
+        convert = _CONVERTERS.get(name, _text)
+        out[name] = next((v for v in (convert(_at(fields, p)) for p in paths) if v is not None), None)
+    if out["qna_deadline"] is None:
+        out["qna_deadline"] = _qna_deadline(fields)
+    return out
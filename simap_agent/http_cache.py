@@ -0,0 +1,148 @@
+"""Disk-backed HTTP cache for SIMAP GET requests."""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+)
+"""
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Return the cache key of a GET request with query ``params``."""
+    raw = json.dumps([url, params or {}], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Entry(NamedTuple):
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+    def validators(self) -> Dict[str, str]:
+        """Return the conditional request headers for revalidating the entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """SQLite cache of zlib-compressed response bodies.
+
+    Entries are fresh for the TTL given when they are stored. Expired
+    entries with an ``ETag`` or ``Last-Modified`` are kept for conditional
+    requests; a ``304 Not Modified`` answer makes them fresh again via
+    :meth:`refresh`. Once the compressed bodies exceed ``max_bytes`` the
+    least recently used entries are removed.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 200 * 2 ** 20) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Entry]:
+        """Return the entry for ``key``; ``None`` if unknown or expired without validators."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            body, etag, last_modified, expires_at = row
+            fresh = now < expires_at
+            if not fresh and not (etag or last_modified):
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            if fresh:
+                self.hits += 1
+        return Entry(zlib.decompress(body), etag, last_modified, fresh)
+
+    def set(
+        self,
+        key: str,
+        url: str,
+        body: bytes,
+        ttl: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        now = time.time()
+        compressed = zlib.compress(body, 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, url, body, etag, last_modified, expires_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, compressed, etag, last_modified, now + ttl, now, len(compressed)),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, key: str, ttl: float) -> None:
+        """Mark ``key`` fresh for another ``ttl`` seconds after a 304 response."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET expires_at = ?, accessed_at = ? WHERE key = ?", (now + ttl, now, key)
+            )
+            self._conn.commit()
+            self.revalidated += 1
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self._conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS running FROM entries) "
+            "WHERE running > ?)",
+            (self.max_bytes,),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
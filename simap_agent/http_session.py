@@ -0,0 +1,185 @@
+"""Shared HTTP sessions with connection pooling, retries and counters."""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from simap_agent import metrics
+from simap_agent.throttle import AdaptiveRateLimiter, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying because the next attempt may well succeed
+TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+# Status codes that should slow down every caller sharing a rate limiter
+BACKOFF_STATUS_CODES = (429, 503)
+# Methods that can be sent again after a read timeout without repeating a side effect
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class PooledSession:
+    """Keep-alive ``requests.Session`` with jittered exponential retries.
+
+    Transient failures (connection errors, timeouts and the status codes in
+    :data:`TRANSIENT_STATUS_CODES`) are retried up to ``max_attempts`` times.
+    A read timeout of a non-idempotent request (e.g. a Slack webhook POST)
+    is not retried, since the server may already have acted on it.
+    The delay between attempts is the server's ``Retry-After`` if present,
+    otherwise a random value up to ``backoff_base * 2 ** attempt``, both
+    capped at ``backoff_max`` ("full jitter").
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pool_size: int = 10,
+        max_attempts: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 10.0,
+    ) -> None:
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._failures = 0
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _count(self, retry: bool = False, failure: bool = False) -> None:
+        with self._lock:
+            self._requests += 1
+            self._retries += int(retry)
+            self._failures += int(failure)
+        if retry:
+            metrics.incr(f"http.{self.name}.retries")
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Optional[float] = None,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Send a request, retrying transient errors.
+
+        The last response is returned even if it is still a transient error;
+        the last exception is re-raised if every attempt failed to connect.
+        """
+        timeout = timeout or self.timeout
+        for attempt in range(1, self.max_attempts + 1):
+            last_attempt = attempt == self.max_attempts
+            if limiter:
+                limiter.acquire()
+            start = time.monotonic()
+            try:
+                resp = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                metrics.observe(f"http.{self.name}", time.monotonic() - start)
+                metrics.record_http(self.name, type(exc).__name__)
+                # The request may have arrived if only the response timed out
+                sent = isinstance(exc, requests.ReadTimeout) and method.upper() not in IDEMPOTENT_METHODS
+                self._count(retry=not (last_attempt or sent), failure=last_attempt or sent)
+                if last_attempt or sent:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(
+                    "%s %s failed (%s), retry %d/%d in %.1fs",
+                    method, url, exc, attempt, self.max_attempts - 1, delay,
+                )
+                time.sleep(delay)
+                continue
+            metrics.observe(f"http.{self.name}", time.monotonic() - start)
+            metrics.record_http(self.name, resp.status_code)
+
+            if resp.status_code not in TRANSIENT_STATUS_CODES:
+                self._count()
+                if limiter:
+                    limiter.success()
+                return resp
+
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            if retry_after is not None:
+                retry_after = min(retry_after, self.backoff_max)
+            if limiter and resp.status_code in BACKOFF_STATUS_CODES:
+                limiter.backoff(retry_after)
+            self._count(retry=not last_attempt, failure=last_attempt)
+            if last_attempt:
+                return resp
+            delay = retry_after if retry_after is not None else self._backoff_delay(attempt)
+            logger.warning(
+                "%s %s answered %s, retry %d/%d in %.1fs",
+                method, url, resp.status_code, attempt, self.max_attempts - 1, delay,
+            )
+            resp.close()
+            time.sleep(delay)
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """Return request, retry and connection reuse counters."""
+        opened = sent = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            sent += pool.num_requests
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "retries": self._retries,
+                "failures": self._failures,
+                "connections_opened": opened,
+                "connections_reused": max(0, sent - opened),
+            }
+
+
+_sessions: Dict[str, PooledSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(name: str, **kwargs: Any) -> PooledSession:
+    """Return the shared session ``name``, creating it with ``kwargs`` once."""
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = _sessions[name] = PooledSession(name, **kwargs)
+        return session
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Return the counters of every shared session."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    return {s.name: s.stats() for s in sessions}
+
+
+def close_all() -> None:
+    """Close and forget every shared session, e.g. between benchmark runs."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for s in sessions:
+        s.session.close()
@@ -4,14 +4,40 @@ import json
 import logging
 import os
 import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Ensure package imports work when executed directly
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from simap_agent import config
-from simap_agent.simap_client import fetch_project_summaries, fetch_project_details
-from simap_agent.enricher import enrich_batch
-from simap_agent.slack_client import format_slack_blocks, post_blocks
+from simap_agent import config, dedupe, http_session, metrics, pipeline, prefilter
+from simap_agent.store import (
+    STATUS_FAILED,
+    STATUS_POSTED,
+    STATUS_SKIPPED,
+    PublicationStore,
+    RunState,
+    open_store,
+    detail_key,
+    summary_key,
+)
+from simap_agent.simap_client import (
+    default_published_from,
+    detail_endpoint,
+    fetch_project_detail,
+    get_http_cache,
+    iter_project_summaries,
+    iter_sharded_summaries,
+)
+from simap_agent.documents import DocumentIngestor, open_ingestor
+from simap_agent.enricher import enrich, enrich_batch, get_cache
+from simap_agent.pipeline import run_stage
+from simap_agent.records import ProjectSummary, PublicationDetail
+from simap_agent.search_index import TenderIndex, open_index
+from simap_agent.slack_client import SlackDelivery, format_slack_blocks, post_blocks
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -19,24 +45,239 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-COMPANY_PROFILE = config.COMPANY_PROFILE
-VALID_CPV = config.CPV_CODES
 
+@dataclass
+class Tender:
+    """A publication moving through the pipeline stages."""
 
-def main() -> None:
-    """Fetch recent projects, enrich them and post to Slack."""
-    logger.info("Starting SIMAP pipeline")
-    logger.debug("Slack webhook configured: %s", bool(config.SLACK_WEBHOOK_URL))
+    summary: ProjectSummary
+    detail: Optional[PublicationDetail] = None
+    enrichment: Optional[Dict[str, Any]] = None
+    pre_score: Optional[float] = None
+    signature: Optional[dedupe.Signature] = None
+
+
+class Run:
+    """Stage functions and counters of one pipeline run.
+
+    The fetch and enrich stages run in worker threads, so counters are only
+    updated through :meth:`count`. With a store, search results and details
+    are checkpointed under ``state`` so an interrupted run can be resumed.
+    Once ``deadline`` (a ``time.monotonic()`` value) has passed no further
+    search results are taken and the run stays open for the next start.
+    With a duplicate index, near-duplicates of enriched tenders reuse their
+    enrichment and are not posted again if the original was. With a
+    document ingestor, criteria only found in the attached documents are
+    read before enrichment.
+    """
+
+    def __init__(
+        self,
+        store: Optional[PublicationStore],
+        delivery: SlackDelivery,
+        profile: Optional[Dict[str, Any]] = None,
+        state: Optional[RunState] = None,
+        deadline: Optional[float] = None,
+        index: Optional[TenderIndex] = None,
+        dedup: Optional[dedupe.DuplicateIndex] = None,
+        documents: Optional[DocumentIngestor] = None,
+    ) -> None:
+        self.store = store
+        self.index = index
+        self.dedup = dedup
+        self.documents = documents
+        self.delivery = delivery
+        self.profile = config.COMPANY_PROFILE if profile is None else profile
+        self.scorer = None
+        if config.PREFILTER_MODE != prefilter.MODE_OFF:
+            corpus = store.recent_details(config.PREFILTER_CORPUS_SIZE) if store else []
+            self.scorer = prefilter.StreamScorer(self.profile, corpus, warmup=config.PREFILTER_WARMUP)
+        self.state = state
+        self.deadline = deadline
+        self.cpv = config.CPV_CODES
+        self.stopped = False
+        self.counts: Counter = Counter()
+        self.shadow: List[Tuple[float, int]] = []
+        self._lock = threading.Lock()
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += n
+
+    def _out_of_time(self) -> bool:
+        if self.deadline is None or time.monotonic() < self.deadline:
+            return False
+        if not self.stopped:
+            logger.warning("Run time budget exhausted, leaving remaining tenders for the next run")
+            self.stopped = True
+        return True
+
+    def summaries(self) -> Iterator[Tender]:
+        """Yield search results that were not processed in an earlier run.
+
+        A resumed run first yields its checkpointed items, then searches its
+        original window again for tenders published since the interruption;
+        checkpointed and finished items are not yielded twice.
+        """
+        resumed = set()
+        if self.state and self.state.resumed:
+            for summary, detail in self.store.unfinished(self.state.run_id):
+                if self._out_of_time():
+                    return
+                resumed.add(summary_key(summary))
+                self.count("resumed")
+                yield Tender(ProjectSummary.from_dict(summary), detail=PublicationDetail.from_dict(detail) if detail else None)
+
+        published_from = self.state.published_from if self.state else None
+        search = iter_sharded_summaries if config.SIMAP_SEARCH_SHARDED else iter_project_summaries
+        for summary in search(cpv=self.cpv, published_from=published_from):
+            if self._out_of_time():
+                return
+            self.count("summaries")
+            summary = ProjectSummary.from_dict(summary)
+            if summary_key(summary) in resumed:
+                continue
+            if self.store and self._is_done(summary):
+                self.count("already_processed")
+                continue
+            if self.state:
+                self.store.record_summary(self.state.run_id, summary)
+            yield Tender(summary)
+        if self.state:
+            self.store.finish_search(self.state.run_id)
+
+    def _is_done(self, summary: ProjectSummary) -> bool:
+        return self.store.is_done(summary)
+
+    def _skip(self, detail: PublicationDetail) -> None:
+        self.store.set_post_status(detail, STATUS_SKIPPED)
+
+    def fetch(self, tender: Tender) -> Optional[Tender]:
+        """Fetch the detail and decide whether it needs an LLM call."""
+        if tender.detail is None:
+            with metrics.timer("stage.fetch_detail"):
+                detail = fetch_project_detail(tender.summary)
+            if not detail:
+                if self.state and detail_endpoint(tender.summary) is None:
+                    # Unsupported pubType, never yield it again on resume
+                    self.store.skip_summary(tender.summary)
+                return None
+            tender.detail = PublicationDetail.from_dict(detail)
+            if self.state:
+                self.store.record_detail(tender.detail)
+        self.count("details")
+
+        # Reuse stored enrichments for details whose content did not change
+        if self.store:
+            tender.enrichment = self.store.cached_enrichment(tender.detail)
+            if tender.enrichment is not None:
+                self.count("reused")
+                return tender
+
+        if self.dedup:
+            tender.signature = dedupe.signature(tender.detail)
+            match = self.dedup.match(tender.signature, exclude=detail_key(tender.detail)) if tender.signature else None
+            if match:
+                logger.info(
+                    "Project %s is a near-duplicate of %s (%.2f), reusing its enrichment",
+                    tender.detail.get("id"), match.key[1], match.similarity,
+                )
+                tender.enrichment = dedupe.patch_enrichment(match.enrichment, tender.detail, match.key, match.similarity)
+                self.count("near_duplicates")
+                self._save(tender)
+                return tender
+
+        # Only candidates above the local relevance cutoff go to the LLM
+        if self.scorer:
+            tender.pre_score = self.scorer.score(tender.detail)
+            if tender.pre_score < config.PREFILTER_CUTOFF:
+                self.count("prefilter_below_cutoff")
+                if config.PREFILTER_MODE == prefilter.MODE_ON and not self.scorer.ready():
+                    # Too few details for stable weights, keep it as in shadow mode
+                    self.count("prefilter_warming_up")
+                elif config.PREFILTER_MODE == prefilter.MODE_ON:
+                    if self.store:
+                        self._skip(tender.detail)
+                    return None
+        return tender
+
+    def attach_documents(self, tender: Tender) -> Tender:
+        """Add the criteria found in the documents of a tender that still needs enrichment."""
+        if tender.enrichment is None and self.documents:
+            with metrics.timer("stage.documents"):
+                tender.detail = self.documents.ingest(tender.detail)
+            if tender.detail.documents:
+                self.count("document_criteria")
+        return tender
+
+    def _save(self, tender: Tender) -> None:
+        if self.store:
+            self.store.record_enrichment(tender.detail, tender.enrichment)
+        key = detail_key(tender.detail)
+        if self.index and key:
+            self.index.add(key, tender.enrichment)
 
-    summaries = fetch_project_summaries(cpv=VALID_CPV)
-    logger.debug("Fetched %d summaries", len(summaries))
+    def _record(self, tender: Tender) -> Tender:
+        self.count("enriched")
+        self._save(tender)
+        key = detail_key(tender.detail)
+        if self.dedup and key and tender.signature:
+            self.dedup.add(key, tender.signature, tender.enrichment)
+        if tender.pre_score is not None:
+            with self._lock:
+                self.shadow.append((tender.pre_score, tender.enrichment.get("apply_score", 0)))
+        return tender
 
-    details = fetch_project_details(summaries)
-    logger.debug("Fetched %d project details", len(details))
+    def enrich(self, tender: Tender) -> Tender:
+        if tender.enrichment is None:
+            logger.info("Enriching project %s", tender.detail.get("id"))
+            with metrics.timer("stage.enrich"):
+                tender.enrichment = enrich(tender.detail, self.profile)
+            self._record(tender)
+        return tender
 
-    logger.info("Enriching projects via OpenAI")
-    enriched = enrich_batch(details, COMPANY_PROFILE)
-    for det, enrich_data in zip(details, enriched):
+    def enrich_all(self, tenders: Iterable[Tender]) -> Iterator[Tender]:
+        """Yield enriched tenders as soon as they are ready.
+
+        The batch mode has to wait for every detail before it can submit
+        the Batch API job; stored enrichments are still yielded right away.
+        """
+        if config.ENRICH_MODE != "batch":
+            yield from run_stage(
+                tenders,
+                self.enrich,
+                workers=config.OPENAI_MAX_CONCURRENCY,
+                queue_size=config.PIPELINE_QUEUE_SIZE,
+                name="enrich",
+            )
+            return
+        pending: List[Tender] = []
+        for tender in tenders:
+            if tender.enrichment is not None:
+                yield tender
+            else:
+                pending.append(tender)
+        if pending:
+            with metrics.timer("stage.enrich_batch"):
+                results = enrich_batch([t.detail for t in pending], self.profile)
+            for tender, data in zip(pending, results):
+                tender.enrichment = data
+                yield self._record(tender)
+
+    def deliver(self, tender: Tender) -> None:
+        """Post a tender to Slack if its score reaches the threshold."""
+        det, enrich_data = tender.detail, tender.enrichment
+        if self.store and self.store.post_status(det) == STATUS_POSTED:
+            logger.info("Project #%s already posted", det.get("projectNumber"))
+            return
+        original = enrich_data.get("near_duplicate_of")
+        if self.store and original and self.store.post_status(
+            {"projectId": original["projectId"], "id": original["publicationId"]}
+        ) == STATUS_POSTED:
+            logger.info("Project #%s is a near-duplicate of a posted project", det.get("projectNumber"))
+            self.count("duplicate_not_posted")
+            self.store.set_post_status(det, STATUS_SKIPPED)
+            return
         score = enrich_data.get("apply_score", 0)
         if score < config.APPLY_SCORE_THRESHOLD:
             logger.info(
@@ -44,19 +285,147 @@ def main() -> None:
                 det.get("projectNumber"),
                 score,
             )
-            continue
-        logger.info("Posting project #%s to Slack", det.get("projectNumber"))
+            self.count("below_threshold")
+            if self.store:
+                self.store.set_post_status(det, STATUS_SKIPPED)
+            return
+        logger.info("Queueing project #%s for Slack", det.get("projectNumber"))
         blocks = format_slack_blocks(enrich_data)
         logger.debug("Slack blocks: %s", blocks)
+        self.delivery.add(blocks, on_done=lambda ok: self._posted(det, ok))
+
+    def _posted(self, det: Dict[str, Any], ok: bool) -> None:
+        if ok:
+            logger.info("Slack post of project #%s succeeded", det.get("projectNumber"))
+            self.count("posted")
+        else:
+            logger.error("Failed to post project #%s to Slack", det.get("projectNumber"))
+            self.count("post_failed")
+        if self.store:
+            self.store.set_post_status(det, STATUS_POSTED if ok else STATUS_FAILED)
+
+    def close(self) -> None:
+        """Send everything still queued for Slack."""
+        self.delivery.close()
+
+    def slack_stats(self) -> Dict[str, Any]:
+        return dict(self.delivery.stats)
+
+    def report(self) -> None:
+        logger.info("Pipeline counts: %s", dict(self.counts))
+        if config.PREFILTER_MODE == prefilter.MODE_ON:
+            logger.info(
+                "Prefilter avoided %d LLM calls",
+                self.counts["prefilter_below_cutoff"],
+            )
+        elif config.PREFILTER_MODE == prefilter.MODE_SHADOW and self.shadow:
+            scores, apply_scores = zip(*self.shadow)
+            prefilter.shadow_recall(
+                scores,
+                apply_scores,
+                config.APPLY_SCORE_THRESHOLD,
+                config.PREFILTER_CUTOFF,
+            )
+
+
+def main() -> None:
+    """Fetch recent projects, enrich them and post to Slack.
+
+    Search pages, detail requests, enrichment and Slack posts run as
+    concurrent stages connected by bounded queues, so the first qualifying
+    tender is posted while later pages are still being fetched. With
+    ``TENANTS_FILE`` one run serves every tenant in it
+    (:class:`simap_agent.tenants.TenantRun`).
+    """
+    logger.info("Starting SIMAP pipeline")
+    logger.debug("Slack webhook configured: %s", bool(config.SLACK_WEBHOOK_URL))
+    metrics.registry.reset()
+    tenants = None
+    if config.TENANTS_FILE:
+        from simap_agent.tenants import TenantRun, load_tenants
+
+        # Tenants post to their own webhooks
+        config.require("OPENAI_API_KEY")
+        tenants = load_tenants(config.TENANTS_FILE)
+    else:
+        config.require(*config.REQUIRED)
+
+    store = open_store()
+    state = store.begin_run(default_published_from()) if store else None
+    if state and state.resumed:
+        logger.info("Resuming run %s (publications since %s)", state.run_id, state.published_from)
+    budget = config.RUN_TIME_BUDGET_SECONDS
+    deadline = time.monotonic() + budget if budget > 0 else None
+    ingestor = open_ingestor()
+    index = dedup = None
+    if tenants:
+        run: Run = TenantRun(store, tenants, state=state, deadline=deadline, documents=ingestor)
+    else:
+        delivery = SlackDelivery(post=lambda blocks: post_blocks(blocks))
+        index = open_index()
+        dedup = dedupe.open_index()
+        run = Run(store, delivery, state=state, deadline=deadline, index=index, dedup=dedup, documents=ingestor)
+    with metrics.timer("run.total"):
+        tenders = run_stage(
+            run.summaries(),
+            run.fetch,
+            workers=config.SIMAP_DETAIL_CONCURRENCY,
+            queue_size=config.PIPELINE_QUEUE_SIZE,
+            name="details",
+        )
+        if ingestor:
+            tenders = run_stage(
+                tenders,
+                run.attach_documents,
+                workers=config.SIMAP_DETAIL_CONCURRENCY,
+                queue_size=config.PIPELINE_QUEUE_SIZE,
+                name="documents",
+            )
+        try:
+            for tender in run.enrich_all(tenders):
+                run.deliver(tender)
+        finally:
+            run.close()
+    # Items dropped after an error stay in the checkpoint for the next run
+    failed = metrics.registry.count(pipeline.FAILED)
+    completed = not run.stopped and not failed
+    if failed:
+        logger.warning("%d items failed, leaving the run open to retry them", failed)
+    if state and completed:
+        store.finish_run(state.run_id)
+
+    run.report()
+    cache = get_cache()
+    simap_cache = get_http_cache()
+    report = metrics.registry.report(
+        pipeline=dict(run.counts),
+        http_sessions=http_session.stats(),
+        simap_cache=simap_cache.stats() if simap_cache else None,
+        llm_cache=cache.stats() if cache else None,
+        documents=ingestor.stats() if ingestor else None,
+        slack=run.slack_stats(),
+        run={
+            "id": state.run_id if state else None,
+            "resumed": bool(state and state.resumed),
+            "completed": completed,
+        },
+    )
+    logger.info("Run report: %s", json.dumps(report))
+    if config.RUN_REPORT_PATH:
         try:
-            post_blocks(blocks)
-            logger.info("Slack post succeeded")
-        except Exception:
-            logger.exception("Failed to post message to Slack")
-
-#    logger.info("Writing enriched data to enriched_projects.json")
-#    with open("enriched_projects.json", "w", encoding="utf-8") as f:
-#        json.dump(enriched, f, ensure_ascii=False, indent=2)
+            metrics.write_report(report, config.RUN_REPORT_PATH)
+        except OSError as exc:
+            logger.warning("Cannot write run report %s: %s", config.RUN_REPORT_PATH, exc)
+    if config.METRICS_OTEL:
+        metrics.export_otel()
+    if store:
+        store.close()
+    if index:
+        index.close()
+    if dedup:
+        dedup.close()
+    if ingestor:
+        ingestor.close()
     logger.info("Run completed")
 
 
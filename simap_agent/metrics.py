@@ -0,0 +1,160 @@
+"""In-process run metrics and the JSON run report."""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the nearest-rank percentile ``q`` (0-100) of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Metrics:
+    """Thread-safe collection of timings and counters for one run.
+
+    Timings are kept per name (e.g. ``http.simap`` or ``stage.enrich``) and
+    reported with count, total, p50/p95/max and the wall-clock span between
+    the first start and the last end, which for the streaming stages is the
+    time the stage was active.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._timings: Dict[str, List[float]] = defaultdict(list)
+            self._spans: Dict[str, List[float]] = {}
+            self.counters: Counter = Counter()
+
+    def observe(self, name: str, seconds: float, end: Optional[float] = None) -> None:
+        """Record one duration of ``name`` that ended at ``end`` (default now)."""
+        end = time.monotonic() if end is None else end
+        with self._lock:
+            self._timings[name].append(seconds)
+            span = self._spans.setdefault(name, [end - seconds, end])
+            span[0] = min(span[0], end - seconds)
+            span[1] = max(span[1], end)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            self.observe(name, end - start, end)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return self.counters[name]
+
+    def record_http(self, service: str, status: Any) -> None:
+        """Count one HTTP response (or error name) of ``service``."""
+        with self._lock:
+            self.counters[f"http.{service}.requests"] += 1
+            self.counters[f"http.{service}.status.{status}"] += 1
+
+    def record_usage(self, usage: Any) -> None:
+        """Add prompt and completion tokens of an OpenAI response."""
+        if usage is None:
+            return
+        with self._lock:
+            self.counters["openai.prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.counters["openai.completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def report(self, **extra: Any) -> Dict[str, Any]:
+        """Return the run report as a JSON-serializable dict."""
+        with self._lock:
+            timings = {
+                name: {
+                    "count": len(values),
+                    "total_s": round(sum(values), 3),
+                    "wall_s": round(self._spans[name][1] - self._spans[name][0], 3),
+                    "p50_ms": round(percentile(values, 50) * 1000, 1),
+                    "p95_ms": round(percentile(values, 95) * 1000, 1),
+                    "max_ms": round(max(values) * 1000, 1),
+                }
+                for name, values in sorted(self._timings.items())
+            }
+            counters = dict(sorted(self.counters.items()))
+        report = {
+            "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "duration_s": round(time.time() - self.started, 3),
+            "timings": timings,
+            "counters": counters,
+        }
+        report.update(extra)
+        return report
+
+
+# Shared by all modules of the running process
+registry = Metrics()
+timer = registry.timer
+observe = registry.observe
+incr = registry.incr
+record_http = registry.record_http
+record_usage = registry.record_usage
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    """Write ``report`` as JSON to ``path``."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info("Run report written to %s", path)
+
+
+class OTelExporter:
+    """Export a run report through the OpenTelemetry metrics API.
+
+    Needs the optional ``opentelemetry-api`` package; the meter provider
+    (e.g. an OTLP or Azure Monitor exporter) is configured by the
+    environment. Timings become histograms in milliseconds, counters
+    become monotonic counters.
+    """
+
+    def __init__(self, meter_name: str = "simap_agent") -> None:
+        from opentelemetry import metrics as otel_metrics
+
+        self.meter = otel_metrics.get_meter(meter_name)
+
+    def export(self, metrics: Metrics) -> None:
+        with metrics._lock:
+            timings = {name: list(values) for name, values in metrics._timings.items()}
+            counters = dict(metrics.counters)
+        for name, values in timings.items():
+            histogram = self.meter.create_histogram(f"simap.{name}", unit="ms")
+            for value in values:
+                histogram.record(value * 1000)
+        for name, value in counters.items():
+            self.meter.create_counter(f"simap.{name}").add(value)
+
+
+def export_otel(metrics: Metrics = registry) -> bool:
+    """Export ``metrics`` via OpenTelemetry if the package is installed."""
+    try:
+        exporter = OTelExporter()
+    except ImportError:
+        logger.warning("opentelemetry is not installed, skipping metrics export")
+        return False
+    exporter.export(metrics)
+    return True
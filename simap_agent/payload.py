@@ -0,0 +1,118 @@
+"""Shrink SIMAP payloads before they are sent to OpenAI."""
+
+import json
+import logging
+from typing import Any, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+LOCALES = ("de", "fr", "it", "en")
+# Fallback order when a multilingual field has no German value
+FALLBACK_LOCALES = ("en", "fr", "it")
+
+_encoding: Any = None
+_encoding_loaded = False
+
+
+def _get_encoding() -> Any:
+    """Return the OpenAI tokenizer, loaded on first use, or ``None``."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:  # optional, exact counts for the OpenAI tokenizer
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:  # pragma: no cover - depends on the environment
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Return the number of tokens in ``text``.
+
+    Uses ``tiktoken`` when it is installed, otherwise estimates four
+    characters per token.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def _is_multilingual(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and set(value) <= set(LOCALES)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _reduce(value: Any, drop_keys: Iterable[str], keep_shape: bool) -> Any:
+    """Walk ``value`` keeping only German texts and dropping dropped or empty keys.
+
+    A multilingual object becomes its German text (or the first available
+    fallback), wrapped as ``{"de": text}`` if ``keep_shape`` is set.
+    """
+    drop = frozenset(drop_keys)
+
+    def walk(item: Any) -> Any:
+        if _is_multilingual(item):
+            for locale in ("de",) + FALLBACK_LOCALES:
+                if item.get(locale):
+                    return {"de": item[locale]} if keep_shape else item[locale]
+            return None
+        if isinstance(item, dict):
+            out = {}
+            for key, sub in item.items():
+                if key in drop:
+                    continue
+                sub = walk(sub)
+                if not _is_empty(sub):
+                    out[key] = sub
+            return out
+        if isinstance(item, list):
+            return [sub for sub in map(walk, item) if not _is_empty(sub)]
+        return item
+
+    return walk(value)
+
+
+def compact(value: Any, drop_keys: Iterable[str] = ()) -> Any:
+    """Return ``value`` with only German texts and without dropped or empty keys.
+
+    Multilingual objects such as ``{"de": ..., "fr": ..., "it": ...}``
+    are replaced by their German text (or the first available fallback).
+    """
+    return _reduce(value, drop_keys, keep_shape=False)
+
+
+def german_only(value: Any, drop_keys: Iterable[str] = ()) -> Any:
+    """Return ``value`` with multilingual objects reduced to ``{"de": text}``.
+
+    Like :func:`compact`, but the shape of multilingual fields is kept, so
+    code reading ``field["de"]`` works on the result as well.
+    """
+    return _reduce(value, drop_keys, keep_shape=True)
+
+
+def dumps(value: Any) -> str:
+    """Serialize ``value`` without structural whitespace."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_json(
+    value: Any, drop_keys: Iterable[str] = (), label: Optional[str] = None, original: Any = None
+) -> str:
+    """Return the compacted JSON of ``value`` and log the token saving.
+
+    The saving is measured against ``original`` (e.g. the raw SIMAP detail
+    ``value`` was reduced from) if given, else against ``value`` itself.
+    """
+    text = dumps(compact(value, drop_keys))
+    if label is not None and logger.isEnabledFor(logging.INFO):
+        source = value if original is None else original
+        before = count_tokens(json.dumps(source, ensure_ascii=False, indent=2))
+        after = count_tokens(text)
+        logger.info("Prompt payload for %s: %d -> %d tokens", label, before, after)
+    return text
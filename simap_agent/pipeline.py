@@ -0,0 +1,90 @@
+"""Bounded-queue streaming stages for the SIMAP pipeline."""
+
+import logging
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+from simap_agent import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+_DONE = object()
+
+# Counter of items dropped because ``func`` or the input raised, over all stages
+FAILED = "pipeline.failed"
+
+
+def _failed(name: str) -> None:
+    metrics.incr(f"pipeline.{name}.failed")
+    metrics.incr(FAILED)
+
+
+def run_stage(
+    items: Iterable[T],
+    func: Callable[[T], Optional[U]],
+    workers: int = 1,
+    queue_size: int = 32,
+    name: str = "stage",
+) -> Iterator[U]:
+    """Apply ``func`` to ``items`` in ``workers`` threads and yield the results.
+
+    ``items`` is consumed by a feeder thread, so stages can be chained and
+    all run at the same time. Both queues are bounded: a slow consumer
+    stops the workers, which in turn stops the feeder (backpressure).
+    Results are yielded as soon as they are ready, not in input order.
+    ``None`` results are dropped; exceptions raised by ``func`` or the
+    input are logged and counted (``pipeline.<name>.failed`` and
+    :data:`FAILED`) and the item is dropped so a single bad item does not
+    end the run. Callers check :data:`FAILED` to tell a complete run from
+    one that lost items.
+    """
+    workers = max(1, workers)
+    inbox: "queue.Queue[object]" = queue.Queue(maxsize=queue_size)
+    outbox: "queue.Queue[object]" = queue.Queue(maxsize=queue_size)
+
+    def feed() -> None:
+        try:
+            for item in items:
+                inbox.put(item)
+        except Exception:
+            logger.exception("%s: input failed", name)
+            _failed(name)
+        finally:
+            for _ in range(workers):
+                inbox.put(_DONE)
+
+    def work() -> None:
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                try:
+                    result = func(item)
+                except Exception:
+                    logger.exception("%s: processing failed", name)
+                    _failed(name)
+                    continue
+                if result is not None:
+                    outbox.put(result)
+        finally:
+            outbox.put(_DONE)
+
+    threads = [threading.Thread(target=feed, name=f"{name}-feed", daemon=True)]
+    threads += [
+        threading.Thread(target=work, name=f"{name}-{i}", daemon=True) for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    finished = 0
+    while finished < workers:
+        result = outbox.get()
+        if result is _DONE:
+            finished += 1
+            continue
+        yield result
@@ -0,0 +1,163 @@
+"""Cheap local relevance scoring used before any OpenAI call."""
+
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from simap_agent.records import plain
+
+logger = logging.getLogger(__name__)
+
+MODE_OFF = "off"
+MODE_ON = "on"
+MODE_SHADOW = "shadow"
+
+# Words are cut to this length so that e.g. "Automatisierung" and
+# "Automation" end up as the same term.
+STEM_LENGTH = 8
+STOPWORDS = frozenset(
+    "und oder der die das den dem des ein eine einer eines für fuer mit von zur zum "
+    "auf aus bei ist sind wird werden the and for with".split()
+)
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+Vector = Dict[str, float]
+
+
+def tokenize(text: str) -> List[str]:
+    """Return lowercase, truncated word stems of ``text``."""
+    return [
+        tok[:STEM_LENGTH]
+        for tok in _TOKEN_RE.findall(text.lower())
+        if len(tok) > 2 and tok not in STOPWORDS
+    ]
+
+
+def _german_texts(value: Any) -> Iterable[str]:
+    """Yield German texts and CPV codes/labels found anywhere in ``value``."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "de" and isinstance(item, str):
+                yield item
+            elif key == "code" and isinstance(item, (str, int)):
+                yield str(item)
+            else:
+                yield from _german_texts(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _german_texts(item)
+
+
+def detail_text(detail: Dict[str, Any]) -> str:
+    """Return the German title, description and CPV text of a detail."""
+    return " ".join(_german_texts(plain(detail)))
+
+
+def profile_text(profile: Dict[str, Any]) -> str:
+    """Return the domains, expertise and technologies of a company profile."""
+    parts: List[str] = []
+    for key in ("domains", "expertise", "technologies"):
+        parts.extend(str(v) for v in profile.get(key) or [])
+    return " ".join(parts)
+
+
+def _tfidf(counts: Counter, idf: Dict[str, float]) -> Vector:
+    vec = {term: (1 + math.log(n)) * idf.get(term, 0.0) for term, n in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {t: v / norm for t, v in vec.items()} if norm else {}
+
+
+def _idf(df: Counter, n_docs: int, terms: Iterable[str]) -> Dict[str, float]:
+    return {term: math.log(n_docs / df[term]) + 1 for term in terms if df[term]}
+
+
+def _cosine(counts: Counter, query_vec: Vector, idf: Dict[str, float]) -> float:
+    return sum(w * query_vec.get(t, 0.0) for t, w in _tfidf(counts, idf).items())
+
+
+def score_texts(texts: Sequence[str], query: str) -> List[float]:
+    """Return the TF-IDF cosine similarity of every text to ``query``.
+
+    The inverse document frequencies are computed over all ``texts`` plus
+    the query, so terms that appear in every tender (e.g. "Ausschreibung")
+    carry little weight. ``PREFILTER_CUTOFF`` is calibrated on scores of a
+    whole run's tenders; the streaming pipeline uses :class:`StreamScorer`.
+    """
+    docs = [Counter(tokenize(t)) for t in texts]
+    query_counts = Counter(tokenize(query))
+    df: Counter = Counter()
+    for counts in docs + [query_counts]:
+        df.update(counts.keys())
+    idf = _idf(df, len(docs) + 1, df)
+    query_vec = _tfidf(query_counts, idf)
+    return [_cosine(counts, query_vec, idf) for counts in docs]
+
+
+def score_details(details: Sequence[Dict[str, Any]], profile: Dict[str, Any]) -> List[float]:
+    """Return the local relevance score of every detail for ``profile``."""
+    return score_texts([detail_text(d) for d in details], profile_text(profile))
+
+
+class StreamScorer:
+    """Score details one at a time as the pipeline fetches them.
+
+    Document frequencies are kept across the stream: every detail is
+    weighted against the ``corpus`` (e.g. details stored by earlier runs),
+    all details scored before it, itself and the query, so the last detail
+    of a run gets exactly the score :func:`score_texts` gives it for the
+    corpus and the whole run. Scores of a small corpus depend on the order
+    of arrival; :meth:`ready` is False until ``warmup`` details are known.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, profile: Dict[str, Any], corpus: Iterable[Dict[str, Any]] = (), warmup: int = 0) -> None:
+        self._query = Counter(tokenize(profile_text(profile)))
+        self._df: Counter = Counter(self._query.keys())
+        self._n_docs = 1
+        self.warmup = warmup
+        self._lock = threading.Lock()
+        for detail in corpus:
+            self._add(Counter(tokenize(detail_text(detail))))
+        if self._n_docs > 1:
+            logger.debug("Prefilter seeded with %d details", self._n_docs - 1)
+
+    def _add(self, counts: Counter) -> None:
+        self._df.update(counts.keys())
+        self._n_docs += 1
+
+    def ready(self) -> bool:
+        """Return True once enough details are known for stable scores."""
+        with self._lock:
+            return self._n_docs - 1 >= self.warmup
+
+    def score(self, detail: Dict[str, Any]) -> float:
+        counts = Counter(tokenize(detail_text(detail)))
+        with self._lock:
+            self._add(counts)
+            idf = _idf(self._df, self._n_docs, set(counts) | set(self._query))
+        return _cosine(counts, _tfidf(self._query, idf), idf)
+
+
+def shadow_recall(
+    scores: Sequence[float],
+    apply_scores: Sequence[int],
+    threshold: int,
+    cutoff: float,
+) -> Optional[float]:
+    """Return the share of LLM-qualified projects the prefilter would keep."""
+    qualified = [s for s, apply in zip(scores, apply_scores) if apply >= threshold]
+    if not qualified:
+        return None
+    kept = sum(1 for s in qualified if s >= cutoff)
+    recall = kept / len(qualified)
+    logger.info(
+        "Prefilter shadow recall %.2f (%d/%d qualified projects above cutoff %.3f)",
+        recall,
+        kept,
+        len(qualified),
+        cutoff,
+    )
+    return recall
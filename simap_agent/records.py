@@ -0,0 +1,255 @@
+"""Compact records for search results, publication details and enrichments.
+
+SIMAP answers with large nested objects carrying every text in four
+languages. The records below are built once per tender by a single pass
+over the response and keep only what the pipeline uses: German texts (or
+the first available fallback, still under ``"de"``), without the keys in
+``PAYLOAD_DROP_KEYS``, with the criteria lists and flags already collected.
+
+Summary and detail records can still be read like the SIMAP dicts they
+were built from (``detail.get("projectNumber")``); :meth:`to_dict` returns
+the JSON form stored in the state database.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from simap_agent.payload import german_only
+
+# Criteria lists of a detail, in the order they are shown in Slack
+CRITERIA_KEYS = ("qualificationCriteria", "awardCriteria")
+
+# ``(in_documents, as_pdf, note)`` of one kind of criteria
+Flags = Tuple[Optional[bool], Optional[bool], Optional[Dict[str, str]]]
+
+_MISSING = object()
+
+
+class _Mapping:
+    """Read access by SIMAP field name for records built from SIMAP dicts."""
+
+    __slots__ = ()
+
+    def _lookup(self, name: str) -> Any:  # pragma: no cover - overridden
+        raise NotImplementedError
+
+    def get(self, name: str, default: Any = None) -> Any:
+        value = self._lookup(name)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, name: str) -> Any:
+        value = self._lookup(name)
+        if value is _MISSING:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return self._lookup(name) is not _MISSING
+
+
+@dataclass(slots=True)
+class ProjectSummary(_Mapping):
+    """One search result: the IDs needed to fetch and track its detail."""
+
+    id: Optional[str]
+    publication_id: Optional[str]
+    pub_type: Optional[str] = None
+    project_number: Optional[str] = None
+    title: Optional[Dict[str, str]] = None
+
+    _FIELDS = {
+        "id": "id",
+        "publicationId": "publication_id",
+        "pubType": "pub_type",
+        "projectNumber": "project_number",
+        "title": "title",
+    }
+
+    @classmethod
+    def from_dict(cls, summary: Dict[str, Any]) -> "ProjectSummary":
+        if isinstance(summary, ProjectSummary):
+            return summary
+        return cls(
+            summary.get("id"),
+            summary.get("publicationId"),
+            summary.get("pubType"),
+            summary.get("projectNumber"),
+            german_only(summary.get("title")) or None,
+        )
+
+    def _lookup(self, name: str) -> Any:
+        attr = self._FIELDS.get(name)
+        value = getattr(self, attr) if attr else None
+        return _MISSING if value is None else value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, attr) for name, attr in self._FIELDS.items() if getattr(self, attr) is not None}
+
+
+@dataclass(slots=True)
+class PublicationDetail(_Mapping):
+    """A publication detail reduced to German texts with its criteria collected.
+
+    ``fields`` holds the detail without the criteria lists (what the prompt
+    describes as ``PROJECT_JSON``), ``criteria`` the qualification and award
+    criteria from the top level, the criteria block or the lots, and
+    ``flags`` whether each kind is only in the documents or a PDF.
+    ``documents`` holds criteria sections read from attached documents
+    (see :mod:`simap_agent.documents`); they are not part of :meth:`to_dict`.
+    """
+
+    fields: Dict[str, Any]
+    criteria: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    flags: Dict[str, Flags] = field(default_factory=dict)
+    documents: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, detail: Dict[str, Any], drop_keys: Optional[Iterable[str]] = None) -> "PublicationDetail":
+        """Build the record in one pass over ``detail``."""
+        if isinstance(detail, PublicationDetail):
+            return detail
+        if drop_keys is None:
+            from simap_agent import config
+
+            drop_keys = config.PAYLOAD_DROP_KEYS
+        drop = frozenset(drop_keys)
+
+        fields: Dict[str, Any] = {}
+        top: Dict[str, List[Dict[str, Any]]] = {}
+        block: Dict[str, Any] = {}
+        lot_items: Dict[str, List[Dict[str, Any]]] = {key: [] for key in CRITERIA_KEYS}
+        for name, value in detail.items():
+            if name in drop:
+                continue
+            if name in CRITERIA_KEYS:
+                top[name] = german_only(value, drop) or []
+            elif name == "criteria" and isinstance(value, dict):
+                block = german_only(value, drop)
+                rest = {k: v for k, v in block.items() if k not in CRITERIA_KEYS}
+                if rest:
+                    fields[name] = rest
+            elif name == "lots" and isinstance(value, list):
+                lots = []
+                for lot in german_only(value, drop):
+                    if not isinstance(lot, dict):
+                        lots.append(lot)
+                        continue
+                    lot_criteria = lot.get("criteria") if isinstance(lot.get("criteria"), dict) else {}
+                    for key in CRITERIA_KEYS:
+                        lot_items[key].extend(lot.get(key) or lot_criteria.get(key) or [])
+                    rest = {k: v for k, v in lot_criteria.items() if k not in CRITERIA_KEYS}
+                    lot = {k: v for k, v in lot.items() if k not in CRITERIA_KEYS and k != "criteria"}
+                    if rest:
+                        lot["criteria"] = rest
+                    lots.append(lot)
+                fields[name] = lots
+            else:
+                value = german_only(value, drop)
+                if value not in (None, "", [], {}):
+                    fields[name] = value
+
+        criteria = {key: list(top.get(key) or block.get(key) or lot_items[key]) for key in CRITERIA_KEYS}
+        flags = {}
+        for key in CRITERIA_KEYS:
+            in_docs = fields.get(f"{key}InDocuments")
+            if in_docs is None:
+                in_docs = block.get(f"{key}InDocuments")
+            as_pdf = fields.get(f"{key}AsPDF")
+            if as_pdf is None:
+                as_pdf = block.get(f"{key}AsPDF")
+            selection = block.get(f"{key}Selection")
+            if selection == "criteria_in_documents":
+                in_docs = True
+            elif selection == "criteria_as_pdf":
+                as_pdf = True
+            note = block.get(f"{key}Note") or fields.get(f"{key}Note")
+            flags[key] = (in_docs, as_pdf, note)
+        return cls(fields, criteria, flags)
+
+    def _lookup(self, name: str) -> Any:
+        if name in CRITERIA_KEYS and self.criteria.get(name):
+            return self.criteria[name]
+        return self.fields.get(name, _MISSING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the detail as a dict; building a record from it again gives the same record."""
+        out = dict(self.fields)
+        out.update((key, items) for key, items in self.criteria.items() if items)
+        return out
+
+
+def _flag(value: Any) -> Optional[bool]:
+    if value is None:
+        return None
+    return value is True or str(value).lower() == "yes"
+
+
+@dataclass(slots=True)
+class Enrichment:
+    """The result of enriching one publication, as shown in Slack."""
+
+    summary: Optional[str] = None
+    team: Optional[str] = None
+    apply_score: int = 0
+    project: Dict[str, Any] = field(default_factory=dict)
+    missing_info: List[str] = field(default_factory=list)
+    criteria: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    criteria_summaries: Dict[str, str] = field(default_factory=dict)
+    in_documents: Dict[str, bool] = field(default_factory=dict)
+    as_pdf: Dict[str, bool] = field(default_factory=dict)
+    # Any other keys (e.g. ``near_duplicate_of``), kept for to_dict()
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Enrichment":
+        """Build the record in one pass; ``"yes"`` flags become ``True``."""
+        if isinstance(data, Enrichment):
+            return data
+        rec = cls()
+        for name, value in data.items():
+            if name == "summary":
+                rec.summary = value
+            elif name == "team":
+                rec.team = value
+            elif name == "apply_score":
+                rec.apply_score = value if isinstance(value, (int, float)) else 0
+            elif name == "project":
+                rec.project = value or {}
+            elif name == "missing_info":
+                rec.missing_info = list(value or [])
+            elif name in CRITERIA_KEYS:
+                rec.criteria[name] = value or []
+            elif name.endswith("Summary") and name[: -len("Summary")] in CRITERIA_KEYS:
+                rec.criteria_summaries[name[: -len("Summary")]] = value
+            elif name.endswith("InDocuments") and name[: -len("InDocuments")] in CRITERIA_KEYS:
+                rec.in_documents[name[: -len("InDocuments")]] = _flag(value)
+            elif name.endswith("AsPDF") and name[: -len("AsPDF")] in CRITERIA_KEYS:
+                rec.as_pdf[name[: -len("AsPDF")]] = _flag(value)
+            else:
+                rec.extra[name] = value
+        return rec
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "summary": self.summary,
+            "team": self.team,
+            "apply_score": self.apply_score,
+            "project": self.project,
+            "missing_info": self.missing_info,
+        }
+        for key in CRITERIA_KEYS:
+            if key in self.criteria:
+                out[key] = self.criteria[key]
+            if key in self.criteria_summaries:
+                out[f"{key}Summary"] = self.criteria_summaries[key]
+            if self.in_documents.get(key) is not None:
+                out[f"{key}InDocuments"] = self.in_documents[key]
+            if self.as_pdf.get(key) is not None:
+                out[f"{key}AsPDF"] = self.as_pdf[key]
+        out.update(self.extra)
+        return out
+
+
+def plain(value: Any) -> Any:
+    """Return the dict form of a record, other values unchanged."""
+    return value.to_dict() if isinstance(value, (ProjectSummary, PublicationDetail, Enrichment)) else value
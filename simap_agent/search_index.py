@@ -0,0 +1,286 @@
+"""Local full-text index of enriched tenders.
+
+Usage::
+
+    python -m simap_agent search camunda --since 2025-01-01 --team Engineering --min-score 6
+
+Every enrichment is written to an SQLite FTS5 index (title, customer,
+summary, criteria summaries, CPV) with team, apply score and publication
+date as filter columns, so past tenders can be found without asking SIMAP
+or OpenAI again.
+"""
+
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from simap_agent import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenders (
+    id INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    publication_id TEXT NOT NULL,
+    project_number TEXT,
+    title_de TEXT,
+    customer TEXT,
+    summary TEXT,
+    criteria TEXT,
+    cpv_code TEXT,
+    cpv_label TEXT,
+    team TEXT,
+    apply_score INTEGER,
+    publication_date TEXT,
+    offer_deadline TEXT,
+    indexed_at TEXT NOT NULL,
+    UNIQUE (project_id, publication_id)
+);
+CREATE INDEX IF NOT EXISTS tenders_date ON tenders (publication_date);
+CREATE INDEX IF NOT EXISTS tenders_team_score ON tenders (team, apply_score);
+CREATE VIRTUAL TABLE IF NOT EXISTS tenders_fts USING fts5(
+    title_de, customer, summary, criteria, cpv,
+    content='', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# bm25 weights of the FTS columns: title, customer, summary, criteria, cpv
+_WEIGHTS = (10.0, 5.0, 1.0, 1.0, 2.0)
+
+_COLUMNS = (
+    "project_id", "publication_id", "project_number", "title_de", "customer", "summary",
+    "criteria", "cpv_code", "cpv_label", "team", "apply_score", "publication_date", "offer_deadline",
+)
+
+Key = Tuple[str, str]
+
+
+def _day(value: Any) -> Optional[str]:
+    """Return the ``YYYY-MM-DD`` part of a date string, if it has one."""
+    text = str(value or "")
+    return text[:10] if re.match(r"\d{4}-\d{2}-\d{2}", text) else None
+
+
+def match_query(text: str) -> str:
+    """Turn free text into an FTS5 query of quoted terms (all must match).
+
+    A trailing ``*`` keeps prefix search (``camu*``); FTS5 operators in the
+    input are treated as plain words.
+    """
+    terms = []
+    for word in re.findall(r"[\w*]+", text):
+        prefix = word.endswith("*")
+        word = word.strip("*")
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def record(key: Key, enrichment: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the indexed columns of an enrichment."""
+    proj = enrichment.get("project") or {}
+    cpv = proj.get("cpvCode") or {}
+    criteria = "\n".join(
+        filter(None, (enrichment.get("qualificationCriteriaSummary"), enrichment.get("awardCriteriaSummary")))
+    )
+    score = enrichment.get("apply_score")
+    return {
+        "project_id": key[0],
+        "publication_id": key[1],
+        "project_number": proj.get("projectNumber"),
+        "title_de": proj.get("title_de"),
+        "customer": proj.get("customer"),
+        "summary": enrichment.get("summary"),
+        "criteria": criteria or None,
+        "cpv_code": cpv.get("code") if isinstance(cpv, dict) else None,
+        "cpv_label": cpv.get("label_de") if isinstance(cpv, dict) else None,
+        "team": enrichment.get("team"),
+        "apply_score": int(score) if isinstance(score, (int, float)) else None,
+        "publication_date": _day(proj.get("publicationDate")),
+        "offer_deadline": _day(proj.get("offerDeadline")),
+    }
+
+
+class TenderIndex:
+    """SQLite FTS5 index of enrichments keyed by ``(projectId, publicationId)``.
+
+    A newer enrichment of the same publication replaces the older one. The
+    connection is shared between threads and guarded by a lock.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        logger.debug("Tender index opened at %s", path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _fts_row(self, row: Dict[str, Any]) -> Tuple[Any, ...]:
+        cpv = " ".join(filter(None, (row["cpv_code"], row["cpv_label"])))
+        return (row["title_de"], row["customer"], row["summary"], row["criteria"], cpv)
+
+    def _delete(self, key: Key) -> None:
+        old = self._conn.execute(
+            f"SELECT id, {', '.join(_COLUMNS)} FROM tenders WHERE project_id = ? AND publication_id = ?", key
+        ).fetchone()
+        if old is None:
+            return
+        # contentless FTS tables need the old values to remove a row
+        values = self._fts_row(dict(zip(_COLUMNS, old[1:])))
+        self._conn.execute(
+            "INSERT INTO tenders_fts (tenders_fts, rowid, title_de, customer, summary, criteria, cpv) "
+            "VALUES ('delete', ?, ?, ?, ?, ?, ?)",
+            (old[0], *values),
+        )
+        self._conn.execute("DELETE FROM tenders WHERE id = ?", (old[0],))
+
+    def add_many(self, items: Iterable[Tuple[Key, Dict[str, Any]]]) -> int:
+        """Index ``(key, enrichment)`` pairs in one transaction and return their number."""
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        n = 0
+        with self._lock:
+            for key, enrichment in items:
+                row = record(key, enrichment)
+                self._delete(key)
+                cur = self._conn.execute(
+                    f"INSERT INTO tenders ({', '.join(_COLUMNS)}, indexed_at) "
+                    f"VALUES ({', '.join('?' * len(_COLUMNS))}, ?)",
+                    (*(row[c] for c in _COLUMNS), now),
+                )
+                self._conn.execute(
+                    "INSERT INTO tenders_fts (rowid, title_de, customer, summary, criteria, cpv) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (cur.lastrowid, *self._fts_row(row)),
+                )
+                n += 1
+            self._conn.commit()
+        return n
+
+    def add(self, key: Key, enrichment: Dict[str, Any]) -> None:
+        self.add_many([(key, enrichment)])
+
+    def search(
+        self,
+        text: str = "",
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        team: Optional[str] = None,
+        min_score: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """Return matching tenders, best match first (newest first without ``text``).
+
+        ``since`` and ``until`` are inclusive ``YYYY-MM-DD`` publication dates.
+        """
+        where, params = [], []
+        if since:
+            where.append("t.publication_date >= ?")
+            params.append(since)
+        if until:
+            where.append("t.publication_date <= ?")
+            params.append(until)
+        if team:
+            where.append("t.team = ?")
+            params.append(team)
+        if min_score is not None:
+            where.append("t.apply_score >= ?")
+            params.append(min_score)
+
+        columns = ", ".join(f"t.{c}" for c in _COLUMNS)
+        query = match_query(text)
+        if query:
+            weights = ", ".join(str(w) for w in _WEIGHTS)
+            sql = (
+                f"SELECT {columns}, bm25(tenders_fts, {weights}) AS rank "
+                "FROM tenders_fts JOIN tenders t ON t.id = tenders_fts.rowid "
+                "WHERE tenders_fts MATCH ?"
+                + "".join(f" AND {w}" for w in where)
+                + " ORDER BY rank LIMIT ?"
+            )
+            params = [query, *params, limit]
+        else:
+            sql = (
+                f"SELECT {columns}, NULL AS rank FROM tenders t"
+                + (" WHERE " + " AND ".join(where) if where else "")
+                + " ORDER BY t.publication_date DESC, t.id DESC LIMIT ?"
+            )
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(_COLUMNS + ("rank",), row)) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tenders").fetchone()[0]
+
+
+def open_index(path: Optional[str] = None) -> Optional[TenderIndex]:
+    """Open the index at ``path`` (default ``INDEX_PATH``); ``None`` if disabled."""
+    path = config.INDEX_PATH if path is None else path
+    if not path:
+        logger.debug("Tender index disabled")
+        return None
+    try:
+        return TenderIndex(path)
+    except (OSError, sqlite3.Error) as exc:
+        logger.warning("Cannot open tender index %s, continuing without it: %s", path, exc)
+        return None
+
+
+def _format(row: Dict[str, Any]) -> str:
+    return (
+        f"{row['apply_score'] if row['apply_score'] is not None else '-':>2}  "
+        f"{row['publication_date'] or '----------'}  {row['team'] or '-':<11}  "
+        f"#{row['project_number'] or row['project_id']}  {row['title_de'] or '—'} / {row['customer'] or '—'}"
+    )
+
+
+def main_cli(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(prog="python -m simap_agent search", description=__doc__.splitlines()[0])
+    parser.add_argument("text", nargs="*", help="words that must all occur; end a word with * for prefix search")
+    parser.add_argument("--since", help="first publication date, YYYY-MM-DD")
+    parser.add_argument("--until", help="last publication date, YYYY-MM-DD")
+    parser.add_argument("--team", choices=["Products", "Engineering", "Data&AI"])
+    parser.add_argument("--min-score", type=int)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the index from STATE_DB_PATH first")
+    args = parser.parse_args(argv)
+
+    index = open_index()
+    if index is None:
+        parser.error("the search needs a readable INDEX_PATH (or DATA_DIR)")
+    try:
+        if args.reindex:
+            from simap_agent.store import open_store
+
+            store = open_store()
+            if store is None:
+                parser.error("--reindex needs a readable STATE_DB_PATH (or DATA_DIR)")
+            try:
+                logger.info("Indexed %d enrichments from %s", index.add_many(store.enrichments()), store.path)
+            finally:
+                store.close()
+        rows = index.search(
+            " ".join(args.text), since=args.since, until=args.until, team=args.team,
+            min_score=args.min_score, limit=args.limit,
+        )
+    finally:
+        index.close()
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        for row in rows:
+            print(_format(row))
+    return rows
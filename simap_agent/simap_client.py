@@ -2,26 +2,121 @@
 
 import json
 import logging
-import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 
-from simap_agent import config
+from simap_agent import config, metrics
+from simap_agent.http_cache import HttpCache, cache_key
+from simap_agent.http_session import PooledSession, get_session
+from simap_agent.pipeline import run_stage
+from simap_agent.throttle import AdaptiveRateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Shared by all threads so the configured rate applies to the whole run;
+# created on first use from SIMAP_REQUESTS_PER_SECOND (set to None to rebuild)
+limiter: Optional[AdaptiveRateLimiter] = None
+_limiter_lock = threading.Lock()
+_cache: Optional[HttpCache] = None
+_cache_unavailable = False
+
+
+def get_limiter() -> AdaptiveRateLimiter:
+    """Return the shared SIMAP rate limiter."""
+    global limiter
+    with _limiter_lock:
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(config.SIMAP_REQUESTS_PER_SECOND)
+        return limiter
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Return the shared response cache or ``None`` if it is disabled."""
+    global _cache, _cache_unavailable
+    if not config.SIMAP_CACHE_PATH:
+        return None
+    with _limiter_lock:
+        if _cache is None and not _cache_unavailable:
+            try:
+                _cache = HttpCache(config.SIMAP_CACHE_PATH, max_bytes=int(config.SIMAP_CACHE_MAX_MB * 2 ** 20))
+            except (OSError, sqlite3.Error) as exc:
+                logger.warning("Cannot open SIMAP cache %s, continuing without it: %s", config.SIMAP_CACHE_PATH, exc)
+                _cache_unavailable = True
+        return _cache
+
+
+def reset() -> None:
+    """Drop the shared limiter and cache so they are rebuilt from config."""
+    global limiter, _cache, _cache_unavailable
+    with _limiter_lock:
+        if _cache is not None:
+            _cache.close()
+        limiter = _cache = None
+        _cache_unavailable = False
+
+
+def _session() -> PooledSession:
+    return get_session(
+        "simap",
+        pool_size=max(10, config.SIMAP_DETAIL_CONCURRENCY),
+        max_attempts=config.SIMAP_MAX_ATTEMPTS,
+    )
+
+
+def _timeout_for(endpoint: str) -> float:
+    """Return the request timeout for a search or detail endpoint."""
+    if endpoint == config.SIMAP_SEARCH_ENDPOINT:
+        return config.SIMAP_SEARCH_TIMEOUT
+    return config.SIMAP_DETAIL_TIMEOUT
+
+
+def _ttl_for(endpoint: str) -> float:
+    """Return how long a cached response of an endpoint is used without asking SIMAP."""
+    if endpoint == config.SIMAP_SEARCH_ENDPOINT:
+        return config.SIMAP_CACHE_SEARCH_TTL_SECONDS
+    # Publication details do not change once published
+    return config.SIMAP_CACHE_DETAIL_TTL_HOURS * 3600
+
 
 def call(endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
-    """Perform a GET request against the SIMAP API."""
+    """Perform a GET request against the SIMAP API.
+
+    Responses are kept in the HTTP cache (``SIMAP_CACHE_PATH``): fresh
+    entries are returned without a request, expired ones are revalidated
+    with ``If-None-Match``/``If-Modified-Since`` and reused on ``304``.
+    Transient errors are retried by the pooled session; ``None`` is only
+    returned once every attempt failed.
+    """
     url = f"{config.SIMAP_BASE_URL}{endpoint}"
+    cache = get_http_cache()
+    ttl = _ttl_for(endpoint)
+    key = cache_key(url, params) if cache and ttl > 0 else None
+    entry = cache.get(key) if key else None
+    if entry and entry.fresh:
+        logger.debug("Serving %s with params %s from cache", url, params)
+        metrics.incr("simap.cache.hits")
+        return json.loads(entry.body)
+
     logger.debug("Requesting %s with params %s", url, params)
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        kwargs = {"headers": entry.validators()} if entry else {}
+        resp = _session().get(url, params=params, timeout=_timeout_for(endpoint), limiter=get_limiter(), **kwargs)
         logger.debug("Response status: %s", resp.status_code)
+        if entry and resp.status_code == 304:
+            metrics.incr("simap.cache.revalidated")
+            cache.refresh(key, ttl)
+            return json.loads(entry.body)
         resp.raise_for_status()
-        return resp.json()
+        data = resp.json()
+        if key:
+            metrics.incr("simap.cache.misses")
+            cache.set(key, url, resp.content, ttl, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return data
     except requests.RequestException as exc:
         logger.error("Request to %s failed: %s", url, exc)
     except json.JSONDecodeError as exc:
@@ -29,57 +124,211 @@ def call(endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dic
     return None
 
 
-def fetch_project_summaries(cpv: List[str], lang: str = "de", max_pages: int = 100) -> List[Dict[str, Any]]:
-    """Return recent project summaries filtered by CPV codes."""
-    logger.info("Fetching project summaries")
-    summaries: List[Dict[str, Any]] = []
+def default_published_from() -> str:
+    """Return the start of the default search window (yesterday)."""
+    return (datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def iter_project_summaries(
+    cpv: List[str],
+    lang: str = "de",
+    max_pages: int = 100,
+    published_from: Optional[str] = None,
+    published_until: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield project summaries published since ``published_from`` page by page.
+
+    ``published_from`` defaults to :func:`default_published_from`; with
+    ``published_until`` the search is limited to that day (inclusive).
+    """
     cursor = None
     for _ in range(max_pages):
         params = {
             "lang": lang,
             "processTypes": "open",
             "cpvCodes": cpv,
-            "newestPublicationFrom": (datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d"),
+            "newestPublicationFrom": published_from or default_published_from(),
         }
+        if published_until:
+            params["newestPublicationUntil"] = published_until
         if cursor:
             params["lastItem"] = cursor
         logger.debug("Calling summary search page with cursor %s", cursor)
-        data = call(config.SIMAP_SEARCH_ENDPOINT, params)
+        with metrics.timer("simap.search_page"):
+            data = call(config.SIMAP_SEARCH_ENDPOINT, params)
         if not data or "projects" not in data:
             break
         projects = data["projects"]
-        summaries.extend(projects)
+        yield from projects
         pagination = data.get("pagination", {}) or {}
         cursor = pagination.get("lastItem")
         if not cursor or len(projects) < pagination.get("itemsPerPage", len(projects)):
             break
+
+
+Shard = Tuple[str, str, Optional[str]]
+
+
+def search_shards(cpv: List[str], published_from: str, days_per_shard: int = 1) -> List[Shard]:
+    """Split a search into ``(cpv_code, from, until)`` shards.
+
+    Every CPV code is searched on its own, and the window from
+    ``published_from`` to today is cut into slices of ``days_per_shard``
+    days; the last slice is open-ended so nothing published today is lost.
+    """
+    start = datetime.strptime(published_from, "%Y-%m-%d").date()
+    today = datetime.today().date()
+    step = timedelta(days=max(1, days_per_shard))
+    slices: List[Tuple[str, Optional[str]]] = []
+    while start + step <= today:
+        slices.append((start.isoformat(), (start + step - timedelta(days=1)).isoformat()))
+        start += step
+    slices.append((start.isoformat(), None))
+    return [(code, since, until) for code in cpv for since, until in slices]
+
+
+def iter_sharded_summaries(
+    cpv: List[str],
+    lang: str = "de",
+    max_pages: int = 100,
+    published_from: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    days_per_shard: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield summaries of all :func:`search_shards` searched concurrently.
+
+    At most ``concurrency`` shards (default ``SIMAP_SEARCH_CONCURRENCY``) are
+    walked at once, all sharing the SIMAP rate limiter. Results are yielded
+    shard by shard as they complete; a publication found by several shards
+    (e.g. with more than one matching CPV code) is yielded once.
+    """
+    concurrency = concurrency or config.SIMAP_SEARCH_CONCURRENCY
+    days_per_shard = days_per_shard or config.SIMAP_SEARCH_SHARD_DAYS
+    shards = search_shards(cpv, published_from or default_published_from(), days_per_shard)
+    logger.info("Searching %d shards with concurrency %d", len(shards), concurrency)
+
+    def search(shard: Shard) -> List[Dict[str, Any]]:
+        code, since, until = shard
+        return list(iter_project_summaries(
+            [code], lang=lang, max_pages=max_pages, published_from=since, published_until=until
+        ))
+
+    seen = set()
+    for projects in run_stage(shards, search, workers=concurrency, queue_size=config.PIPELINE_QUEUE_SIZE, name="search"):
+        for summary in projects:
+            key = (summary.get("id"), summary.get("publicationId"))
+            if all(key):
+                if key in seen:
+                    metrics.incr("simap.search_duplicates")
+                    continue
+                seen.add(key)
+            yield summary
+
+
+def fetch_project_summaries(cpv: List[str], lang: str = "de", max_pages: int = 100) -> List[Dict[str, Any]]:
+    """Return recent project summaries filtered by CPV codes."""
+    logger.info("Fetching project summaries")
+    summaries = list(iter_project_summaries(cpv, lang=lang, max_pages=max_pages))
     logger.info("Fetched %d project summaries", len(summaries))
     return summaries
 
 
-def fetch_project_details(summaries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Fetch detail information for the given project summaries."""
+def detail_endpoint(summary: Dict[str, Any]) -> Optional[str]:
+    """Return the detail endpoint for a summary or ``None`` if it is skipped.
+
+    Only tenders and advance notices with a project and publication ID
+    are fetched.
+    """
+    pub_type = (summary.get("pubType") or "").lower()
+    if pub_type not in ("tender", "advance_notice"):
+        logger.debug("Skipping project %s with pubType %s", summary.get("id"), pub_type)
+        return None
+
+    pid = summary.get("id")
+    pub = summary.get("publicationId")
+    if not pid or not pub:
+        return None
+    return config.SIMAP_DETAIL_ENDPOINT_TEMPLATE.format(projectId=pid, publicationId=pub)
+
+
+def fetch_project_detail(summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fetch the detail of one summary, ``None`` if skipped or unavailable."""
+    endpoint = detail_endpoint(summary)
+    if endpoint is None:
+        return None
+    return _fetch_detail((summary.get("id"), endpoint))
+
+
+def _fetch_detail(job: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    """Fetch a single publication detail for ``(projectId, endpoint)``."""
+    pid, endpoint = job
+    logger.debug("Fetching detail for project %s", pid)
+    with metrics.timer("simap.detail"):
+        data = call(endpoint)
+    if not data:
+        logger.warning("No detail returned for project %s", pid)
+    return data
+
+
+def documents_endpoint(detail: Dict[str, Any]) -> Optional[str]:
+    """Return the endpoint listing the documents of a publication detail."""
+    pid, pub = detail.get("projectId"), detail.get("id")
+    if not pid or not pub:
+        return None
+    return config.SIMAP_DOCUMENTS_ENDPOINT_TEMPLATE.format(projectId=pid, publicationId=pub)
+
+
+def fetch_document_list(detail: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return the document entries of a publication, empty if unavailable."""
+    endpoint = documents_endpoint(detail)
+    data = call(endpoint) if endpoint else None
+    if isinstance(data, dict):
+        data = data.get("documents") or data.get("items")
+    return [d for d in data if isinstance(d, dict)] if isinstance(data, list) else []
+
+
+def iter_document(url: str, max_bytes: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield the body of a document download in chunks.
+
+    Relative URLs are resolved against ``SIMAP_BASE_URL``. Raises
+    ``ValueError`` without reading the body if the announced size exceeds
+    ``max_bytes``, ``requests.RequestException`` if the download fails.
+    """
+    if url.startswith("/"):
+        url = f"{config.SIMAP_BASE_URL}{url}"
+    resp = _session().get(url, timeout=config.SIMAP_DETAIL_TIMEOUT, limiter=get_limiter(), stream=True)
+    with resp:
+        resp.raise_for_status()
+        length = resp.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ValueError(f"{url} has {int(length)} bytes, more than {max_bytes}")
+        yield from resp.iter_content(chunk_size)
+
+
+def fetch_project_details(
+    summaries: List[Dict[str, Any]], concurrency: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Fetch detail information for the given project summaries.
+
+    Up to ``concurrency`` requests (default ``SIMAP_DETAIL_CONCURRENCY``) are
+    in flight at once; the shared :data:`limiter` paces them. The result keeps
+    the order of ``summaries``.
+    """
+    if concurrency is None:
+        concurrency = config.SIMAP_DETAIL_CONCURRENCY
     logger.info("Fetching details for %d projects", len(summaries))
-    details: List[Dict[str, Any]] = []
+    jobs: List[Tuple[str, str]] = []
     for s in summaries:
-        pub_type = (s.get("pubType") or "").lower()
-        if pub_type not in ("tender", "advance_notice"):
-            logger.debug("Skipping project %s with pubType %s", s.get("id"), pub_type)
-            continue
-
-        pid = s.get("id")
-        pub = s.get("publicationId")
-        if not pid or not pub:
-            continue
-
-        logger.debug("Fetching detail for project %s", pid)
-        endpoint = config.SIMAP_DETAIL_ENDPOINT_TEMPLATE.format(projectId=pid, publicationId=pub)
-        data = call(endpoint)
-        if data:
-            details.append(data)
-        else:
-            logger.warning("No detail returned for project %s", pid)
-        time.sleep(0.5)
+        endpoint = detail_endpoint(s)
+        if endpoint:
+            jobs.append((s.get("id"), endpoint))
+
+    if concurrency <= 1 or len(jobs) <= 1:
+        results = [_fetch_detail(job) for job in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(_fetch_detail, jobs))
+    details = [data for data in results if data]
 
     logger.info("Fetched details for %d/%d projects", len(details), len(summaries))
     return details
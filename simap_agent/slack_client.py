@@ -1,15 +1,47 @@
 """Utility functions for posting formatted messages to Slack."""
 
 import logging
+import queue
+import threading
+import time
+from collections import Counter
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import requests
 
-from simap_agent import config
+from simap_agent import config, metrics
+from simap_agent.http_session import PooledSession, get_session
+from simap_agent.records import Enrichment
+from simap_agent.throttle import AdaptiveRateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Slack accepts at most 50 blocks per message
+SLACK_MAX_BLOCKS = 50
+# Upper bound for the summed text of all blocks in one message
+SLACK_MAX_MESSAGE_CHARS = 40000
+
+# Incoming webhooks allow roughly one message per second
+limiter = AdaptiveRateLimiter(1.0, min_rate=0.1)
+# Limiters of further webhooks (multi-tenant runs), by URL
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def webhook_limiter(url: Optional[str]) -> AdaptiveRateLimiter:
+    """Return the rate limiter of a webhook; ``SLACK_WEBHOOK_URL`` uses :data:`limiter`."""
+    if not url or url == config.SLACK_WEBHOOK_URL:
+        return limiter
+    with _limiters_lock:
+        if url not in _limiters:
+            _limiters[url] = AdaptiveRateLimiter(1.0, min_rate=0.1)
+        return _limiters[url]
+
+
+def _session() -> PooledSession:
+    return get_session("slack", pool_size=2, max_attempts=config.SLACK_MAX_ATTEMPTS)
+
 
 def fmt_date(value: str | None, fmt: str) -> str:
     """Return formatted date or fallback."""
@@ -24,92 +56,76 @@ def fmt_date(value: str | None, fmt: str) -> str:
             return value
 
 
-def format_slack_blocks(proj: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Return Slack blocks for a project dictionary."""
-    team = proj.get("team")
-    pr = proj.get("project", {})
-    title = pr.get("title_de", "—")
-    customer = pr.get("customer", "—")
-    score = proj.get("apply_score", 0)
-    summary = proj.get("summary", "—")
-    project_number = pr.get("projectNumber", "—")
-    project_id = pr.get("projectId", "—")
-    offer_dl_raw = pr.get("offerDeadline")
-    start_raw = pr.get("contract_start")
-    qa_dl_raw = pr.get("qna_deadline")
+def _criteria_text(
+    heading: str, summary: Optional[str], items: List[Dict[str, Any]], in_docs: Optional[bool], as_pdf: Optional[bool], weights: bool
+) -> str:
+    if summary:
+        return f"\n{heading}\n{summary}\n"
+    if items:
+        text = heading
+        for item in items:
+            title = (item.get("title") or {}).get("de")
+            if not title:
+                continue
+            text += f"\n• *{title}*"
+            if weights:
+                if item.get("weighting") is not None:
+                    text += f" – Gewichtung {item['weighting']}%"
+            else:
+                desc = (item.get("description") or {}).get("de") or ""
+                if desc:
+                    text += f" – {desc}"
+        return text + "\n"
+    if as_pdf:
+        return f"{heading}\n Kriterien sind als pdf hinterlegt\n"
+    if in_docs:
+        return f"{heading}\n Kriterien sind in den Dokumenten hinterlegt\n"
+    return ""
+
+
+def format_slack_blocks(proj: Union[Dict[str, Any], Enrichment]) -> List[Dict[str, Any]]:
+    """Return Slack blocks for an enrichment (record or dict)."""
+    rec = Enrichment.from_dict(proj)
+    pr = rec.project
+    # Fields not found in the detail are None
+    title = pr.get("title_de") or "—"
+    customer = pr.get("customer") or "—"
+    summary = rec.summary if rec.summary is not None else "—"
+    project_number = pr.get("projectNumber") or "—"
+    project_id = pr.get("projectId") or "—"
     cpv = pr.get("cpvCode", {}) or {}
-    cpv_code = cpv.get("code", "—")
-    cpv_label = cpv.get("label_de", "—")
-    missing = proj.get("missing_info") or []
-    missing_str = ", ".join(missing) if missing else "Keine"
+    cpv_code = cpv.get("code") or "—"
+    cpv_label = cpv.get("label_de") or "—"
+    missing_str = ", ".join(rec.missing_info) if rec.missing_info else "Keine"
 
-    offer_dl = fmt_date(offer_dl_raw, "%d.%m.%Y")
-    qa_dl = fmt_date(qa_dl_raw, "%d.%m.%Y")
-    start = fmt_date(start_raw, "%d.%m.%Y")
+    offer_dl = fmt_date(pr.get("offerDeadline"), "%d.%m.%Y")
+    qa_dl = fmt_date(pr.get("qna_deadline"), "%d.%m.%Y")
+    start = fmt_date(pr.get("contract_start"), "%d.%m.%Y")
 
     text = (
-        f"\n:rocket: *Team: {team}*  *#{project_number}*\n"
+        f"\n:rocket: *Team: {rec.team}*  *#{project_number}*\n"
         f"\n:file_folder: *Projekt:* {title} / {customer}\n"
-        f"\n:star: *Apply Score:* *{score}*\n"
+        f"\n:star: *Apply Score:* *{rec.apply_score}*\n"
         f"\n:page_facing_up: *Zusammenfassung:*\n>{summary}\n\n"
         f":calendar:   •   *Q&A:* {qa_dl}   •   *Frist:* {offer_dl}   •   *Start:* {start} \n"
         f"\n:pushpin: *CPV:* `{cpv_code}` – {cpv_label}\n"
     )
 
-    if missing:
+    if rec.missing_info:
         text += f"\n:mag: *Fehlende Infos:* {missing_str}\n"
 
-    qual_summary = proj.get("qualificationCriteriaSummary")
-    qual = proj.get("qualificationCriteria") or []
-    qual_in_docs = str(proj.get("qualificationCriteriaInDocuments", "")).lower() == "yes" or proj.get("qualificationCriteriaInDocuments") is True
-
-    qual_as_pdf = str(proj.get("qualificationCriteriaAsPDF", "")).lower() == "yes" or proj.get("qualificationCriteriaAsPDF") is True
-    if qual_summary:
-        text += f"\n:bookmark_tabs: *Eignungskriterien:*\n{qual_summary}\n"
-    elif qual:
-        text += ":bookmark_tabs: *Eignungskriterien:*"
-        for c in qual:
-            title = (c.get("title") or {}).get("de")
-            if not title:
-                continue
-            desc = (c.get("description") or {}).get("de") or ""
-            text += f"\n• *{title}*"
-            if desc:
-                text += f" – {desc}"
-        text += "\n"
-
-    else:
-        if qual_as_pdf:
-            text += ":bookmark_tabs: *Eignungskriterien:*\n Kriterien sind als pdf hinterlegt\n"
-        elif qual_in_docs:
-
-            text += ":bookmark_tabs: *Eignungskriterien:*\n Kriterien sind in den Dokumenten hinterlegt\n"
-
-    award_summary = proj.get("awardCriteriaSummary")
-    award = proj.get("awardCriteria") or []
-    award_in_docs = str(proj.get("awardCriteriaInDocuments", "")).lower() == "yes" or proj.get("awardCriteriaInDocuments") is True
-
-    award_as_pdf = str(proj.get("awardCriteriaAsPDF", "")).lower() == "yes" or proj.get("awardCriteriaAsPDF") is True
-    if award_summary:
-        text += f"\n:trophy: *Zuschlagskriterien:*\n{award_summary}\n"
-    elif award:
-        text += ":trophy: *Zuschlagskriterien:*"
-        for a in award:
-            title = (a.get("title") or {}).get("de")
-            if not title:
-                continue
-            weight = a.get("weighting")
-            text += f"\n• *{title}*"
-            if weight is not None:
-                text += f" – Gewichtung {weight}%"
-        text += "\n"
-
-    else:
-        if award_as_pdf:
-            text += ":trophy: *Zuschlagskriterien:*\n Kriterien sind als pdf hinterlegt\n"
-        elif award_in_docs:
-
-            text += ":trophy: *Zuschlagskriterien:*\n Kriterien sind in den Dokumenten hinterlegt\n"
+    for key, heading, weights in (
+        ("qualificationCriteria", ":bookmark_tabs: *Eignungskriterien:*", False),
+        ("awardCriteria", ":trophy: *Zuschlagskriterien:*", True),
+    ):
+        text += _criteria_text(
+            heading,
+            rec.criteria_summaries.get(key),
+            rec.criteria.get(key) or [],
+            rec.in_documents.get(key),
+            rec.as_pdf.get(key),
+            weights,
+        )
 
     blocks = [
         {"type": "divider"},
@@ -128,8 +144,8 @@ def format_slack_blocks(proj: Dict[str, Any]) -> List[Dict[str, Any]]:
     return blocks
 
 
-def post_blocks(blocks: List[Dict[str, Any]]) -> None:
-    """Send Slack message blocks."""
+def post_blocks(blocks: List[Dict[str, Any]], webhook_url: Optional[str] = None) -> None:
+    """Send Slack message blocks to ``webhook_url`` (default ``SLACK_WEBHOOK_URL``)."""
     logger.debug("Sending Slack blocks")
     # Extract fallback text for clients that do not support blocks.
     fallback = ""
@@ -138,11 +154,14 @@ def post_blocks(blocks: List[Dict[str, Any]]) -> None:
             fallback = block["text"].get("text", "")
             break
     payload = {"text": fallback[:150], "blocks": blocks}
-    response = requests.post(
-        config.SLACK_WEBHOOK_URL,
+    if not webhook_url:
+        config.require("SLACK_WEBHOOK_URL")
+    response = _session().post(
+        webhook_url or config.SLACK_WEBHOOK_URL,
         json=payload,
         headers={"Content-Type": "application/json"},
         timeout=10,
+        limiter=webhook_limiter(webhook_url),
     )
     logger.debug("Slack response status: %s", response.status_code)
     response.raise_for_status()
@@ -150,6 +169,147 @@ def post_blocks(blocks: List[Dict[str, Any]]) -> None:
 
 def post_message(text: str) -> None:
     logger.debug("Sending Slack message")
-    response = requests.post(config.SLACK_WEBHOOK_URL, json={"text": text}, timeout=10)
+    config.require("SLACK_WEBHOOK_URL")
+    response = _session().post(
+        config.SLACK_WEBHOOK_URL, json={"text": text}, timeout=10, limiter=limiter
+    )
     logger.debug("Slack response status: %s", response.status_code)
     response.raise_for_status()
+
+
+def _block_chars(blocks: List[Dict[str, Any]]) -> int:
+    total = 0
+    for block in blocks:
+        text = block.get("text")
+        if isinstance(text, dict):
+            total += len(text.get("text", ""))
+        for element in block.get("elements") or []:
+            total += len(element.get("text", "")) if isinstance(element, dict) else 0
+    return total
+
+
+def merge_blocks(parts: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Concatenate several projects' blocks without doubled dividers."""
+    merged: List[Dict[str, Any]] = []
+    for blocks in parts:
+        for block in blocks:
+            if block.get("type") == "divider" and merged and merged[-1].get("type") == "divider":
+                continue
+            merged.append(block)
+    return merged
+
+
+Callback = Optional[Callable[[bool], None]]
+_CLOSE = object()
+
+
+class SlackDelivery:
+    """Background sender that packs several projects into one Slack message.
+
+    :meth:`add` queues the blocks of one project. A sender thread packs
+    queued projects into messages within :data:`SLACK_MAX_BLOCKS` and
+    :data:`SLACK_MAX_MESSAGE_CHARS` and posts a message once it is full or
+    no further project arrived for ``linger`` seconds. Posts are paced by
+    the webhook rate limiter; 429 responses are retried by the session
+    according to ``Retry-After``. Messages that still fail are queued and
+    retried after the others, up to ``max_rounds`` times, except after a
+    read timeout: Slack may already have posted the message, so it counts
+    as delivered (``unconfirmed_projects``) rather than being sent twice.
+    ``on_done`` is called with the final outcome for every project.
+    """
+
+    def __init__(
+        self,
+        post: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        max_blocks: int = SLACK_MAX_BLOCKS,
+        max_chars: int = SLACK_MAX_MESSAGE_CHARS,
+        linger: Optional[float] = None,
+        max_rounds: Optional[int] = None,
+        retry_delay: float = 5.0,
+    ) -> None:
+        self._post = post or post_blocks
+        self.max_blocks = max_blocks
+        self.max_chars = max_chars
+        self.linger = config.SLACK_LINGER_SECONDS if linger is None else linger
+        self.max_rounds = config.SLACK_MAX_ROUNDS if max_rounds is None else max_rounds
+        self.retry_delay = retry_delay
+        self.stats: Counter = Counter()
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._failed: List[List[Tuple[List[Dict[str, Any]], Callback, float]]] = []
+        self._thread = threading.Thread(target=self._run, name="slack-delivery", daemon=True)
+        self._thread.start()
+
+    def add(self, blocks: List[Dict[str, Any]], on_done: Callback = None) -> None:
+        """Queue the blocks of one project for delivery."""
+        self._queue.put((blocks, on_done, time.monotonic()))
+
+    def close(self) -> None:
+        """Send everything still queued, retry failures and stop the sender."""
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        logger.info("Slack delivery stats: %s", dict(self.stats))
+
+    def __enter__(self) -> "SlackDelivery":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _fits(self, pack: List[Any], blocks: List[Dict[str, Any]]) -> bool:
+        n_blocks = sum(len(b) for b, _, _ in pack) + len(blocks)
+        n_chars = sum(_block_chars(b) for b, _, _ in pack) + _block_chars(blocks)
+        return n_blocks <= self.max_blocks and n_chars <= self.max_chars
+
+    def _send(self, pack: List[Any], final: bool = False) -> None:
+        try:
+            with metrics.timer("slack.post"):
+                self._post(merge_blocks([blocks for blocks, _, _ in pack]))
+        except requests.ReadTimeout:
+            logger.warning("Slack post with %d projects timed out, it may have been delivered", len(pack))
+            self.stats["unconfirmed_projects"] += len(pack)
+            ok = True
+        except Exception:
+            logger.exception("Slack post with %d projects failed", len(pack))
+            if not final:
+                self._failed.append(pack)
+                return
+            self.stats["failed_projects"] += len(pack)
+            ok = False
+        else:
+            self.stats["messages"] += 1
+            self.stats["projects"] += len(pack)
+            now = time.monotonic()
+            latency = max(now - queued for _, _, queued in pack)
+            self.stats["max_latency_ms"] = max(self.stats["max_latency_ms"], int(latency * 1000))
+            ok = True
+        for _, on_done, _ in pack:
+            if on_done:
+                on_done(ok)
+
+    def _run(self) -> None:
+        pack: List[Any] = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.linger if pack else None)
+            except queue.Empty:
+                self._send(pack, final=self.max_rounds <= 1)
+                pack = []
+                continue
+            if item is _CLOSE:
+                break
+            if pack and not self._fits(pack, item[0]):
+                self._send(pack, final=self.max_rounds <= 1)
+                pack = []
+            pack.append(item)
+        if pack:
+            self._send(pack, final=self.max_rounds <= 1)
+
+        for attempt in range(2, self.max_rounds + 1):
+            if not self._failed:
+                break
+            failed, self._failed = self._failed, []
+            logger.info("Retrying %d failed Slack messages", len(failed))
+            time.sleep(self.retry_delay)
+            for pack in failed:
+                self.stats["retried_messages"] += 1
+                self._send(pack, final=attempt == self.max_rounds)
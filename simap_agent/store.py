@@ -0,0 +1,410 @@
+"""SQLite store remembering which publications were already processed.
+
+The store doubles as the checkpoint of a run: search results and fetched
+details are saved as they arrive, so a run that is cut short (e.g. by the
+Azure Functions timeout) resumes where it stopped instead of searching,
+fetching and enriching everything again.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from simap_agent import config
+from simap_agent.records import plain
+
+logger = logging.getLogger(__name__)
+
+# Post status values kept in the ``post_status`` column
+STATUS_PENDING = "pending"
+STATUS_POSTED = "posted"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+# Publications in one of these states are not fetched again
+DONE_STATUSES = (STATUS_POSTED, STATUS_SKIPPED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS publications (
+    project_id TEXT NOT NULL,
+    publication_id TEXT NOT NULL,
+    detail_hash TEXT,
+    enrichment TEXT,
+    post_status TEXT NOT NULL DEFAULT 'pending',
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (project_id, publication_id)
+);
+CREATE TABLE IF NOT EXISTS backfill_days (
+    job TEXT NOT NULL,
+    day TEXT NOT NULL,
+    tenders INTEGER NOT NULL,
+    finished_at TEXT NOT NULL,
+    PRIMARY KEY (job, day)
+);
+CREATE TABLE IF NOT EXISTS backfill_items (
+    job TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    publication_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    apply_score INTEGER,
+    enriched_at TEXT,
+    PRIMARY KEY (job, project_id, publication_id)
+);
+CREATE TABLE IF NOT EXISTS tenant_posts (
+    tenant TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    publication_id TEXT NOT NULL,
+    post_status TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (tenant, project_id, publication_id)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    published_from TEXT NOT NULL,
+    search_done INTEGER NOT NULL DEFAULT 0,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+"""
+
+# Checkpoint columns added to ``publications`` after the first release
+_CHECKPOINT_COLUMNS = (("run_id", "INTEGER"), ("summary", "TEXT"), ("detail", "TEXT"))
+
+Key = Tuple[str, str]
+
+
+def detail_hash(detail: Dict[str, Any]) -> str:
+    """Return a stable hash of a publication detail."""
+    raw = json.dumps(plain(detail), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def summary_key(summary: Dict[str, Any]) -> Optional[Key]:
+    """Return ``(projectId, publicationId)`` of a search result."""
+    pid, pub = summary.get("id"), summary.get("publicationId")
+    return (pid, pub) if pid and pub else None
+
+
+def detail_key(detail: Dict[str, Any]) -> Optional[Key]:
+    """Return ``(projectId, publicationId)`` of a publication detail.
+
+    The detail response carries the publication ID as ``id`` and the
+    project it belongs to as ``projectId``.
+    """
+    pid, pub = detail.get("projectId"), detail.get("id")
+    return (pid, pub) if pid and pub else None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _dumps(value: Dict[str, Any]) -> str:
+    return json.dumps(plain(value), ensure_ascii=False)
+
+
+class RunState(NamedTuple):
+    """Checkpoint of one pipeline run."""
+
+    run_id: int
+    published_from: str
+    search_done: bool
+    resumed: bool
+
+
+class PublicationStore:
+    """Processed publications keyed by ``(projectId, publicationId)``.
+
+    For every publication the store keeps the hash of the fetched detail,
+    the enrichment result and whether it was posted to Slack. The connection
+    is shared between threads and guarded by a lock.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(publications)")}
+        for name, kind in _CHECKPOINT_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE publications ADD COLUMN {name} {kind}")
+        self._conn.commit()
+        logger.debug("Publication store opened at %s", path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _row(self, key: Key) -> Optional[Tuple[Optional[str], Optional[str], str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT detail_hash, enrichment, post_status FROM publications "
+                "WHERE project_id = ? AND publication_id = ?",
+                key,
+            ).fetchone()
+
+    def is_done(self, summary: Dict[str, Any]) -> bool:
+        """Return True if the publication was already posted or skipped."""
+        key = summary_key(summary)
+        if key is None:
+            return False
+        row = self._row(key)
+        return bool(row) and row[2] in DONE_STATUSES
+
+    def post_status(self, detail: Dict[str, Any]) -> Optional[str]:
+        key = detail_key(detail)
+        row = self._row(key) if key else None
+        return row[2] if row else None
+
+    def cached_enrichment(self, detail: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the stored enrichment if the detail did not change since."""
+        key = detail_key(detail)
+        row = self._row(key) if key else None
+        if not row or not row[1] or row[0] != detail_hash(detail):
+            return None
+        return json.loads(row[1])
+
+    def record_enrichment(self, detail: Dict[str, Any], enrichment: Dict[str, Any]) -> None:
+        """Store the enrichment and reset the post status for a new hash."""
+        key = detail_key(detail)
+        if key is None:
+            return
+        digest = detail_hash(detail)
+        payload = json.dumps(enrichment, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO publications (project_id, publication_id, detail_hash, enrichment, post_status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (project_id, publication_id) DO UPDATE SET "
+                "post_status = CASE WHEN detail_hash = excluded.detail_hash THEN post_status ELSE excluded.post_status END, "
+                "detail_hash = excluded.detail_hash, enrichment = excluded.enrichment, updated_at = excluded.updated_at",
+                (*key, digest, payload, STATUS_PENDING, _now()),
+            )
+            self._conn.commit()
+
+    def set_post_status(self, detail: Dict[str, Any], status: str) -> None:
+        self._set_post_status(detail_key(detail), status)
+
+    def skip_summary(self, summary: Dict[str, Any]) -> None:
+        """Mark a search result whose detail is never fetched as skipped."""
+        self._set_post_status(summary_key(summary), STATUS_SKIPPED)
+
+    def _set_post_status(self, key: Optional[Key], status: str) -> None:
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO publications (project_id, publication_id, post_status, updated_at) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (project_id, publication_id) DO UPDATE SET "
+                "post_status = excluded.post_status, updated_at = excluded.updated_at",
+                (*key, status, _now()),
+            )
+            self._conn.commit()
+
+    def tenant_post_status(self, tenant: str, detail: Dict[str, Any]) -> Optional[str]:
+        """Return the post status of a publication for one tenant of a multi-tenant run."""
+        key = detail_key(detail)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT post_status FROM tenant_posts WHERE tenant = ? AND project_id = ? AND publication_id = ?",
+                (tenant, *key),
+            ).fetchone()
+        return row[0] if row else None
+
+    def is_done_for_tenants(self, summary: Dict[str, Any], tenants: Iterable[str]) -> bool:
+        """Return True if every one of ``tenants`` had the publication posted or skipped."""
+        key = summary_key(summary)
+        tenants = list(tenants)
+        if key is None or not tenants:
+            return False
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tenant, post_status FROM tenant_posts WHERE project_id = ? AND publication_id = ?",
+                key,
+            ).fetchall()
+        done = {tenant for tenant, status in rows if status in DONE_STATUSES}
+        return all(tenant in done for tenant in tenants)
+
+    def set_tenant_post_status(self, tenant: str, detail: Dict[str, Any], status: str) -> None:
+        key = detail_key(detail)
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tenant_posts (tenant, project_id, publication_id, post_status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (tenant, *key, status, _now()),
+            )
+            self._conn.commit()
+
+    # -- run checkpoints ----------------------------------------------------
+
+    def begin_run(self, published_from: str) -> RunState:
+        """Resume the last unfinished run or start a new one.
+
+        A resumed run keeps its original search window, so tenders published
+        before a restart on the next day are not missed.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, published_from, search_done FROM runs "
+                "WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1"
+            ).fetchone()
+            if row:
+                return RunState(row[0], row[1], bool(row[2]), True)
+            cur = self._conn.execute(
+                "INSERT INTO runs (published_from, started_at) VALUES (?, ?)",
+                (published_from, _now()),
+            )
+            self._conn.commit()
+            return RunState(cur.lastrowid, published_from, False, False)
+
+    def finish_search(self, run_id: int) -> None:
+        """Mark the search of ``run_id`` as complete."""
+        with self._lock:
+            self._conn.execute("UPDATE runs SET search_done = 1 WHERE run_id = ?", (run_id,))
+            self._conn.commit()
+
+    def finish_run(self, run_id: int) -> None:
+        """Mark ``run_id`` as finished so the next run starts afresh."""
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (_now(), run_id))
+            self._conn.commit()
+
+    def record_summary(self, run_id: Optional[int], summary: Dict[str, Any]) -> None:
+        """Checkpoint a search result, as part of ``run_id`` if given."""
+        key = summary_key(summary)
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO publications (project_id, publication_id, run_id, summary, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (project_id, publication_id) DO UPDATE SET "
+                "run_id = COALESCE(excluded.run_id, run_id), summary = excluded.summary, "
+                "updated_at = excluded.updated_at",
+                (*key, run_id, _dumps(summary), _now()),
+            )
+            self._conn.commit()
+
+    def record_detail(self, detail: Dict[str, Any]) -> None:
+        """Checkpoint a fetched detail so a resumed run does not fetch it again."""
+        key = detail_key(detail)
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE publications SET detail = ?, updated_at = ? "
+                "WHERE project_id = ? AND publication_id = ?",
+                (_dumps(detail), _now(), *key),
+            )
+            self._conn.commit()
+
+    def enrichments(self) -> Iterator[Tuple[Key, Dict[str, Any]]]:
+        """Yield ``(key, enrichment)`` of every enriched publication."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT project_id, publication_id, enrichment FROM publications WHERE enrichment IS NOT NULL"
+            ).fetchall()
+        for pid, pub, enrichment in rows:
+            yield (pid, pub), json.loads(enrichment)
+
+    def recent_details(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` stored details, most recently updated first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT detail FROM publications WHERE detail IS NOT NULL ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stored_detail(self, summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the checkpointed detail of a search result, if any."""
+        key = summary_key(summary)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT detail FROM publications WHERE project_id = ? AND publication_id = ?", key
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def unfinished(self, run_id: int) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Yield ``(summary, detail)`` of checkpointed items not yet done.
+
+        ``detail`` is ``None`` if it was not fetched before the run stopped.
+        """
+        with self._lock:
+            rows: List[Tuple[str, Optional[str]]] = self._conn.execute(
+                "SELECT summary, detail FROM publications "
+                "WHERE run_id = ? AND summary IS NOT NULL AND post_status NOT IN (?, ?)",
+                (run_id, *DONE_STATUSES),
+            ).fetchall()
+        for summary, detail in rows:
+            yield json.loads(summary), json.loads(detail) if detail else None
+
+    # -- backfill progress --------------------------------------------------
+
+    def backfill_days(self, job: str) -> List[str]:
+        """Return the days of backfill ``job`` whose details are all stored."""
+        with self._lock:
+            rows = self._conn.execute("SELECT day FROM backfill_days WHERE job = ?", (job,)).fetchall()
+        return [row[0] for row in rows]
+
+    def finish_backfill_day(self, job: str, day: str, details: List[Dict[str, Any]]) -> None:
+        """Mark ``day`` of ``job`` as fetched and queue its details for enrichment."""
+        keys = [key for key in map(detail_key, details) if key]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO backfill_items (job, project_id, publication_id, day) VALUES (?, ?, ?, ?)",
+                [(job, *key, day) for key in keys],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backfill_days (job, day, tenders, finished_at) VALUES (?, ?, ?, ?)",
+                (job, day, len(keys), _now()),
+            )
+            self._conn.commit()
+
+    def pending_backfill_details(self, job: str) -> List[Dict[str, Any]]:
+        """Return stored details of ``job`` that were not enriched yet."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.detail FROM backfill_items b JOIN publications p "
+                "ON p.project_id = b.project_id AND p.publication_id = b.publication_id "
+                "WHERE b.job = ? AND b.enriched_at IS NULL AND p.detail IS NOT NULL "
+                "ORDER BY b.day",
+                (job,),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def finish_backfill_item(self, job: str, detail: Dict[str, Any], apply_score: Optional[int]) -> None:
+        key = detail_key(detail)
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE backfill_items SET apply_score = ?, enriched_at = ? "
+                "WHERE job = ? AND project_id = ? AND publication_id = ?",
+                (apply_score, _now(), job, *key),
+            )
+            self._conn.commit()
+
+
+def open_store(path: Optional[str] = None) -> Optional[PublicationStore]:
+    """Open the store at ``path`` (default ``STATE_DB_PATH``); ``None`` if disabled."""
+    path = config.STATE_DB_PATH if path is None else path
+    if not path:
+        logger.debug("Publication store disabled")
+        return None
+    try:
+        return PublicationStore(path)
+    except (OSError, sqlite3.Error) as exc:
+        logger.warning("Cannot open publication store %s, continuing without it: %s", path, exc)
+        return None
@@ -0,0 +1,273 @@
+"""Serve several business units from one pipeline run.
+
+``TENANTS_FILE`` lists the tenants, each with its own company profile,
+apply-score threshold, CPV codes and Slack webhook::
+
+    [
+      {
+        "name": "integration",
+        "profile_file": "profiles/integration.json",
+        "apply_score_threshold": 7,
+        "cpv_codes": ["48000000", "72000000"],
+        "slack_webhook_env": "SLACK_WEBHOOK_INTEGRATION"
+      }
+    ]
+
+``profile`` may hold the profile inline and ``slack_webhook_url`` the
+webhook itself; threshold and CPV codes default to ``APPLY_SCORE_THRESHOLD``
+and ``CPV_CODES``. SIMAP is searched once for the union of all CPV codes,
+every detail is fetched once, and every tender is enriched once for all
+tenants whose CPV codes it matches (:func:`enricher.enrich_for_profiles`),
+so the number of LLM calls grows with the tenders, not tenants × tenders.
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from simap_agent import config, metrics
+from simap_agent.documents import DocumentIngestor
+from simap_agent.enricher import enrich_for_profiles
+from simap_agent.extract import extract_project
+from simap_agent.main import Run, Tender
+from simap_agent.pipeline import run_stage
+from simap_agent.records import ProjectSummary, PublicationDetail
+from simap_agent.slack_client import SlackDelivery, format_slack_blocks, post_blocks
+from simap_agent.store import STATUS_FAILED, STATUS_POSTED, STATUS_SKIPPED, PublicationStore, RunState
+
+logger = logging.getLogger(__name__)
+
+# Profile lists combined for the local pre-filter
+PROFILE_LIST_KEYS = ("domains", "expertise", "technologies")
+
+
+@dataclass
+class Tenant:
+    """A business unit with its own profile, threshold, CPV codes and webhook."""
+
+    name: str
+    profile: Dict[str, Any]
+    webhook_url: str
+    threshold: int
+    cpv_codes: List[str]
+
+    def matches(self, detail: Dict[str, Any]) -> bool:
+        """Return True if a CPV code of the detail falls under one of the tenant's codes.
+
+        ``48000000`` covers every code starting with ``48``; details without
+        a CPV code match every tenant.
+        """
+        codes = cpv_codes(detail)
+        if not codes:
+            return True
+        prefixes = [code.rstrip("0") or code for code in self.cpv_codes]
+        return any(code.startswith(prefix) for code in codes for prefix in prefixes)
+
+
+def cpv_codes(detail: Dict[str, Any]) -> List[str]:
+    """Return the main and additional CPV codes of a detail."""
+    record = PublicationDetail.from_dict(detail)
+    main = extract_project(record)["cpvCode"]
+    codes = [main["code"]] if main else []
+    procurement = record.get("procurement")
+    extra = procurement.get("additionalCpvCodes") if isinstance(procurement, dict) else None
+    for item in extra if isinstance(extra, list) else []:
+        code = item.get("code") if isinstance(item, dict) else item
+        if isinstance(code, str) and code.strip():
+            codes.append(code.strip())
+    return codes
+
+
+def _load_profile(entry: Dict[str, Any], base: str) -> Dict[str, Any]:
+    if "profile" in entry:
+        return entry["profile"] or {}
+    path = entry.get("profile_file")
+    if not path:
+        return config.COMPANY_PROFILE
+    with open(os.path.join(base, path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_tenants(path: str) -> List[Tenant]:
+    """Read the tenants file; raises ``ValueError`` for an invalid entry."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must contain a non-empty list of tenants")
+    base = os.path.dirname(os.path.abspath(path))
+    tenants: List[Tenant] = []
+    for entry in entries:
+        name = entry.get("name")
+        if not name or any(t.name == name for t in tenants):
+            raise ValueError(f"Tenant without a unique name in {path}: {entry}")
+        webhook = entry.get("slack_webhook_url") or os.getenv(entry.get("slack_webhook_env") or "")
+        if not webhook:
+            raise ValueError(f"Tenant {name} has no Slack webhook")
+        tenants.append(
+            Tenant(
+                name=name,
+                profile=_load_profile(entry, base),
+                webhook_url=webhook,
+                threshold=int(entry.get("apply_score_threshold", config.APPLY_SCORE_THRESHOLD)),
+                cpv_codes=[str(c) for c in entry.get("cpv_codes") or config.CPV_CODES],
+            )
+        )
+    logger.info("Loaded %d tenants from %s", len(tenants), path)
+    return tenants
+
+
+def cpv_union(tenants: Iterable[Tenant]) -> List[str]:
+    """Return the CPV codes of all tenants without duplicates, in order."""
+    return list(dict.fromkeys(code for tenant in tenants for code in tenant.cpv_codes))
+
+
+def merge_profiles(profiles: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return one profile with the domains, expertise and technologies of all.
+
+    The local pre-filter compares tenders against it, so a tender relevant
+    to any tenant is kept.
+    """
+    merged: Dict[str, List[Any]] = {key: [] for key in PROFILE_LIST_KEYS}
+    for profile in profiles:
+        for key in PROFILE_LIST_KEYS:
+            merged[key].extend(profile.get(key) or [])
+    return merged
+
+
+class TenantRun(Run):
+    """Pipeline run scoring every tender for all tenants and posting to each webhook.
+
+    The enrichment stored for a tender holds the result of every tenant
+    under ``tenants`` and the highest apply score; tenants added later are
+    scored on their own when a stored enrichment is reused. Post statuses
+    are kept per tenant, including tenants whose CPV codes a tender does
+    not match; a publication is searched again until every current tenant
+    posted or skipped it, so a tenant added later still gets the tenders
+    of the search window that other tenants already received.
+    Near-duplicate detection and the search index are not used.
+    """
+
+    def __init__(
+        self,
+        store: Optional[PublicationStore],
+        tenants: List[Tenant],
+        state: Optional[RunState] = None,
+        deadline: Optional[float] = None,
+        documents: Optional[DocumentIngestor] = None,
+    ) -> None:
+        deliveries = {
+            t.name: SlackDelivery(post=lambda blocks, url=t.webhook_url: post_blocks(blocks, url)) for t in tenants
+        }
+        super().__init__(
+            store,
+            None,
+            profile=merge_profiles(t.profile for t in tenants),
+            state=state,
+            deadline=deadline,
+            documents=documents,
+        )
+        self.tenants = tenants
+        self.deliveries = deliveries
+        self.cpv = cpv_union(tenants)
+
+    def _is_done(self, summary: ProjectSummary) -> bool:
+        return self.store.is_done_for_tenants(summary, (t.name for t in self.tenants))
+
+    def _skip(self, detail: PublicationDetail) -> None:
+        super()._skip(detail)
+        for tenant in self.tenants:
+            self.store.set_tenant_post_status(tenant.name, detail, STATUS_SKIPPED)
+
+    def enrich(self, tender: Tender) -> Tender:
+        data = tender.enrichment if tender.enrichment and "tenants" in tender.enrichment else None
+        results: Dict[str, Dict[str, Any]] = dict(data["tenants"]) if data else {}
+        wanted = {t.name: t.profile for t in self.tenants if t.name not in results and t.matches(tender.detail)}
+        if wanted:
+            logger.info("Enriching project %s for %s", tender.detail.get("id"), ", ".join(wanted))
+            with metrics.timer("stage.enrich"):
+                results.update(enrich_for_profiles(tender.detail, wanted))
+            tender.enrichment = {
+                "apply_score": max((r.get("apply_score", 0) for r in results.values()), default=0),
+                "tenants": results,
+            }
+            self._record(tender)
+        elif data is None:
+            tender.enrichment = {"apply_score": 0, "tenants": {}}
+        return tender
+
+    def enrich_all(self, tenders: Iterable[Tender]) -> Iterator[Tender]:
+        # Enrichments differ per tenant set, so the Batch API mode is not used
+        yield from run_stage(
+            tenders,
+            self.enrich,
+            workers=config.OPENAI_MAX_CONCURRENCY,
+            queue_size=config.PIPELINE_QUEUE_SIZE,
+            name="enrich",
+        )
+
+    def deliver(self, tender: Tender) -> None:
+        """Post a tender to every tenant whose threshold its score reaches."""
+        det = tender.detail
+        statuses: Dict[str, str] = {}
+        queued = []
+        for tenant in self.tenants:
+            data = tender.enrichment["tenants"].get(tenant.name)
+            if data is None:
+                # Outside the tenant's CPV codes
+                if self.store:
+                    self.store.set_tenant_post_status(tenant.name, det, STATUS_SKIPPED)
+                continue
+            if self.store and self.store.tenant_post_status(tenant.name, det) == STATUS_POSTED:
+                logger.info("Project #%s already posted for tenant %s", det.get("projectNumber"), tenant.name)
+                statuses[tenant.name] = STATUS_POSTED
+                continue
+            if data.get("apply_score", 0) < tenant.threshold:
+                self.count(f"{tenant.name}.below_threshold")
+                statuses[tenant.name] = STATUS_SKIPPED
+                if self.store:
+                    self.store.set_tenant_post_status(tenant.name, det, STATUS_SKIPPED)
+                continue
+            queued.append((tenant, data))
+        if not queued:
+            self._settle(det, statuses)
+            return
+
+        remaining = [len(queued)]
+
+        def done(tenant: Tenant, ok: bool) -> None:
+            status = STATUS_POSTED if ok else STATUS_FAILED
+            self.count(f"{tenant.name}.{'posted' if ok else 'post_failed'}")
+            if self.store:
+                self.store.set_tenant_post_status(tenant.name, det, status)
+            with self._lock:
+                statuses[tenant.name] = status
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._settle(det, statuses)
+
+        for tenant, data in queued:
+            logger.info("Queueing project #%s for tenant %s", det.get("projectNumber"), tenant.name)
+            self.deliveries[tenant.name].add(format_slack_blocks(data), on_done=lambda ok, t=tenant: done(t, ok))
+
+    def _settle(self, det: Dict[str, Any], statuses: Dict[str, str]) -> None:
+        """Set the publication status once every tenant's post is finished."""
+        if STATUS_FAILED in statuses.values():
+            status = STATUS_FAILED
+        elif STATUS_POSTED in statuses.values():
+            status = STATUS_POSTED
+            self.count("posted")
+        else:
+            status = STATUS_SKIPPED
+            self.count("below_threshold")
+        if self.store:
+            self.store.set_post_status(det, status)
+
+    def close(self) -> None:
+        for delivery in self.deliveries.values():
+            delivery.close()
+
+    def slack_stats(self) -> Dict[str, Any]:
+        return {name: dict(delivery.stats) for name, delivery in self.deliveries.items()}
@@ -0,0 +1,131 @@
+"""Rate limiting helpers shared by the HTTP clients."""
+
+import email.utils
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds announced by a ``Retry-After`` header."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe request pacer that slows down when the server pushes back.
+
+    Every caller has to :meth:`acquire` a slot before sending a request. The
+    slots are spaced ``1 / rate`` seconds apart. :meth:`backoff` halves the
+    rate and optionally blocks all callers for a ``Retry-After`` period,
+    :meth:`success` slowly raises the rate again up to ``max_rate``.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float = 0.2,
+        max_rate: Optional[float] = None,
+        recovery: float = 0.1,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate or rate
+        self.recovery = recovery
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+
+    def acquire(self) -> float:
+        """Block until the next request may be sent and return the wait time."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._blocked_until)
+            self._next_slot = start + 1.0 / self.rate
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def backoff(self, retry_after: Optional[float] = None) -> None:
+        """Reduce the request rate after a 429/503 response."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            logger.debug("Rate limiter backing off to %.2f req/s (retry after %s)", self.rate, retry_after)
+
+    def success(self) -> None:
+        """Slowly recover the request rate after a successful response."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+
+class RequestBudget:
+    """Thread-safe requests-per-minute and tokens-per-minute budget.
+
+    Mirrors the quota of an Azure OpenAI deployment: :meth:`acquire` blocks
+    until both the request and the token count fit into the sliding
+    one-minute window. :meth:`pause` stops every caller for a while after a
+    429 response.
+    """
+
+    window = 60.0
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._events: Deque[Tuple[float, int]] = deque()
+        self._tokens = 0
+        self._blocked_until = 0.0
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        while self._events and self._events[0][0] <= now - self.window:
+            self._tokens -= self._events.popleft()[1]
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if not self._events:
+            return 0.0
+        if len(self._events) < self.rpm and self._tokens + tokens <= self.tpm:
+            return 0.0
+        return self._events[0][0] + self.window - now
+
+    def acquire(self, tokens: int) -> float:
+        """Reserve ``tokens`` for one request and return the time waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._wait_time(now, tokens)
+                if delay <= 0:
+                    self._events.append((now, tokens))
+                    self._tokens += tokens
+                    return waited
+            logger.debug("Request budget exhausted, waiting %.1fs", delay)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Block all callers for ``seconds``."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
@@ -3,9 +3,14 @@
 import os
 import json
 import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from types import SimpleNamespace
-import importlib
 
 # Ensure required env vars for config
 os.environ.setdefault("SLACK_WEBHOOK_URL", "http://example.com")
@@ -16,15 +21,37 @@ os.environ.setdefault(
 )
 os.environ.setdefault("OPENAI_API_VERSION", "2025-01-01-preview")
 os.environ.setdefault("APPLY_SCORE_THRESHOLD", "7")
+os.environ.setdefault("STATE_DB_PATH", "")
+os.environ.setdefault("LLM_CACHE_PATH", "")
+os.environ.setdefault("RUN_REPORT_PATH", "")
+os.environ.setdefault("INDEX_PATH", "")
+os.environ.setdefault("SIMAP_CACHE_PATH", "")
+os.environ.setdefault("DEDUP_PATH", "")
+os.environ.setdefault("DOCUMENTS_CACHE_PATH", "")
 
 import simap_agent.config as config
-importlib.reload(config)
+config.reset()
 
 import simap_agent.main as main
 
 import simap_agent.slack_client as slack_client
 import simap_agent.simap_client as simap_client
 import simap_agent.enricher as enricher
+import simap_agent.throttle as throttle
+import simap_agent.http_session as http_session
+import simap_agent.http_cache as http_cache
+import simap_agent.store as store
+import simap_agent.llm_cache as llm_cache
+import simap_agent.prefilter as prefilter
+import simap_agent.payload as payload
+import simap_agent.batch as batch
+import simap_agent.pipeline as pipeline
+import simap_agent.metrics as metrics
+import simap_agent.dedupe as dedupe
+import simap_agent.records as records
+import simap_agent.extract as extract
+import simap_agent.documents as documents
+import simap_agent.tenants as tenants
 
 
 def test_format_slack_blocks_basic():
@@ -179,22 +206,17 @@ def test_fetch_project_details_filters(monkeypatch):
 def test_main_filters_apply_score(monkeypatch):
     calls = []
 
-    monkeypatch.setattr(main, "fetch_project_summaries", lambda cpv=None: ["s"])
     monkeypatch.setattr(
-        main,
-        "fetch_project_details",
-        lambda summaries: [
-            {"projectNumber": "1"},
-            {"projectNumber": "2"},
-        ],
+        main, "iter_project_summaries", lambda cpv=None, **kwargs: iter([{"id": "1"}, {"id": "2"}])
     )
+    monkeypatch.setattr(main, "fetch_project_detail", lambda s: {"projectNumber": s["id"]})
     monkeypatch.setattr(
         main,
-        "enrich_batch",
-        lambda details, profile: [
-            {"apply_score": 6, "project": {"projectNumber": "1"}},
-            {"apply_score": 8, "project": {"projectNumber": "2"}},
-        ],
+        "enrich",
+        lambda detail, profile: {
+            "apply_score": 6 if detail["projectNumber"] == "1" else 8,
+            "project": {"projectNumber": detail["projectNumber"]},
+        },
     )
     monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
     monkeypatch.setattr(main, "post_blocks", lambda blocks: calls.append(blocks))
@@ -203,3 +225,1560 @@ def test_main_filters_apply_score(monkeypatch):
 
     assert len(calls) == 1
 
+
+def test_fetch_project_details_concurrent_keeps_order(monkeypatch):
+    summaries = [
+        {"pubType": "tender", "id": str(i), "publicationId": f"p{i}"} for i in range(6)
+    ]
+    summaries.insert(2, {"pubType": "notice", "id": "x", "publicationId": "px"})
+    summaries.insert(4, {"pubType": "tender", "id": "y"})
+
+    def fake_call(endpoint, params=None):
+        # later projects answer faster so completion order differs from input order
+        time.sleep(0.01 * (10 - len(endpoint) % 10))
+        return {"endpoint": endpoint}
+
+    monkeypatch.setattr(simap_client, "call", fake_call)
+
+    result = simap_client.fetch_project_details(summaries, concurrency=4)
+    expected = [
+        simap_client.config.SIMAP_DETAIL_ENDPOINT_TEMPLATE.format(
+            projectId=str(i), publicationId=f"p{i}"
+        )
+        for i in range(6)
+    ]
+    assert [r["endpoint"] for r in result] == expected
+
+
+def test_call_backs_off_on_429(monkeypatch):
+    responses = [
+        SimpleNamespace(status_code=429, headers={"Retry-After": "0"}, close=lambda: None),
+        SimpleNamespace(
+            status_code=200,
+            headers={},
+            raise_for_status=lambda: None,
+            json=lambda: {"ok": True},
+        ),
+    ]
+    limiter = simap_client.AdaptiveRateLimiter(100.0)
+    monkeypatch.setattr(simap_client, "limiter", limiter)
+    session = http_session.PooledSession("test")
+    monkeypatch.setattr(simap_client, "_session", lambda: session)
+    monkeypatch.setattr(session.session, "request", lambda *a, **kw: responses.pop(0))
+
+    assert simap_client.call("/x") == {"ok": True}
+    assert limiter.rate < 100.0
+    assert not responses
+    assert session.stats()["retries"] == 1
+
+
+def test_pooled_session_caps_retry_after_and_does_not_resend_timed_out_posts(monkeypatch):
+    import requests
+
+    slept, calls = [], []
+    monkeypatch.setattr(http_session.time, "sleep", slept.append)
+    session = http_session.PooledSession("test", backoff_max=2.0)
+    ok = SimpleNamespace(status_code=200, headers={})
+    responses = [SimpleNamespace(status_code=429, headers={"Retry-After": "3600"}, close=lambda: None), ok]
+    monkeypatch.setattr(session.session, "request", lambda *a, **kw: responses.pop(0))
+    assert session.get("http://x") is ok
+    assert slept == [2.0]
+
+    def timeout(method, url, **kwargs):
+        calls.append(method)
+        raise requests.ReadTimeout("read timed out")
+
+    monkeypatch.setattr(session.session, "request", timeout)
+    with pytest.raises(requests.ReadTimeout):
+        session.post("http://hooks/x", json={})
+    assert calls == ["POST"]
+    with pytest.raises(requests.ReadTimeout):
+        session.get("http://x")
+    assert calls == ["POST"] + ["GET"] * session.max_attempts
+
+
+def test_pooled_session_retries_and_reuses_connections():
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append(self.path)
+            status = 503 if len(hits) == 1 else 200
+            body = b"{}"
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 503:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        session = http_session.PooledSession("local", backoff_base=0.01)
+        url = f"http://127.0.0.1:{server.server_port}/x"
+        for _ in range(3):
+            assert session.get(url).status_code == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    stats = session.stats()
+    assert len(hits) == 4
+    assert stats["retries"] == 1
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 3
+
+
+def test_call_caches_and_revalidates_responses(monkeypatch, tmp_path):
+    hits = []
+    body = json.dumps({"project-details": {"title": "x" * 2000}}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(config, "SIMAP_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(config, "SIMAP_CACHE_PATH", str(tmp_path / "http.db"))
+    monkeypatch.setattr(simap_client, "limiter", throttle.AdaptiveRateLimiter(1000))
+    monkeypatch.setattr(simap_client, "_cache", None)
+    try:
+        expected = json.loads(body)
+        monkeypatch.setattr(config, "SIMAP_CACHE_DETAIL_TTL_HOURS", 1e-6)
+        assert simap_client.call("/detail/1") == expected
+        time.sleep(0.01)
+
+        # the expired entry is revalidated, reused on 304 and fresh again
+        monkeypatch.setattr(config, "SIMAP_CACHE_DETAIL_TTL_HOURS", 1.0)
+        assert simap_client.call("/detail/1") == expected
+        assert simap_client.call("/detail/1") == expected
+        assert hits == [None, '"v1"']
+        stats = simap_client.get_http_cache().stats()
+        assert stats["hits"] == 1 and stats["revalidated"] == 1
+        assert stats["bytes"] < len(body) / 10
+    finally:
+        server.shutdown()
+        server.server_close()
+        simap_client.reset()
+        http_session.close_all()
+
+
+def test_http_cache_evicts_least_recently_used(tmp_path):
+    cache = http_cache.HttpCache(str(tmp_path / "http.db"), max_bytes=2500)
+    payloads = {name: os.urandom(1000) for name in "abc"}
+    cache.set("a", "/a", payloads["a"], ttl=60)
+    cache.set("b", "/b", payloads["b"], ttl=60)
+    time.sleep(0.01)
+    assert cache.get("a").body == payloads["a"]
+    cache.set("c", "/c", payloads["c"], ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    # expired entries without validators are dropped
+    cache.set("d", "/d", b"{}", ttl=-1)
+    assert cache.get("d") is None
+    cache.close()
+
+
+def test_parse_retry_after():
+    assert throttle.parse_retry_after("3") == 3.0
+    assert throttle.parse_retry_after(None) is None
+    assert throttle.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert throttle.parse_retry_after("soon") is None
+
+
+def test_main_skips_processed_publications(monkeypatch, tmp_path):
+    summaries = [
+        {"pubType": "tender", "id": "P1", "publicationId": "A"},
+        {"pubType": "tender", "id": "P2", "publicationId": "B"},
+    ]
+    details = {
+        "A": {"projectId": "P1", "id": "A", "projectNumber": "1"},
+        "B": {"projectId": "P2", "id": "B", "projectNumber": "2"},
+    }
+    fetched, enriched, posted = [], [], []
+
+    def fake_detail(summary):
+        fetched.append(summary["publicationId"])
+        return details[summary["publicationId"]]
+
+    def fake_enrich(detail, profile):
+        enriched.append(detail["id"])
+        return {"apply_score": 8 if detail["id"] == "B" else 3}
+
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(main, "iter_project_summaries", lambda cpv=None, **kwargs: iter(summaries))
+    monkeypatch.setattr(main, "fetch_project_detail", fake_detail)
+    monkeypatch.setattr(main, "enrich", fake_enrich)
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: posted.append(blocks))
+
+    main.main()
+    main.main()
+
+    assert sorted(fetched) == ["A", "B"]
+    assert sorted(enriched) == ["A", "B"]
+    assert len(posted) == 1
+
+
+TENDER_TEXT = (
+    "Die Stadt Winterthur beschafft eine Plattform zur Automatisierung von Geschäftsprozessen "
+    "mit BPMN, inklusive Integration in bestehende Fachanwendungen, Betrieb in der Schweiz, "
+    "Schulung der Mitarbeitenden sowie Wartung und Weiterentwicklung über vier Jahre."
+)
+
+
+def test_dedupe_matches_corrections_not_other_tenders(tmp_path):
+    original = {"projectId": "P1", "id": "A", "title": {"de": "Prozessplattform", "fr": "Plateforme"},
+                "description": {"de": TENDER_TEXT}, "publicationDate": "2025-03-01"}
+    correction = {**original, "id": "B", "publicationDate": "2025-03-08",
+                  "description": {"de": TENDER_TEXT.replace("vier Jahre", "vier Jahre.")}}
+    other = {"projectId": "P2", "id": "C", "description": {"de": "Reinigung der Büroräume im Verwaltungsgebäude "
+                                                             "an der Bahnhofstrasse inklusive Fenster und Teppiche."}}
+    sig = dedupe.signature(original)
+    assert dedupe.similarity(sig, dedupe.signature(correction)) == 1.0
+    assert dedupe.similarity(sig, dedupe.signature(other)) < 0.2
+    assert dedupe.signature({"description": {"de": "zu kurz"}}) is None
+
+    index = dedupe.DuplicateIndex(str(tmp_path / "dedup.db"), threshold=0.9)
+    index.add(("P1", "A"), sig, {"summary": "s", "apply_score": 8, "project": {"projectId": "P1"}})
+    assert index.match(dedupe.signature(other)) is None
+    assert index.match(sig, exclude=("P1", "A")) is None
+    match = index.match(dedupe.signature(correction))
+    assert match.key == ("P1", "A") and match.similarity == 1.0
+    index.close()
+
+
+def test_patch_enrichment_takes_criteria_and_flags_from_correction():
+    original = {
+        "apply_score": 8,
+        "summary": "BPMN-Plattform",
+        "qualificationCriteria": [{"title": {"de": "Referenzen"}}],
+        "qualificationCriteriaSummary": "Zwei Referenzen",
+        "awardCriteria": [{"title": {"de": "Preis"}}],
+        "awardCriteriaSummary": "Nur Preis",
+        "awardCriteriaAsPDF": True,
+    }
+    detail = {
+        "projectId": "P1",
+        "id": "B",
+        "criteria": {
+            "qualificationCriteria": [{"title": {"de": "Referenzen"}}],
+            "awardCriteria": [{"title": {"de": "Preis 40%"}}, {"title": {"de": "Qualität 60%"}}],
+        },
+    }
+    data = dedupe.patch_enrichment(original, detail, ("P1", "A"), 0.93)
+    assert data["summary"] == "BPMN-Plattform"
+    assert data["qualificationCriteriaSummary"] == "Zwei Referenzen"
+    assert data["awardCriteria"] == [{"title": {"de": "Preis 40%"}}, {"title": {"de": "Qualität 60%"}}]
+    assert data["awardCriteriaSummary"] != "Nur Preis"
+    assert "awardCriteriaAsPDF" not in data
+
+    data = dedupe.patch_enrichment(original, {"projectId": "P1", "id": "C"}, ("P1", "A"), 0.91)
+    assert not any(key.startswith(("qualificationCriteria", "awardCriteria")) for key in data)
+
+
+def test_main_reuses_enrichment_of_near_duplicates(monkeypatch, tmp_path):
+    runs = [
+        [{"pubType": "tender", "id": "P1", "publicationId": "A"}],
+        [{"pubType": "tender", "id": "P1", "publicationId": "B"}],
+    ]
+    details = {
+        "A": {"projectId": "P1", "id": "A", "projectNumber": "1", "description": {"de": TENDER_TEXT}},
+        "B": {"projectId": "P1", "id": "B", "projectNumber": "1", "description": {"de": TENDER_TEXT + " Korrigiert."}},
+    }
+    enriched, posted = [], []
+
+    def fake_enrich(detail, profile):
+        enriched.append(detail["id"])
+        return {"apply_score": 8, "summary": "BPMN-Plattform", "project": {"projectId": detail["projectId"]}}
+
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(main.config, "DEDUP_PATH", str(tmp_path / "dedup.db"))
+    monkeypatch.setattr(main.config, "DEDUP_THRESHOLD", 0.8)
+    monkeypatch.setattr(main, "fetch_project_detail", lambda summary: details[summary["publicationId"]])
+    monkeypatch.setattr(main, "enrich", fake_enrich)
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: posted.append(blocks))
+
+    for summaries in runs:
+        monkeypatch.setattr(main, "iter_project_summaries", lambda cpv=None, s=summaries, **kwargs: iter(s))
+        main.main()
+
+    assert enriched == ["A"]
+    assert len(posted) == 1
+    st = store.PublicationStore(str(tmp_path / "state.db"))
+    data = st.cached_enrichment(details["B"])
+    st.close()
+    assert data["summary"] == "BPMN-Plattform"
+    assert data["near_duplicate_of"]["publicationId"] == "A"
+    assert data["near_duplicate_of"]["similarity"] >= 0.8
+
+
+TENDER_DOCUMENT = """<html><body><h1>Ausschreibung</h1>
+<p>1 Inhalt</p><p>1.1 Eignungskriterien 3</p><p>1.2 Zuschlagskriterien 4</p>
+<h2>2 Eignungskriterien</h2><p>EK1: Zwei Referenzen vergleichbarer BPMN-Projekte der letzten f&uuml;nf Jahre.</p>
+<h2>3 Zuschlagskriterien</h2><p>ZK1 Preis 40%</p><p>ZK2 Qualit&auml;t 60%</p>
+<h2>4 Rechtsmittel</h2><p>Gegen diese Ausschreibung kann Beschwerde erhoben werden.</p>
+<script>var heading = "Eignungskriterien";</script>
+</body></html>"""
+
+DOCUMENT_DETAIL = {
+    "projectId": "P1",
+    "id": "A",
+    "projectNumber": "1",
+    "criteria": {
+        "qualificationCriteriaSelection": "criteria_in_documents",
+        "awardCriteriaSelection": "criteria_as_pdf",
+    },
+}
+
+
+def _document_folder(tmp_path):
+    folder = tmp_path / "docs" / "P1"
+    folder.mkdir(parents=True)
+    (folder / "ausschreibung.html").write_text(TENDER_DOCUMENT, encoding="utf-8")
+    (folder / "plaene.txt").write_text("Eignungskriterien\n" + "x" * 5000, encoding="utf-8")
+    return tmp_path / "docs"
+
+
+def test_documents_read_criteria_sections_with_cache_and_size_cap(tmp_path):
+    cache = documents.DocumentCache(str(tmp_path / "documents.db"))
+    ingestor = documents.DocumentIngestor(
+        documents.LocalDocumentSource(str(_document_folder(tmp_path))), cache, max_bytes=4000
+    )
+
+    record = ingestor.ingest(DOCUMENT_DETAIL)
+    criteria = enricher.collect_criteria(record)
+    qualification = criteria["qualificationCriteria"][0]["description"]["de"]
+    award = criteria["awardCriteria"][0]["description"]["de"]
+    assert criteria["qualificationCriteria"][0]["title"] == {"de": "ausschreibung.html"}
+    assert "Zwei Referenzen" in qualification and "fünf" in qualification and "Preis" not in qualification
+    assert "Preis 40%" in award and "Qualität 60%" in award and "Beschwerde" not in award
+    assert len(criteria["qualificationCriteria"]) == 1  # plaene.txt exceeds max_bytes
+    # Document criteria are not stored with the detail
+    assert record.to_dict() == records.PublicationDetail.from_dict(DOCUMENT_DETAIL).to_dict()
+
+    ingestor.ingest(DOCUMENT_DETAIL)
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+    with_criteria = dict(DOCUMENT_DETAIL, qualificationCriteria=[{"title": {"de": "Referenzen"}}])
+    assert "qualificationCriteria" not in ingestor.ingest(with_criteria).documents
+    cache.close()
+
+
+def test_main_attaches_document_criteria_before_enrich(monkeypatch, tmp_path):
+    seen = []
+
+    def fake_enrich(detail, profile):
+        seen.append(enricher.build_enrich_request(detail, profile)["messages"][1]["content"])
+        return {"apply_score": 8, "summary": "BPMN-Plattform", "project": {"projectId": "P1"}}
+
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(main.config, "DOCUMENTS_INGEST", True)
+    monkeypatch.setattr(main.config, "DOCUMENTS_DIR", str(_document_folder(tmp_path)))
+    monkeypatch.setattr(
+        main, "iter_project_summaries",
+        lambda cpv=None, **kwargs: iter([{"pubType": "tender", "id": "P1", "publicationId": "A"}]),
+    )
+    monkeypatch.setattr(main, "fetch_project_detail", lambda summary: DOCUMENT_DETAIL)
+    monkeypatch.setattr(main, "enrich", fake_enrich)
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: None)
+
+    main.main()
+
+    assert len(seen) == 1 and "Zwei Referenzen" in seen[0] and "Preis 40%" in seen[0]
+    st = store.PublicationStore(str(tmp_path / "state.db"))
+    assert st.cached_enrichment(DOCUMENT_DETAIL)["summary"] == "BPMN-Plattform"
+    st.close()
+
+
+def _write_tenants(tmp_path, entries):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps(entries), encoding="utf-8")
+    return str(path)
+
+
+def test_load_tenants_defaults_and_cpv_matching(monkeypatch, tmp_path):
+    (tmp_path / "data.json").write_text(json.dumps({"expertise": ["Data Engineering"]}), encoding="utf-8")
+    monkeypatch.setenv("SLACK_WEBHOOK_DATA", "http://hooks/data")
+    path = _write_tenants(tmp_path, [
+        {"name": "data", "profile_file": "data.json", "cpv_codes": ["72000000"], "slack_webhook_env": "SLACK_WEBHOOK_DATA"},
+        {"name": "sign", "profile": {"expertise": ["Signatur"]}, "apply_score_threshold": 5,
+         "slack_webhook_url": "http://hooks/sign"},
+    ])
+
+    data, sign = tenants.load_tenants(path)
+    assert data.profile == {"expertise": ["Data Engineering"]} and data.webhook_url == "http://hooks/data"
+    assert data.threshold == config.APPLY_SCORE_THRESHOLD and sign.threshold == 5
+    assert sign.cpv_codes == config.CPV_CODES
+    assert tenants.cpv_union([data, sign]) == ["72000000", "48000000"]
+    assert tenants.merge_profiles([data.profile, sign.profile])["expertise"] == ["Data Engineering", "Signatur"]
+
+    software = {"procurement": {"cpvCode": {"code": "48200000"}, "additionalCpvCodes": [{"code": "72212000"}]}}
+    assert data.matches(software) and sign.matches(software)
+    assert not data.matches({"procurement": {"cpvCode": {"code": "48200000"}}})
+    assert data.matches({"id": "no-cpv"})
+
+    with pytest.raises(ValueError):
+        tenants.load_tenants(_write_tenants(tmp_path, [{"name": "x"}]))
+
+
+def test_main_fans_out_one_enrichment_per_tender_to_tenants(monkeypatch, tmp_path):
+    path = _write_tenants(tmp_path, [
+        {"name": "data", "profile": {"expertise": ["Data"]}, "apply_score_threshold": 7,
+         "cpv_codes": ["72000000"], "slack_webhook_url": "http://hooks/data"},
+        {"name": "sign", "profile": {"expertise": ["Signatur"]}, "apply_score_threshold": 5,
+         "cpv_codes": ["48000000", "72000000"], "slack_webhook_url": "http://hooks/sign"},
+    ])
+    details = {
+        "A": {"projectId": "P1", "id": "A", "projectNumber": "1", "procurement": {"cpvCode": {"code": "72212000"}}},
+        "B": {"projectId": "P2", "id": "B", "projectNumber": "2", "procurement": {"cpvCode": {"code": "48100000"}}},
+    }
+    scores = {("A", "data"): 8, ("A", "sign"): 6, ("B", "sign"): 4}
+    searched, requests_sent, posted = [], [], []
+
+    def fake_create(**kwargs):
+        requests_sent.append(kwargs)
+        project = "A" if '"projectId": "P1"' in kwargs["messages"][1]["content"] else "B"
+        score_props = kwargs["functions"][0]["parameters"]["properties"]["scores"]["items"]["properties"]
+        assert score_props["team"]["enum"] == list(enricher.TEAMS)
+        names = score_props["profile"]["enum"]
+        return _function_response({
+            "summary": f"Projekt {project}",
+            "scores": [{"profile": n, "team": "Engineering", "apply_score": scores[(project, n)]} for n in names],
+        })
+
+    def fake_search(cpv=None, **kwargs):
+        searched.append(cpv)
+        return iter([{"pubType": "tender", "id": d["projectId"], "publicationId": d["id"]} for d in details.values()])
+
+    monkeypatch.setattr(main.config, "TENANTS_FILE", path)
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(main.config, "PAYLOAD_COMPACT", False)
+    monkeypatch.setattr(main, "iter_project_summaries", fake_search)
+    monkeypatch.setattr(main, "fetch_project_detail", lambda summary: details[summary["publicationId"]])
+    monkeypatch.setattr(enricher.openai_client.chat.completions, "create", fake_create)
+    monkeypatch.setattr(tenants, "format_slack_blocks", lambda data: [{"type": "section", "text": data["summary"]}])
+    monkeypatch.setattr(tenants, "post_blocks", lambda blocks, url: posted.append((url, blocks[0]["text"])))
+
+    main.main()
+    main.main()
+
+    assert searched == [["72000000", "48000000"]] * 2
+    assert len(requests_sent) == 2  # one request per tender, not per tenant
+    assert sorted(posted) == [("http://hooks/data", "Projekt A"), ("http://hooks/sign", "Projekt A")]
+    st = store.PublicationStore(str(tmp_path / "state.db"))
+    assert st.tenant_post_status("sign", details["B"]) == store.STATUS_SKIPPED
+    assert st.post_status(details["A"]) == store.STATUS_POSTED
+    assert st.post_status(details["B"]) == store.STATUS_SKIPPED
+    st.close()
+
+    # A tenant added later gets the tenders the others already received
+    entries = json.loads(open(path, encoding="utf-8").read())
+    entries.append({"name": "infra", "profile": {"expertise": ["Betrieb"]}, "apply_score_threshold": 5,
+                    "cpv_codes": ["72000000"], "slack_webhook_url": "http://hooks/infra"})
+    _write_tenants(tmp_path, entries)
+    scores[("A", "infra")] = 7
+    main.main()
+    main.main()
+
+    assert len(requests_sent) == 3  # only the new tenant is scored, B is outside its CPV codes
+    assert sorted(posted) == [
+        ("http://hooks/data", "Projekt A"), ("http://hooks/infra", "Projekt A"), ("http://hooks/sign", "Projekt A"),
+    ]
+
+
+def test_store_reuses_enrichment_until_detail_changes(tmp_path):
+    st = store.PublicationStore(str(tmp_path / "state.db"))
+    detail = {"projectId": "P1", "id": "A", "title": "x"}
+    st.record_enrichment(detail, {"apply_score": 9})
+    st.set_post_status(detail, store.STATUS_FAILED)
+
+    assert st.cached_enrichment(detail) == {"apply_score": 9}
+    assert not st.is_done({"id": "P1", "publicationId": "A"})
+    assert st.cached_enrichment(dict(detail, title="y")) is None
+
+    st.set_post_status(detail, store.STATUS_POSTED)
+    assert st.is_done({"id": "P1", "publicationId": "A"})
+    st.record_enrichment(dict(detail, title="y"), {"apply_score": 4})
+    assert st.post_status(detail) == store.STATUS_PENDING
+    st.close()
+
+
+def test_summarize_criteria_uses_response_cache(monkeypatch, tmp_path):
+    cache = llm_cache.ResponseCache(str(tmp_path / "cache.db"), max_entries=1)
+    monkeypatch.setattr(enricher.config, "LLM_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(enricher, "_cache", cache)
+    calls = []
+
+    def fake_create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=" kurz "))]
+        )
+
+    monkeypatch.setattr(enricher.openai_client.chat.completions, "create", fake_create)
+
+    crit = [{"title": {"de": "Referenzen"}}]
+    assert enricher.summarize_criteria(crit, "Eignungskriterien") == "kurz"
+    assert enricher.summarize_criteria(crit, "Eignungskriterien") == "kurz"
+    assert len(calls) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    # a different request misses and evicts the older entry
+    enricher.summarize_criteria(crit, "Zuschlagskriterien")
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_response_cache_expires_entries(tmp_path):
+    cache = llm_cache.ResponseCache(str(tmp_path / "cache.db"), ttl=-1)
+    cache.set("k", "v")
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_enrich_batch_concurrent_keeps_order(monkeypatch):
+    details = [{"id": str(i)} for i in range(8)]
+
+    def fake_enrich(detail, profile):
+        time.sleep(0.01 * (8 - int(detail["id"])))
+        return {"id": detail["id"]}
+
+    monkeypatch.setattr(enricher, "enrich", fake_enrich)
+    result = enricher.enrich_batch(details, {}, concurrency=4)
+    assert [r["id"] for r in result] == [d["id"] for d in details]
+
+
+def test_create_waits_out_rate_limit(monkeypatch):
+    monkeypatch.setattr(enricher, "_budget", throttle.RequestBudget(rpm=100, tpm=10**6))
+    rate_limited = enricher.RateLimitError.__new__(enricher.RateLimitError)
+    rate_limited.response = SimpleNamespace(headers={"retry-after-ms": "10"})
+    outcomes = [rate_limited, "ok"]
+
+    def fake_create(**kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(enricher.openai_client.chat.completions, "create", fake_create)
+    assert enricher._create({"messages": []}) == "ok"
+    assert not outcomes
+
+
+def test_request_budget_limits_requests_per_minute(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(throttle.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(throttle.time, "sleep", lambda s: clock.__setitem__(0, clock[0] + s))
+
+    budget = throttle.RequestBudget(rpm=2, tpm=100)
+    assert budget.acquire(10) == 0
+    assert budget.acquire(10) == 0
+    assert budget.acquire(10) == 60.0
+    # the token budget applies as well
+    assert budget.acquire(91) == 60.0
+
+
+PROFILE = {
+    "domains": ["Engineering (Workflow-Automation, RPA)"],
+    "expertise": ["Process automatisation", "Data Engineering"],
+    "technologies": ["Camunda BPM", "Apache Kafka"],
+}
+
+
+def test_prefilter_ranks_relevant_tenders_higher():
+    relevant = {
+        "title": {"de": "Einführung Camunda Workflow Automatisierung", "fr": "Camunda"},
+        "cpvCode": {"code": "72000000", "label": {"de": "IT-Dienste"}},
+    }
+    unrelated = {
+        "title": {"de": "Reinigung der Schulhäuser", "fr": "Nettoyage"},
+        "cpvCode": {"code": "90910000", "label": {"de": "Reinigungsdienste"}},
+    }
+    high, low = prefilter.score_details([relevant, unrelated], PROFILE)
+    assert high > low
+    assert low == 0
+
+    assert prefilter.shadow_recall([high, low], [9, 8], threshold=7, cutoff=0.01) == 0.5
+
+
+def test_prefilter_stream_keeps_document_frequencies_across_details():
+    details = [
+        {"title": {"de": "Camunda Workflow Plattform Ausschreibung"}},
+        {"title": {"de": "Reinigung Schulhäuser Ausschreibung"}},
+        {"title": {"de": "Kafka Data Engineering Ausschreibung"}},
+    ]
+    scorer = prefilter.StreamScorer(PROFILE)
+    streamed = [scorer.score(d) for d in details]
+    batch = prefilter.score_details(details, PROFILE)
+    # The last detail is weighted against the whole stream, like in a batch
+    assert streamed[-1] == pytest.approx(batch[-1])
+    assert streamed[1] == 0 and streamed[0] > 0
+
+
+def test_prefilter_stream_scores_do_not_depend_on_arrival_with_corpus():
+    # Stored details of earlier runs
+    corpus = [
+        {"title": {"de": f"{topic} Ausschreibung Los {i}"}}
+        for i in range(8)
+        for topic in ("Reinigung Schulhäuser", "Strassenbau Belag", "Kafka Data Engineering",
+                      "Camunda Workflow Plattform", "Druckerei Broschüren", "Java Entwicklung Fachanwendung")
+    ]
+    others = [{"title": {"de": "Schneeräumung Gemeindestrassen"}}, {"title": {"de": "Cloud Betrieb Rechenzentrum"}}]
+    target = {"title": {"de": "Java Applikation, Cloud Betrieb und Integration"}}
+    profile = {"expertise": ["Integration", "Data Engineering"], "technologies": ["Java", "Camunda", "Kafka"]}
+
+    def first_and_last(seed, warmup=0):
+        first = prefilter.StreamScorer(profile, seed, warmup=warmup)
+        early = first.score(target)
+        ready = first.ready()
+        last = prefilter.StreamScorer(profile, seed, warmup=warmup)
+        for detail in others:
+            last.score(detail)
+        return early, last.score(target), ready
+
+    early, late, ready = first_and_last(corpus, warmup=5)
+    assert ready
+    assert early == pytest.approx(late, rel=0.1)
+    assert late == pytest.approx(prefilter.score_details(corpus + others + [target], profile)[-1])
+    # Without stored details the first score is skewed, so the cutoff waits
+    early, late, ready = first_and_last([], warmup=5)
+    assert not ready
+    assert early < 0.7 * late
+
+
+def test_main_prefilter_skips_llm_for_irrelevant(monkeypatch):
+    details = {
+        "1": {"projectNumber": "1", "title": {"de": "Camunda Workflow Plattform"}},
+        "2": {"projectNumber": "2", "title": {"de": "Schneeräumung Gemeindestrassen"}},
+    }
+    enriched = []
+
+    def fake_enrich(detail, profile):
+        enriched.append(detail["projectNumber"])
+        return {"apply_score": 8}
+
+    monkeypatch.setattr(main.config, "PREFILTER_MODE", "on")
+    monkeypatch.setattr(main.config, "PREFILTER_WARMUP", 0)
+    monkeypatch.setattr(config, "COMPANY_PROFILE", PROFILE)
+    monkeypatch.setattr(
+        main, "iter_project_summaries", lambda cpv=None, **kwargs: iter([{"id": "1"}, {"id": "2"}])
+    )
+    monkeypatch.setattr(main, "fetch_project_detail", lambda s: details[s["id"]])
+    monkeypatch.setattr(main, "enrich", fake_enrich)
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: None)
+
+    main.main()
+    assert enriched == ["1"]
+
+
+def test_main_streams_first_post_before_search_finishes(monkeypatch):
+    second_page = threading.Event()
+    posted = []
+
+    def summaries(cpv=None, **kwargs):
+        yield {"id": "1"}
+        # the next page is only requested after the first tender was posted
+        assert second_page.wait(5)
+        yield {"id": "2"}
+
+    def fake_post(blocks):
+        posted.append(blocks)
+        second_page.set()
+
+    monkeypatch.setattr(main, "iter_project_summaries", summaries)
+    monkeypatch.setattr(main, "fetch_project_detail", lambda s: {"projectNumber": s["id"]})
+    monkeypatch.setattr(main, "enrich", lambda detail, profile: {"apply_score": 9})
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [data])
+    monkeypatch.setattr(main, "post_blocks", fake_post)
+
+    main.main()
+    assert len(posted) == 2
+
+
+def test_run_stage_applies_backpressure():
+    produced = []
+
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    results = pipeline.run_stage(source(), lambda x: x * 2 if x % 10 else None, workers=3, queue_size=2)
+    first = next(results)
+    time.sleep(0.05)
+    # bounded queues stop the feeder long before the source is exhausted
+    assert len(produced) < 20
+    rest = list(results)
+    assert sorted([first] + rest) == [x * 2 for x in range(100) if x % 10]
+
+
+def test_compact_payload_keeps_only_german_values():
+    detail = {
+        "id": "1",
+        "title": {"de": "Titel", "fr": "Titre", "it": "Titolo", "en": "Title"},
+        "note": {"de": None, "fr": "Seulement français"},
+        "lots": [{"description": {"de": "Los 1", "en": "Lot 1"}, "remarks": None}],
+        "_links": {"self": "https://simap.ch/x"},
+        "empty": [],
+    }
+    compacted = payload.compact(detail, drop_keys=["_links"])
+    assert compacted == {
+        "id": "1",
+        "title": "Titel",
+        "note": "Seulement français",
+        "lots": [{"description": "Los 1"}],
+    }
+    text = payload.compact_json(detail, ["_links"], label="project 1")
+    assert " " not in text.replace("Seulement français", "").replace("Los 1", "")
+    assert payload.count_tokens(text) < payload.count_tokens(json.dumps(detail, indent=2))
+
+
+def _function_response(payload):
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(
+                message=SimpleNamespace(
+                    function_call=SimpleNamespace(arguments=json.dumps(payload)),
+                    content=None,
+                )
+            )
+        ]
+    )
+
+
+def test_publication_detail_keeps_german_fields_and_collects_criteria():
+    detail = {
+        "id": "A",
+        "projectId": "P1",
+        "title": {"de": "Portal", "fr": "Portail", "it": "Portale", "en": "Portal"},
+        "description": {"fr": "Seulement en français"},
+        "updatedAt": "2025-01-01",
+        "criteria": {
+            "qualificationCriteria": [{"title": {"de": "Referenzen", "fr": "Références"}}],
+            "awardCriteriaSelection": "criteria_as_pdf",
+        },
+        "lots": [{"lotNumber": 1, "criteria": {"awardCriteria": [{"title": {"de": "Preis"}, "weighting": 40}]}}],
+    }
+    rec = records.PublicationDetail.from_dict(detail)
+
+    assert rec["title"] == {"de": "Portal"}
+    assert rec.get("description") == {"de": "Seulement en français"}
+    assert "updatedAt" not in rec and rec.get("projectNumber", "-") == "-"
+    assert rec.criteria["qualificationCriteria"] == [{"title": {"de": "Referenzen"}}]
+    assert rec.criteria["awardCriteria"] == [{"title": {"de": "Preis"}, "weighting": 40}]
+    assert rec.flags["awardCriteria"] == (None, True, None)
+    assert rec.fields["lots"] == [{"lotNumber": 1}]
+    assert enricher.collect_criteria(detail) == rec.criteria
+    # the stored form builds the same record again
+    assert records.PublicationDetail.from_dict(rec.to_dict()) == rec
+    assert store.detail_hash(rec) == store.detail_hash(rec.to_dict())
+
+    summary = records.ProjectSummary.from_dict(
+        {"id": "P1", "publicationId": "A", "pubType": "tender", "title": {"de": "Portal", "fr": "Portail"}, "orderAddress": {}}
+    )
+    assert summary["publicationId"] == "A" and store.summary_key(summary) == ("P1", "A")
+    assert summary.to_dict() == {"id": "P1", "publicationId": "A", "pubType": "tender", "title": {"de": "Portal"}}
+
+
+def test_enrichment_record_normalizes_flags():
+    data = {"apply_score": 8, "team": "Products", "qualificationCriteriaInDocuments": "yes",
+            "awardCriteriaAsPDF": True, "awardCriteriaSummary": "Preis", "near_duplicate_of": {"projectId": "P0"}}
+    rec = records.Enrichment.from_dict(data)
+    assert rec.in_documents == {"qualificationCriteria": True}
+    assert rec.as_pdf == {"awardCriteria": True}
+    assert rec.to_dict()["near_duplicate_of"] == {"projectId": "P0"}
+    text = slack_client.format_slack_blocks(rec)[1]["text"]["text"]
+    assert "Kriterien sind in den Dokumenten hinterlegt" in text
+    assert "*Zuschlagskriterien:*\nPreis" in text
+    assert slack_client.format_slack_blocks(data) == slack_client.format_slack_blocks(rec)
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        (
+            "detail_tender_lots.json",
+            {
+                "projectId": "9e2b7c40-1f3a-4d6e-8b25-7a0c4e19d8f6",
+                "projectNumber": "283417",
+                "title_de": "Erneuerung der Geschäftsprozessplattform",
+                "customer": "Kanton Zürich, Amt für Informatik",
+                "location": "Zürich",
+                "publicationDate": "2025-03-03",
+                "offerDeadline": "2025-04-14T12:00:00+02:00",
+                "contract_start": "2025-07-01",
+                "qna_deadline": "2025-03-24T23:59:00+01:00",
+                "cpvCode": {
+                    "code": "72000000",
+                    "label_de": "IT-Dienste: Beratung, Software-Entwicklung, Internet und Hilfestellung",
+                },
+            },
+        ),
+        (
+            "detail_advance_notice.json",
+            {
+                "projectId": "1b8f6a3d-2e47-4c90-b1d5-93e6a7f2c048",
+                "projectNumber": "284102",
+                "title_de": "Système de gestion des dossiers",
+                "customer": "Etat de Vaud, Direction générale du numérique",
+                "location": None,
+                "publicationDate": "2025-03-05",
+                "offerDeadline": "2025-05-30T16:00:00+02:00",
+                "contract_start": None,
+                "qna_deadline": None,
+                "cpvCode": {"code": "48000000", "label_de": "Softwarepaket und Informationssysteme"},
+            },
+        ),
+        (
+            "detail_minimal.json",
+            {
+                "projectId": "e3c92a17-64b0-4f5d-8a1e-2b7f9d06c835",
+                "projectNumber": "284377",
+                "title_de": "Wartung Fachapplikation Steuern",
+                "customer": "Stadt Bern, Steuerverwaltung",
+                "location": None,
+                "publicationDate": "2025-03-07",
+                "offerDeadline": None,
+                "contract_start": None,
+                "qna_deadline": "2025-03-21",
+                "cpvCode": {"code": "72267000", "label_de": None},
+            },
+        ),
+    ],
+)
+def test_extract_project_from_fixtures(name, expected):
+    detail = _fixture(name)
+    assert extract.extract_project(detail) == expected
+    assert extract.extract_project(records.PublicationDetail.from_dict(detail)) == expected
+
+
+def test_prompt_payload_saving_is_measured_against_raw_detail(caplog):
+    detail = _fixture("detail_tender_lots.json")
+    with caplog.at_level("INFO", logger="simap_agent.payload"):
+        enricher.build_enrich_request(detail, {})
+    raw = payload.count_tokens(json.dumps(detail, ensure_ascii=False, indent=2))
+    assert f"Prompt payload for project {detail.get('id')}: {raw} -> " in caplog.text
+
+
+def test_slack_post_shows_placeholder_for_fields_not_in_detail(caplog):
+    with caplog.at_level("WARNING", logger="simap_agent.enricher"):
+        data = enricher.finalize({"id": "A", "projectId": "P1"}, {"team": "Engineering", "apply_score": 8}, {})
+    assert "projectNumber, title_de, customer not found" in caplog.text
+    text = next(b for b in slack_client.format_slack_blocks(data) if b.get("type") == "section")["text"]["text"]
+    assert "None" not in text
+    assert "*#—*" in text and "*Projekt:* — / —" in text
+
+
+def test_enrich_merges_extracted_fields_with_judgement(monkeypatch):
+    detail = _fixture("detail_tender_lots.json")
+    requests_sent = []
+
+    def fake_create(**kwargs):
+        requests_sent.append(kwargs)
+        return _function_response(
+            {"summary": "BPMN-Plattform", "team": "Engineering", "apply_score": 9,
+             "qualificationCriteriaSummary": "Zwei Referenzen", "awardCriteriaSummary": "Preis 40%, Qualität 60%"}
+        )
+
+    monkeypatch.setattr(enricher.config, "ENRICH_SINGLE_CALL", True)
+    monkeypatch.setattr(enricher.openai_client.chat.completions, "create", fake_create)
+
+    result = enricher.enrich(detail, {})
+    properties = requests_sent[0]["functions"][0]["parameters"]["properties"]
+    assert "project" not in properties and "missing_info" not in properties
+    assert result["project"] == extract.extract_project(detail)
+    assert result["apply_score"] == 9 and result["team"] == "Engineering"
+    assert result["missing_info"] == []
+
+
+def test_enrich_single_call_returns_criteria_summaries(monkeypatch):
+    detail = {
+        "id": "1",
+        "criteria": {"qualificationCriteria": [{"title": {"de": "Referenzen"}}]},
+        "lots": [{"criteria": {"awardCriteria": [{"title": {"de": "Preis"}, "weighting": 40}]}}],
+    }
+    requests_sent = []
+
+    def fake_create(**kwargs):
+        requests_sent.append(kwargs)
+        return _function_response(
+            {
+                "summary": "s",
+                "project": {"projectId": "1", "qna_deadline": "2024-01-01"},
+                "team": "Engineering",
+                "apply_score": 8,
+                "qualificationCriteriaSummary": "Zwei Referenzen",
+                "awardCriteriaSummary": "Preis 40%",
+            }
+        )
+
+    monkeypatch.setattr(enricher.config, "ENRICH_SINGLE_CALL", True)
+    monkeypatch.setattr(enricher.openai_client.chat.completions, "create", fake_create)
+
+    result = enricher.enrich(detail, {})
+    assert len(requests_sent) == 1
+    user_prompt = requests_sent[0]["messages"][1]["content"]
+    assert "QUALIFICATION_CRITERIA =" in user_prompt
+    assert "AWARD_CRITERIA =" in user_prompt
+    assert result["qualificationCriteriaSummary"] == "Zwei Referenzen"
+    assert result["awardCriteriaSummary"] == "Preis 40%"
+    assert result["awardCriteria"] == [{"title": {"de": "Preis"}, "weighting": 40}]
+    assert result["missing_info"] == []
+
+
+def test_enrich_single_call_falls_back_to_separate_summary(monkeypatch):
+    detail = {"id": "1", "qualificationCriteria": [{"title": {"de": "Referenzen"}}]}
+    summarized = []
+
+    monkeypatch.setattr(enricher.config, "ENRICH_SINGLE_CALL", True)
+    monkeypatch.setattr(
+        enricher.openai_client.chat.completions,
+        "create",
+        lambda **kwargs: _function_response({"summary": "s", "team": "Products", "apply_score": 3}),
+    )
+    monkeypatch.setattr(
+        enricher, "summarize_criteria", lambda crit, name: summarized.append(name) or "separat"
+    )
+
+    result = enricher.enrich(detail, {})
+    assert summarized == ["Eignungskriterien"]
+    assert result["qualificationCriteriaSummary"] == "separat"
+    assert "awardCriteriaSummary" not in result
+
+
+def test_enrich_cascade_escalates_only_near_threshold(monkeypatch):
+    detail = _fixture("detail_tender_lots.json")
+    models = []
+    triage_scores = iter([2, 6])
+
+    def fake_create(**kwargs):
+        models.append(kwargs["model"])
+        if kwargs["model"] == "mini":
+            return _function_response({"team": "Products", "apply_score": next(triage_scores)})
+        return _function_response(
+            {"summary": "BPMN-Plattform", "team": "Engineering", "apply_score": 8,
+             "qualificationCriteriaSummary": "Zwei Referenzen", "awardCriteriaSummary": "Preis 40%"}
+        )
+
+    monkeypatch.setattr(enricher.config, "ENRICH_CASCADE", True)
+    monkeypatch.setattr(enricher.config, "OPENAI_TRIAGE_DEPLOYMENT", "mini")
+    monkeypatch.setattr(enricher.config, "OPENAI_DEPLOYMENT", "full")
+    monkeypatch.setattr(enricher.config, "APPLY_SCORE_THRESHOLD", 7)
+    monkeypatch.setattr(enricher.config, "ENRICH_CASCADE_BAND", 2)
+    monkeypatch.setattr(enricher.config, "ENRICH_SINGLE_CALL", True)
+    monkeypatch.setattr(enricher.openai_client.chat.completions, "create", fake_create)
+    metrics.registry.reset()
+
+    settled = enricher.enrich(detail, {})
+    assert models == ["mini"]
+    assert settled["tier"] == "triage" and settled["apply_score"] == 2
+    assert settled["project"] == extract.extract_project(detail)
+
+    escalated = enricher.enrich(detail, {})
+    assert models[1:] == ["mini", "full"]
+    assert escalated["tier"] == "full" and escalated["apply_score"] == 8
+
+    report = metrics.registry.report()
+    assert report["counters"]["enrich.settled"] == 1
+    assert report["counters"]["enrich.escalated"] == 1
+    assert report["timings"]["enrich.tier.triage"]["count"] == 2
+    assert report["timings"]["enrich.tier.full"]["count"] == 1
+    metrics.registry.reset()
+
+
+class StubBatchTransport(batch.BatchTransport):
+    """Answers every batch line locally after one in-progress poll."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.lines = []
+        self.polls = 0
+
+    def submit(self, path):
+        with open(path, encoding="utf-8") as f:
+            self.lines = [json.loads(line) for line in f]
+        return "batch-1"
+
+    def status(self, batch_id):
+        self.polls += 1
+        return "in_progress" if self.polls == 1 else "completed"
+
+    def results(self, batch_id):
+        out = []
+        for line in self.lines:
+            message = self.answer(line)
+            out.append(
+                {
+                    "custom_id": line["custom_id"],
+                    "response": {"status_code": 200, "body": {"choices": [{"message": message}]}},
+                    "error": None,
+                }
+            )
+        return out
+
+
+def test_enrich_batch_offline_maps_results_back(monkeypatch):
+    details = [
+        {"id": "1", "awardCriteria": [{"title": {"de": "Preis"}}]},
+        {"id": "2"},
+    ]
+
+    def answer(line):
+        if line["custom_id"].startswith("enrich-"):
+            idx = line["custom_id"].split("-")[1]
+            args = {"summary": idx, "project": {"projectId": idx}, "team": "Products", "apply_score": 5}
+            return {"function_call": {"name": "enrich_project", "arguments": json.dumps(args)}}
+        return {"content": " Preis zählt "}
+
+    monkeypatch.setattr(batch.config, "ENRICH_SINGLE_CALL", False)
+    transport = StubBatchTransport(answer)
+    result = batch.enrich_batch_offline(details, {}, transport=transport, poll_interval=0)
+
+    assert sorted(line["custom_id"] for line in transport.lines) == [
+        "awardCriteria-0",
+        "enrich-0",
+        "enrich-1",
+    ]
+    assert all(line["url"] == "/chat/completions" for line in transport.lines)
+    assert [r["summary"] for r in result] == ["0", "1"]
+    assert result[0]["awardCriteriaSummary"] == "Preis zählt"
+    assert result[0]["missing_info"] == ["Q&A", "Eignungskriterien"]
+    assert "Zuschlagskriterien" in result[1]["missing_info"]
+
+
+def test_enrich_batch_offline_cancels_on_timeout_and_skips_malformed_lines(monkeypatch):
+    class SlowTransport(StubBatchTransport):
+        cancelled = None
+
+        def status(self, batch_id):
+            return "in_progress"
+
+        def cancel(self, batch_id):
+            self.cancelled = batch_id
+
+    synced = []
+    monkeypatch.setattr(batch.enricher, "enrich", lambda detail, profile: synced.append(detail["id"]) or {"id": detail["id"]})
+    transport = SlowTransport(lambda line: {"content": "{}"})
+    result = batch.enrich_batch_offline([{"id": "1"}, {"id": "2"}], {}, transport=transport, poll_interval=0, timeout=0)
+    assert transport.cancelled == "batch-1"
+    assert synced == ["1", "2"] and [r["id"] for r in result] == ["1", "2"]
+
+    synced.clear()
+    args = json.dumps({"summary": "ok", "team": "Products", "apply_score": 5})
+    transport = StubBatchTransport(
+        lambda line: {"function_call": {"name": "enrich_project", "arguments": "{" if line["custom_id"] == "enrich-0" else args}}
+    )
+    result = batch.enrich_batch_offline([{"id": "1"}, {"id": "2"}], {}, transport=transport, poll_interval=0)
+    assert synced == ["1"]
+    assert result[1]["summary"] == "ok"
+
+
+def test_slack_delivery_packs_projects_and_retries_failures():
+    project_blocks = [
+        {"type": "divider"},
+        {"type": "section", "text": {"type": "mrkdwn", "text": "x"}},
+        {"type": "context", "elements": []},
+        {"type": "divider"},
+    ]
+    sent, outcomes = [], []
+    failures = [True]
+
+    def fake_post(blocks):
+        if failures and len(sent) == 1:
+            failures.pop()
+            raise RuntimeError("429")
+        sent.append(blocks)
+
+    delivery = slack_client.SlackDelivery(post=fake_post, linger=5, max_rounds=2, retry_delay=0)
+    for _ in range(20):
+        delivery.add(project_blocks, on_done=outcomes.append)
+    delivery.close()
+
+    # 16 projects (3 blocks each after merging dividers) fit into one message
+    assert all(len(blocks) <= slack_client.SLACK_MAX_BLOCKS for blocks in sent)
+    assert len(sent) == 2
+    assert sum(b["type"] == "section" for blocks in sent for b in blocks) == 20
+    assert outcomes == [True] * 20
+    assert delivery.stats["retried_messages"] == 1
+
+
+def test_slack_delivery_reports_final_failure():
+    outcomes = []
+
+    def failing_post(blocks):
+        raise RuntimeError("boom")
+
+    delivery = slack_client.SlackDelivery(post=failing_post, linger=0.01, max_rounds=2, retry_delay=0)
+    delivery.add([{"type": "divider"}], on_done=outcomes.append)
+    delivery.close()
+    assert outcomes == [False]
+
+
+def test_slack_delivery_does_not_resend_timed_out_posts():
+    import requests
+
+    calls, outcomes = [], []
+
+    def slow_post(blocks):
+        calls.append(blocks)
+        raise requests.ReadTimeout("read timed out")
+
+    delivery = slack_client.SlackDelivery(post=slow_post, linger=0.01, max_rounds=3, retry_delay=0)
+    delivery.add([{"type": "divider"}], on_done=outcomes.append)
+    delivery.close()
+    assert len(calls) == 1
+    assert outcomes == [True]
+    assert delivery.stats["unconfirmed_projects"] == 1
+
+
+def test_main_writes_run_report(monkeypatch, tmp_path):
+    report_path = tmp_path / "report.json"
+    monkeypatch.setattr(main.config, "RUN_REPORT_PATH", str(report_path))
+    monkeypatch.setattr(
+        main, "iter_project_summaries", lambda cpv=None, **kwargs: iter([{"id": "1"}, {"id": "2"}])
+    )
+    monkeypatch.setattr(main, "fetch_project_detail", lambda s: {"projectNumber": s["id"]})
+
+    def fake_enrich(detail, profile):
+        enricher.metrics.record_usage(SimpleNamespace(prompt_tokens=100, completion_tokens=20))
+        return {"apply_score": 9}
+
+    monkeypatch.setattr(main, "enrich", fake_enrich)
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [{"type": "divider"}])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: None)
+
+    main.main()
+
+    report = json.loads(report_path.read_text())
+    assert report["timings"]["stage.enrich"]["count"] == 2
+    assert report["timings"]["stage.fetch_detail"]["p95_ms"] >= 0
+    assert report["counters"]["openai.prompt_tokens"] == 200
+    assert report["counters"]["openai.completion_tokens"] == 40
+    assert report["pipeline"]["posted"] == 2
+    assert report["slack"]["messages"] == 1
+
+
+def test_data_files_default_off_and_unwritable_paths_do_not_abort(monkeypatch, tmp_path):
+    for name in ("STATE_DB_PATH", "RUN_REPORT_PATH", "LLM_CACHE_PATH"):
+        monkeypatch.delenv(name)
+    config.reset()
+    try:
+        assert config.STATE_DB_PATH == config.RUN_REPORT_PATH == ""
+        monkeypatch.setenv("DATA_DIR", str(tmp_path))
+        config.reset()
+        assert config.STATE_DB_PATH == str(tmp_path / "simap_state.db")
+        assert config.LLM_CACHE_PATH == str(tmp_path / "llm_cache.db")
+    finally:
+        monkeypatch.undo()
+        config.reset()
+
+    # A path below a regular file cannot be created, like a read-only wwwroot
+    blocked = tmp_path / "readonly"
+    blocked.write_text("")
+    for name in ("STATE_DB_PATH", "RUN_REPORT_PATH", "LLM_CACHE_PATH", "INDEX_PATH", "DEDUP_PATH"):
+        monkeypatch.setattr(main.config, name, str(blocked / name.lower()))
+    monkeypatch.setattr(enricher, "_cache", None)
+    monkeypatch.setattr(enricher, "_cache_unavailable", False)
+    monkeypatch.setattr(main, "iter_project_summaries", lambda cpv=None, **kwargs: iter([{"id": "1"}]))
+    monkeypatch.setattr(main, "fetch_project_detail", lambda s: {"projectNumber": s["id"]})
+    monkeypatch.setattr(main, "enrich", lambda detail, profile: {"apply_score": 9})
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [{"type": "divider"}])
+    posted = []
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: posted.append(blocks))
+
+    main.main()
+
+    assert len(posted) == 1
+    assert enricher.get_cache() is None
+
+
+def test_metrics_percentiles_and_http_counters():
+    m = metrics.Metrics()
+    for ms in range(1, 101):
+        m.observe("x", ms / 1000)
+    m.record_http("simap", 200)
+    m.record_http("simap", 429)
+    report = m.report()
+    assert report["timings"]["x"]["p50_ms"] == 50.0
+    assert report["timings"]["x"]["p95_ms"] == 95.0
+    assert report["counters"]["http.simap.requests"] == 2
+    assert report["counters"]["http.simap.status.429"] == 1
+
+
+def test_benchmark_runs_pipeline_against_standins(monkeypatch):
+    from benchmarks import run_benchmarks
+
+    monkeypatch.setattr(simap_client, "limiter", simap_client.limiter)
+    monkeypatch.setattr(slack_client, "limiter", slack_client.limiter)
+    monkeypatch.setattr(enricher, "_client", enricher._client)
+    monkeypatch.setattr(enricher, "_budget", None)
+
+    try:
+        result = run_benchmarks.run_scenario(25)
+    finally:
+        # configure() overrides the settings until the next reset
+        config.reset()
+        http_session.close_all()
+
+    assert result["requests"]["detail"] == 25
+    assert result["requests"]["openai"] == 25
+    assert result["timings"]["stage.enrich"]["count"] == 25
+    assert result["slack_posts"] >= 1
+    assert result["tenders_per_second"] > 0
+
+
+def test_config_reset_drops_overrides_and_shadowing_attributes():
+    config.reset()
+    try:
+        config.override(APPLY_SCORE_THRESHOLD=3)
+        assert config.APPLY_SCORE_THRESHOLD == 3
+        config.PIPELINE_QUEUE_SIZE = 1
+        with pytest.raises(AttributeError):
+            config.override(NO_SUCH_SETTING=1)
+        config.reset()
+        assert config.APPLY_SCORE_THRESHOLD == 7
+        assert config.PIPELINE_QUEUE_SIZE == 32
+        assert config.REQUIRED == ("SLACK_WEBHOOK_URL", "OPENAI_API_KEY")
+    finally:
+        config.reset()
+
+
+def test_import_does_not_load_openai():
+    from benchmarks import import_time
+
+    total_ms, eager, timings = import_time.check()
+    assert eager == []
+    assert "simap_agent.enricher" in timings
+    # generous bound so slow CI machines do not fail; the CLI enforces the real budget
+    assert total_ms < 5 * import_time.DEFAULT_BUDGET_MS
+
+
+def test_main_resumes_interrupted_run_from_checkpoint(monkeypatch, tmp_path):
+    db = str(tmp_path / "state.db")
+    st = store.PublicationStore(db)
+    state = st.begin_run("2024-05-01")
+    summaries = [
+        {"pubType": "tender", "id": "P1", "publicationId": "A"},
+        {"pubType": "tender", "id": "P2", "publicationId": "B"},
+    ]
+    for summary in summaries:
+        st.record_summary(state.run_id, summary)
+    st.record_detail({"projectId": "P1", "id": "A", "projectNumber": "1"})
+    st.finish_search(state.run_id)
+    st.close()
+
+    fetched, enriched, posted, windows = [], [], [], []
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", db)
+
+    def search(cpv=None, published_from=None):
+        # The search finished before the interruption; C was published since
+        windows.append(published_from)
+        return iter(summaries + [{"pubType": "tender", "id": "P3", "publicationId": "C"}])
+
+    monkeypatch.setattr(main, "iter_project_summaries", search)
+
+    def fake_detail(summary):
+        fetched.append(summary["publicationId"])
+        return {"projectId": summary["id"], "id": summary["publicationId"], "projectNumber": "2"}
+
+    def fake_enrich(detail, profile):
+        enriched.append(detail["id"])
+        return {"apply_score": 9}
+
+    monkeypatch.setattr(main, "fetch_project_detail", fake_detail)
+    monkeypatch.setattr(main, "enrich", fake_enrich)
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: posted.append(blocks))
+
+    main.main()
+
+    assert windows == ["2024-05-01"]
+    assert sorted(fetched) == ["B", "C"]
+    assert sorted(enriched) == ["A", "B", "C"]
+    assert len(posted) == 1
+
+    st = store.PublicationStore(db)
+    new_state = st.begin_run("2024-05-02")
+    assert not new_state.resumed
+    assert new_state.published_from == "2024-05-02"
+    st.close()
+
+
+def test_main_marks_unsupported_pub_types_as_skipped(monkeypatch, tmp_path):
+    db = str(tmp_path / "state.db")
+    st = store.PublicationStore(db)
+    state = st.begin_run("2024-05-01")
+    summaries = [
+        {"pubType": "award", "id": "P1", "publicationId": "A"},
+        {"pubType": "tender", "id": "P2", "publicationId": "B"},
+    ]
+    for summary in summaries:
+        st.record_summary(state.run_id, summary)
+    st.close()
+
+    fetched = []
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", db)
+    monkeypatch.setattr(main, "iter_project_summaries", lambda cpv=None, published_from=None: iter(summaries))
+
+    def fake_detail(summary):
+        if summary["pubType"] != "tender":
+            return None
+        fetched.append(summary["publicationId"])
+        return {"projectId": summary["id"], "id": summary["publicationId"], "projectNumber": "2"}
+
+    monkeypatch.setattr(main, "fetch_project_detail", fake_detail)
+    monkeypatch.setattr(main, "enrich", lambda d, p: {"apply_score": 1})
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: None)
+
+    main.main()
+
+    assert fetched == ["B"]
+    st = store.PublicationStore(db)
+    assert list(st.unfinished(state.run_id)) == []
+    assert st.is_done(summaries[0])
+    st.close()
+
+
+def test_main_stops_at_time_budget_and_next_run_continues(monkeypatch, tmp_path):
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(main.config, "RUN_TIME_BUDGET_SECONDS", 0.05)
+    windows = []
+
+    def search(cpv=None, published_from=None):
+        windows.append(published_from)
+        yield {"pubType": "tender", "id": "P1", "publicationId": "A"}
+        time.sleep(0.1)
+        yield {"pubType": "tender", "id": "P2", "publicationId": "B"}
+
+    enriched = []
+    monkeypatch.setattr(main, "iter_project_summaries", search)
+    monkeypatch.setattr(
+        main, "fetch_project_detail",
+        lambda s: {"projectId": s["id"], "id": s["publicationId"], "projectNumber": s["id"]},
+    )
+    monkeypatch.setattr(main, "enrich", lambda d, p: enriched.append(d["id"]) or {"apply_score": 1})
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: None)
+
+    main.main()
+    assert enriched == ["A"]
+
+    monkeypatch.setattr(main.config, "RUN_TIME_BUDGET_SECONDS", 0)
+    main.main()
+    assert enriched == ["A", "B"]
+    assert windows[0] == windows[1]
+
+
+def test_main_keeps_run_open_when_items_fail(monkeypatch, tmp_path):
+    report_path = tmp_path / "report.json"
+    monkeypatch.setattr(main.config, "STATE_DB_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(main.config, "RUN_REPORT_PATH", str(report_path))
+    failing = {"detail": True, "search": True}
+    windows, enriched = [], []
+
+    def search(cpv=None, published_from=None):
+        windows.append(published_from)
+        yield {"pubType": "tender", "id": "P1", "publicationId": "A"}
+        yield {"pubType": "tender", "id": "P2", "publicationId": "B"}
+        if failing["search"]:
+            raise RuntimeError("page 2 failed")
+        yield {"pubType": "tender", "id": "P3", "publicationId": "C"}
+
+    def fake_detail(summary):
+        if summary["publicationId"] == "B" and failing["detail"]:
+            raise RuntimeError("detail failed")
+        return {"projectId": summary["id"], "id": summary["publicationId"], "projectNumber": summary["id"]}
+
+    monkeypatch.setattr(main, "iter_project_summaries", search)
+    monkeypatch.setattr(main, "fetch_project_detail", fake_detail)
+    monkeypatch.setattr(main, "enrich", lambda d, p: enriched.append(d["id"]) or {"apply_score": 1})
+    monkeypatch.setattr(main, "format_slack_blocks", lambda data: [])
+    monkeypatch.setattr(main, "post_blocks", lambda blocks: None)
+
+    main.main()
+    report = json.loads(report_path.read_text())
+    assert enriched == ["A"]
+    assert report["run"]["completed"] is False
+    assert report["counters"]["pipeline.failed"] == 2
+
+    failing.update(detail=False, search=False)
+    main.main()
+    assert sorted(enriched) == ["A", "B", "C"]
+    assert windows[0] == windows[1]
+    assert json.loads(report_path.read_text())["run"] == {"id": 1, "resumed": True, "completed": True}
+
+
+def test_sharded_search_walks_shards_concurrently_and_dedupes(monkeypatch):
+    today = simap_client.datetime.today().date()
+    since = (today - simap_client.timedelta(days=2)).isoformat()
+    shards = simap_client.search_shards(["48000000", "72000000"], since)
+    assert len(shards) == 6
+    assert shards[0] == ("48000000", since, since)
+    assert shards[2] == ("48000000", today.isoformat(), None)
+
+    calls = []
+
+    def fake_call(endpoint, params=None):
+        calls.append((params["cpvCodes"], params["newestPublicationFrom"], params.get("newestPublicationUntil")))
+        time.sleep(0.1)
+        day = params["newestPublicationFrom"]
+        # the same publication matches both CPV codes
+        return {"projects": [{"id": f"P-{day}", "publicationId": "A"}], "pagination": {}}
+
+    monkeypatch.setattr(simap_client, "call", fake_call)
+    start = time.monotonic()
+    results = list(simap_client.iter_sharded_summaries(
+        ["48000000", "72000000"], published_from=since, concurrency=6, days_per_shard=1
+    ))
+    elapsed = time.monotonic() - start
+
+    assert len(calls) == 6
+    assert sorted(r["id"] for r in results) == sorted({f"P-{s[1]}" for s in shards})
+    assert elapsed < 0.45
+
+
+def test_backfill_stores_days_and_resumes_enrichment(monkeypatch, tmp_path):
+    from datetime import date
+
+    import simap_agent.backfill as backfill
+
+    searched, fetched, enriched = [], [], []
+    fail = {"B"}
+
+    def search(cpv, published_from=None, published_until=None):
+        assert published_from == published_until
+        searched.append(published_from)
+        pub = "A" if published_from.endswith("01") else "B"
+        return iter([{"pubType": "tender", "id": f"P{pub}", "publicationId": pub}])
+
+    def fake_detail(summary):
+        fetched.append(summary["publicationId"])
+        return {"projectId": summary["id"], "id": summary["publicationId"]}
+
+    def fake_enrich(detail, profile):
+        if detail["id"] in fail:
+            raise RuntimeError("timeout")
+        enriched.append(detail["id"])
+        return {"apply_score": 8}
+
+    monkeypatch.setattr(backfill, "iter_project_summaries", search)
+    monkeypatch.setattr(backfill, "fetch_project_detail", fake_detail)
+    monkeypatch.setattr(backfill, "enrich", fake_enrich)
+    monkeypatch.setattr(backfill.config, "CPV_CODES", ["72000000"])
+
+    st = store.PublicationStore(str(tmp_path / "state.db"))
+    job = backfill.Backfill(st, date(2024, 3, 1), date(2024, 3, 2), profile=PROFILE, per_minute=6000)
+    report = job.run()
+    assert sorted(searched) == ["2024-03-01", "2024-03-02"]
+    assert enriched == ["A"]
+    assert report["counts"]["days"] == 2
+
+    fail.clear()
+    report = backfill.Backfill(st, date(2024, 3, 1), date(2024, 3, 2), profile=PROFILE, per_minute=6000).run()
+    assert len(searched) == 2
+    assert sorted(fetched) == ["A", "B"]
+    assert enriched == ["A", "B"]
+    assert report["counts"]["enriched"] == 1
+    assert report["enriched_per_minute"] > 0
+    st.close()
+
+
+def _indexed(title, customer, summary, team, score, day):
+    return {
+        "summary": summary,
+        "team": team,
+        "apply_score": score,
+        "project": {
+            "title_de": title,
+            "customer": customer,
+            "projectNumber": title[:3],
+            "publicationDate": f"{day}T08:00:00",
+            "cpvCode": {"code": "72000000", "label_de": "IT-Dienste"},
+        },
+        "awardCriteriaSummary": "Preis 40%, Qualität 60%",
+    }
+
+
+def test_tender_index_ranks_and_filters(tmp_path):
+    import simap_agent.search_index as search_index
+
+    index = search_index.TenderIndex(str(tmp_path / "index.db"))
+    index.add(("P1", "A"), _indexed("Camunda Prozessplattform", "Kanton Zürich", "BPMN mit Camunda", "Engineering", 8, "2025-03-03"))
+    index.add(("P2", "B"), _indexed("Webportal", "Stadt Bern", "Portal, Anbindung an Camunda", "Products", 5, "2025-02-01"))
+    index.add(("P3", "C"), _indexed("Reinigung", "Stadt Zürich", "Büroreinigung", "Products", 1, "2025-03-05"))
+
+    rows = index.search("camunda")
+    assert [r["project_id"] for r in rows] == ["P1", "P2"]
+    assert index.search("zurich")[0]["customer"] in ("Kanton Zürich", "Stadt Zürich")
+    assert [r["project_id"] for r in index.search("camunda", since="2025-03-01")] == ["P1"]
+    assert [r["project_id"] for r in index.search("camunda", team="Products")] == ["P2"]
+    assert [r["project_id"] for r in index.search(min_score=5)] == ["P1", "P2"]
+    assert index.search("qualit*")[0]["project_id"] in ("P1", "P2", "P3")
+    assert index.search('camunda" OR "x') == []
+
+    # re-enriching replaces the indexed text
+    index.add(("P1", "A"), _indexed("Archivlösung", "Kanton Zürich", "Dokumentenarchiv", "Engineering", 6, "2025-03-03"))
+    assert [r["project_id"] for r in index.search("camunda")] == ["P2"]
+    assert index.count() == 3
+    index.close()
+
+
+def test_search_cli_runs_without_slack_and_openai_secrets(monkeypatch, tmp_path, capsys):
+    import simap_agent.search_index as search_index
+
+    index = search_index.TenderIndex(str(tmp_path / "index.db"))
+    index.add(("P1", "A"), _indexed("Camunda Prozessplattform", "Kanton Zürich", "BPMN", "Engineering", 8, "2025-03-03"))
+    index.close()
+    monkeypatch.setattr(config, "_load_dotenv", lambda: None)
+    monkeypatch.delenv("SLACK_WEBHOOK_URL")
+    monkeypatch.delenv("OPENAI_API_KEY")
+    monkeypatch.setenv("INDEX_PATH", str(tmp_path / "index.db"))
+    config.reset()
+    try:
+        assert config.get_settings().SLACK_WEBHOOK_URL is None
+        rows = search_index.main_cli(["camunda"])
+        assert [r["project_id"] for r in rows] == ["P1"]
+        assert "Camunda" in capsys.readouterr().out
+        with pytest.raises(EnvironmentError, match="OPENAI_API_KEY"):
+            config.require("OPENAI_API_KEY")
+    finally:
+        monkeypatch.undo()
+        config.reset()